@@ -0,0 +1,95 @@
+"""
+The assignment module solves the assignment problem: pair rows with
+columns so that the total cost of the pairs is as small as possible.
+
+sparse_min_cost_assignment takes only the pairs that are allowed, rather
+than a full matrix of costs, so its time grows with their number rather
+than with the size of the whole matrix.
+"""
+from heapq import heappop, heappush
+
+
+def sparse_min_cost_assignment(candidates):
+    """Return a minimum-cost assignment of rows to columns, in which row i
+    may only be paired with the columns listed in <candidates>[i].
+
+    The result is a list of (row, column) pairs, sorted by row, in which no
+    row or column appears twice. As many rows as possible are paired,
+    earlier rows first: a row is only left unpaired if pairing it would
+    mean unpairing an earlier row. Among the assignments that pair those
+    rows, the total cost is as small as possible.
+
+    The rows are added one at a time, each along a shortest augmenting path
+    found with Dijkstra's algorithm over the allowed pairs, so with e pairs
+    allowed this takes O(n * e * log e) time for n rows, and usually much
+    less, since most searches end after a few steps.
+
+    @type candidates: list[list[(int, int | float)]]
+        For each row, the (column, cost) pairs it may be assigned.
+        Precondition: every cost is >= 0.
+    @rtype: list[(int, int)]
+
+    >>> sparse_min_cost_assignment([[(0, 4), (1, 1), (2, 3)],
+    ...                             [(0, 2), (1, 0), (2, 5)],
+    ...                             [(0, 3), (1, 2), (2, 2)]])
+    [(0, 1), (1, 0), (2, 2)]
+    >>> sparse_min_cost_assignment([[(0, 1)], [(0, 5)], [(1, 9), (0, 2)]])
+    [(0, 0), (2, 1)]
+    >>> sparse_min_cost_assignment([[]])
+    []
+    """
+    # The row each column is paired with, and the column of each row.
+    match = {}
+    column_of = {}
+    # Potentials keep the costs along the search non-negative: a pair
+    # (row, column) costs cost + row_potential - column_potential, and a
+    # paired column leads back to its row at no cost.
+    row_potential = [0] * len(candidates)
+    column_potential = {}
+
+    for start in range(len(candidates)):
+        row_distance = {start: 0}
+        column_distance = {}
+        previous = {}
+        heap = []
+        row, distance, end = start, 0, None
+        while True:
+            for column, cost in candidates[row]:
+                if column not in column_distance:
+                    heappush(heap, (distance + cost + row_potential[row] -
+                                    column_potential.get(column, 0),
+                                    column, row))
+            # Settle the nearest column not yet reached.
+            while heap and heap[0][1] in column_distance:
+                heappop(heap)
+            if not heap:
+                break
+            distance, column, row = heappop(heap)
+            column_distance[column] = distance
+            previous[column] = row
+            if column not in match:
+                end = column
+                break
+            row = match[column]
+            row_distance[row] = distance
+        if end is None:
+            # No free column can be reached, so this row stays unpaired.
+            continue
+
+        for row, reached in row_distance.items():
+            row_potential[row] += reached - distance
+        for column, reached in column_distance.items():
+            column_potential[column] = \
+                column_potential.get(column, 0) + reached - distance
+        # Flip the pairs along the augmenting path.
+        column = end
+        while True:
+            row = previous[column]
+            before = column_of.get(row)
+            match[column] = row
+            column_of[row] = column
+            if before is None:
+                break
+            column = before
+
+    return sorted(column_of.items())
@@ -0,0 +1,285 @@
+"""
+Benchmark the simulation on synthetic traces of increasing size.
+
+For each size a trace is generated with the workload module and put through
+these phases, each timed separately:
+
+    generate    write the trace to a temporary file
+    parse       create_event_list on the trace
+    queue       add every event to a PriorityQueue, then remove them all
+    dispatch    request_driver for each rider against the whole idle fleet
+    road        the same requests, measured along a RoadNetwork of unit
+                roads joining every pair of neighbouring grid points
+    batch       one match_batch of a batch-mode dispatcher, with up to
+                BATCH_RIDERS riders waiting and as many idle drivers
+    simulate    Simulation.run with a StreamingMonitor and no activity log
+
+Each size runs in a fresh process so that its peak resident memory can be
+measured. The results can be saved as JSON, and compared with a saved
+baseline: a drop in simulated events per second larger than the tolerance
+is reported as a regression, and makes the script exit with status 1.
+
+usage: python benchmark.py [--sizes N ...] [--output FILE]
+                           [--baseline FILE] [--tolerance FRACTION]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from container import PriorityQueue
+from dispatcher import Dispatcher
+from driver import Driver
+from event import DriverRequest, RiderRequest, create_event_list
+from location import Location
+from log_sink import NullSink
+from monitor import StreamingMonitor
+from simulation import Simulation
+from travel import RoadNetwork
+from workload import generate_workload
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+# The number of rows and columns in the generated traces.
+GRID_SIZE = 100
+# The most riders timed in the dispatch phase.
+DISPATCH_QUERIES = 10000
+# The most riders waiting in the batch phase.
+BATCH_RIDERS = 800
+
+
+class _CountingQueue(PriorityQueue):
+    """A PriorityQueue that counts the items removed from it."""
+
+    def __init__(self):
+        """Initialize an empty _CountingQueue.
+
+        @type self: _CountingQueue
+        @rtype: None
+        """
+        PriorityQueue.__init__(self)
+        self.removed = 0
+
+    def remove(self):
+        """Remove and return the next item, and count it.
+
+        @type self: _CountingQueue
+        @rtype: object
+        """
+        self.removed += 1
+        return PriorityQueue.remove(self)
+
+
+def grid_roads(size):
+    """Return a RoadNetwork with a road of length 1 between every pair of
+    neighbouring points of a <size> by <size> grid.
+
+    Its distances are the Manhattan distances, so dispatching along it
+    gives the same results as on the grid.
+
+    @type size: int
+    @rtype: RoadNetwork
+    """
+    network = RoadNetwork()
+    for row in range(size):
+        for column in range(size):
+            if row + 1 < size:
+                network.add_road(Location(row, column),
+                                 Location(row + 1, column), 1)
+            if column + 1 < size:
+                network.add_road(Location(row, column),
+                                 Location(row, column + 1), 1)
+    return network
+
+
+def benchmark_size(riders, fleet_ratio=20, seed=0):
+    """Run every phase on a trace with about <riders> rider requests, and
+    return the results.
+
+    @type riders: int
+    @type fleet_ratio: int
+        The number of riders per driver.
+    @type seed: int
+    @rtype: dict[str, object]
+    """
+    timings = {}
+    handle, filename = tempfile.mkstemp(suffix=".txt")
+    try:
+        start = time.perf_counter()
+        with os.fdopen(handle, "w") as file:
+            count = generate_workload(file, riders,
+                                      max(1, riders // fleet_ratio),
+                                      grid_size=GRID_SIZE, seed=seed)
+        timings["generate"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        events = create_event_list(filename)
+        timings["parse"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        queue = PriorityQueue()
+        queue.add_all(events)
+        while not queue.is_empty():
+            queue.remove()
+        timings["queue"] = time.perf_counter() - start
+
+        dispatcher = Dispatcher()
+        for event in events:
+            if isinstance(event, DriverRequest):
+                dispatcher.request_rider(event.driver)
+        queries = [event.rider for event in events
+                   if isinstance(event, RiderRequest)][:DISPATCH_QUERIES]
+        start = time.perf_counter()
+        for rider in queries:
+            dispatcher.request_driver(rider)
+        timings["dispatch"] = time.perf_counter() - start
+
+        # The dispatch phase registered the drivers, so start afresh.
+        events = create_event_list(filename)
+        dispatcher = Dispatcher(travel_model=grid_roads(GRID_SIZE))
+        for event in events:
+            if isinstance(event, DriverRequest):
+                dispatcher.request_rider(event.driver)
+        queries = [event.rider for event in events
+                   if isinstance(event, RiderRequest)][:DISPATCH_QUERIES]
+        start = time.perf_counter()
+        for rider in queries:
+            dispatcher.request_driver(rider)
+        timings["road"] = time.perf_counter() - start
+
+        # A driver waits at each batch rider's destination, so the fleet is
+        # spread over the grid as the riders are.
+        batch = [event.rider for event in events
+                 if isinstance(event, RiderRequest)][:BATCH_RIDERS]
+        dispatcher = Dispatcher(batch_window=1)
+        for i, rider in enumerate(batch):
+            dispatcher.request_rider(Driver("batch{}".format(i),
+                                            rider.destination, 1))
+        for rider in batch:
+            dispatcher.request_driver(rider)
+        start = time.perf_counter()
+        dispatcher.match_batch()
+        timings["batch"] = time.perf_counter() - start
+
+        # The road phase registered the drivers, so start afresh.
+        events = create_event_list(filename)
+        queue = _CountingQueue()
+        simulation = Simulation(queue=queue,
+                                monitor=StreamingMonitor(NullSink()))
+        start = time.perf_counter()
+        simulation.run(events)
+        timings["simulate"] = time.perf_counter() - start
+    finally:
+        os.remove(filename)
+
+    return {"riders": riders,
+            "input_events": count,
+            "processed_events": queue.removed,
+            "events_per_second": queue.removed / timings["simulate"],
+            "dispatch_queries_per_second":
+                len(queries) / timings["dispatch"] if queries else None,
+            "road_queries_per_second":
+                len(queries) / timings["road"] if queries else None,
+            # ru_maxrss is in kilobytes on Linux.
+            "peak_rss_kb": resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss,
+            "timings": timings}
+
+
+def run_benchmarks(sizes, fleet_ratio=20, seed=0):
+    """Return the results of benchmark_size for each of <sizes>, each run in
+    a new process.
+
+    @type sizes: list[int]
+    @type fleet_ratio: int
+    @type seed: int
+    @rtype: list[dict[str, object]]
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for riders in sizes:
+        with context.Pool(1) as pool:
+            results.append(pool.apply(benchmark_size,
+                                      (riders, fleet_ratio, seed)))
+    return results
+
+
+def find_regressions(results, baseline, tolerance):
+    """Return a message for each size whose simulated events per second
+    fell by more than <tolerance> compared with <baseline>.
+
+    @type results: list[dict[str, object]]
+    @type baseline: list[dict[str, object]]
+    @type tolerance: float
+    @rtype: list[str]
+
+    >>> find_regressions([{"riders": 10, "events_per_second": 50.0}],
+    ...                  [{"riders": 10, "events_per_second": 100.0}], 0.2)
+    ['10 riders: 50 events/s, baseline 100 events/s']
+    """
+    expected = {result["riders"]: result["events_per_second"]
+                for result in baseline}
+    messages = []
+    for result in results:
+        previous = expected.get(result["riders"])
+        if previous is not None and \
+                result["events_per_second"] < (1 - tolerance) * previous:
+            messages.append("{} riders: {:.0f} events/s, baseline {:.0f} "
+                            "events/s".format(result["riders"],
+                                              result["events_per_second"],
+                                              previous))
+    return messages
+
+
+def main(argv):
+    """Run the benchmarks as the command line <argv> asks, and return the
+    exit status.
+
+    @type argv: list[str]
+    @rtype: int
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the simulation.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="numbers of riders to generate")
+    parser.add_argument("--fleet-ratio", type=int, default=20,
+                        help="riders per driver")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="save the results as JSON")
+    parser.add_argument("--baseline", help="compare with saved results")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed fractional slowdown")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.fleet_ratio, args.seed)
+    print("{:>10} {:>10} {:>12} {:>10} {:>8}  {}".format(
+        "riders", "events", "events/s", "queries/s", "rss MB",
+        "phase seconds"))
+    for result in results:
+        print("{:>10} {:>10} {:>12.0f} {:>10.0f} {:>8.1f}  {}".format(
+            result["riders"], result["processed_events"],
+            result["events_per_second"],
+            result["dispatch_queries_per_second"] or 0,
+            result["peak_rss_kb"] / 1024,
+            " ".join("{}={:.3f}".format(phase, seconds) for phase, seconds
+                     in result["timings"].items())))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = find_regressions(results, json.load(file),
+                                           args.tolerance)
+        for message in regressions:
+            print("regression: " + message)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
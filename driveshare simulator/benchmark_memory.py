@@ -0,0 +1,144 @@
+"""
+Measure how much memory the simulation's domain objects take.
+
+For each kind of object this prints its size with the current slotted
+classes and with plain dict-backed classes laid out like the originals,
+then loads a whole trace both ways and compares the memory held by the
+resulting event lists.
+
+usage: python benchmark_memory.py [EVENTS.txt]
+"""
+import gc
+import sys
+import tracemalloc
+
+from driver import Driver
+from event import DriverRequest, RiderRequest, Pickup, create_event_list
+from location import Location
+from monitor import Activity
+from rider import Rider
+
+
+class _Plain:
+    """A dict-backed object with the given attributes, laid out like the
+    domain objects were before they had __slots__.
+    """
+
+    def __init__(self, **attributes):
+        """Initialize a _Plain object.
+
+        @type self: _Plain
+        @rtype: None
+        """
+        self.__dict__.update(attributes)
+
+
+def footprint(obj):
+    """Return the bytes used by <obj> itself, including its __dict__ if it
+    has one but not the objects its attributes refer to.
+
+    @type obj: object
+    @rtype: int
+    """
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def _plain_events(filename):
+    """Return the events in <filename> built from dict-backed objects, with
+    a new location for every location token, as create_event_list used to.
+
+    @type filename: str
+    @rtype: list[_Plain]
+    """
+    def location(token):
+        row, column = token.split(",")
+        return _Plain(row=int(row), column=int(column))
+
+    events = []
+    with open(filename) as file:
+        for line in file:
+            tokens = line.split()
+            if not tokens or tokens[0].startswith("#"):
+                continue
+            if tokens[1] == "DriverRequest":
+                driver = _Plain(identifier=tokens[2],
+                                location=location(tokens[3]),
+                                speed=int(tokens[4]), destination=None,
+                                is_idle=True)
+                events.append(_Plain(timestamp=int(tokens[0]), driver=driver))
+            else:
+                rider = _Plain(id=tokens[2], origin=location(tokens[3]),
+                               destination=location(tokens[4]),
+                               patience=int(tokens[5]), status="waiting")
+                events.append(_Plain(timestamp=int(tokens[0]), rider=rider))
+    return events
+
+
+def _traced_size(load, filename):
+    """Return the number of bytes still allocated after calling
+    load(<filename>) and keeping its result.
+
+    @type load: callable
+    @type filename: str
+    @rtype: int
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = load(filename)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main(filename):
+    """Print the per-object and per-trace memory comparison for <filename>.
+
+    @type filename: str
+    @rtype: None
+    """
+    location = Location(1, 2)
+    driver = Driver("Amaranth", location, 1)
+    rider = Rider("Almond", location, Location(5, 5), 10)
+    plain_location = _Plain(row=1, column=2)
+    plain_driver = _Plain(identifier="Amaranth", location=plain_location,
+                          speed=1, destination=None, is_idle=True)
+    plain_rider = _Plain(id="Almond", origin=plain_location,
+                         destination=plain_location, patience=10,
+                         status="waiting")
+    rows = [
+        ("Location", location, plain_location),
+        ("Driver", driver, plain_driver),
+        ("Rider", rider, plain_rider),
+        ("Activity", Activity(0, "request", "Almond", location),
+         _Plain(description="request", time=0, id="Almond",
+                location=plain_location)),
+        ("DriverRequest", DriverRequest(0, driver),
+         _Plain(timestamp=0, driver=plain_driver)),
+        ("RiderRequest", RiderRequest(0, rider),
+         _Plain(timestamp=0, rider=plain_rider)),
+        ("Pickup", Pickup(0, rider, driver),
+         _Plain(timestamp=0, rider=plain_rider, driver=plain_driver)),
+    ]
+    print("{:<14} {:>8} {:>8}".format("object", "before", "after"))
+    for name, obj, plain in rows:
+        print("{:<14} {:>8} {:>8}".format(name, footprint(plain),
+                                          footprint(obj)))
+
+    # Load the slotted events first, so that the interned locations they
+    # create are counted.
+    after = _traced_size(create_event_list, filename)
+    before = _traced_size(_plain_events, filename)
+    count = len(create_event_list(filename))
+    print()
+    print("{} events from {}".format(count, filename))
+    print("before: {} bytes ({:.1f} per event)".format(before,
+                                                        before / count))
+    print("after:  {} bytes ({:.1f} per event)".format(after, after / count))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "events.txt")
@@ -0,0 +1,296 @@
+"""
+The columnar_monitor module contains ActivityLog, an array-backed record of
+activities, and ColumnarMonitor, a Monitor that keeps its full activity
+history in an ActivityLog and computes its report with NumPy.
+
+This module requires NumPy.
+
+=== Constants ===
+@type CATEGORIES: list[str]
+    The activity categories, indexed by their code in an ActivityLog.
+@type DESCRIPTIONS: list[str]
+    The activity descriptions, indexed by their code in an ActivityLog.
+"""
+import numpy as np
+
+from histogram import LogHistogram
+from monitor import Monitor, RIDER, DRIVER, REQUEST, CANCEL, PICKUP, DROPOFF
+
+CATEGORIES = [RIDER, DRIVER]
+DESCRIPTIONS = [REQUEST, CANCEL, PICKUP, DROPOFF]
+
+_CATEGORY_CODE = {category: code for code, category in enumerate(CATEGORIES)}
+_DESCRIPTION_CODE = {description: code
+                     for code, description in enumerate(DESCRIPTIONS)}
+
+
+class ActivityLog:
+    """A record of activities stored as parallel typed arrays.
+
+    Each activity is a row across six columns: time, category code,
+    description code, actor index, row and column. Actor indexes are
+    assigned per category in order of first appearance. The arrays are
+    allocated in fixed-size chunks, so adding an activity never copies the
+    ones already recorded.
+
+    === Attributes ===
+    @type actors: list[dict[str, int]]
+        The actor index of each identifier, for each category code.
+    """
+
+    # === Private Attributes ===
+    # @type _chunk_size: int
+    #     The number of activities in each chunk.
+    # @type _chunks: list[dict[str, numpy.ndarray]]
+    #     The full chunks, each a column name to array mapping.
+    # @type _current: dict[str, numpy.ndarray]
+    #     The chunk being filled.
+    # @type _used: int
+    #     The number of activities in _current.
+
+    _COLUMNS = [("time", np.int64), ("category", np.uint8),
+                ("description", np.uint8), ("actor", np.int32),
+                ("row", np.int32), ("column", np.int32)]
+
+    def __init__(self, chunk_size=1 << 16):
+        """Initialize an empty ActivityLog.
+
+        @type self: ActivityLog
+        @type chunk_size: int
+            The number of activities stored in each chunk.
+        @rtype: None
+        """
+        self._chunk_size = chunk_size
+        self._chunks = []
+        self._current = self._new_chunk()
+        self._used = 0
+        self.actors = [{} for _ in CATEGORIES]
+
+    def _new_chunk(self):
+        """Return a new, empty chunk.
+
+        @type self: ActivityLog
+        @rtype: dict[str, numpy.ndarray]
+        """
+        return {name: np.empty(self._chunk_size, dtype)
+                for name, dtype in self._COLUMNS}
+
+    def __len__(self):
+        """Return the number of activities in this ActivityLog.
+
+        @type self: ActivityLog
+        @rtype: int
+        """
+        return len(self._chunks) * self._chunk_size + self._used
+
+    def add(self, timestamp, category, description, identifier, location):
+        """Record an activity.
+
+        @type self: ActivityLog
+        @type timestamp: int
+        @type category: DRIVER | RIDER
+        @type description: REQUEST | CANCEL | PICKUP | DROP_OFF
+        @type identifier: str
+        @type location: Location
+        @rtype: None
+        """
+        if self._used == self._chunk_size:
+            self._chunks.append(self._current)
+            self._current = self._new_chunk()
+            self._used = 0
+
+        category_code = _CATEGORY_CODE[category]
+        actors = self.actors[category_code]
+        actor = actors.get(identifier)
+        if actor is None:
+            actor = actors[identifier] = len(actors)
+
+        chunk = self._current
+        i = self._used
+        chunk["time"][i] = timestamp
+        chunk["category"][i] = category_code
+        chunk["description"][i] = _DESCRIPTION_CODE[description]
+        chunk["actor"][i] = actor
+        chunk["row"][i] = location.row
+        chunk["column"][i] = location.column
+        self._used += 1
+
+    def column(self, name):
+        """Return the column <name> as one array, in the order the
+        activities were added.
+
+        @type self: ActivityLog
+        @type name: str
+        @rtype: numpy.ndarray
+        """
+        parts = [chunk[name] for chunk in self._chunks]
+        parts.append(self._current[name][:self._used])
+        return np.concatenate(parts)
+
+    def by_actor(self, category):
+        """Return the activities in <category> grouped by actor.
+
+        The result maps each column name to an array holding only the
+        activities in <category>, sorted by actor index and, within each
+        actor, in the order they were added.
+
+        @type self: ActivityLog
+        @type category: DRIVER | RIDER
+        @rtype: dict[str, numpy.ndarray]
+        """
+        mask = self.column("category") == _CATEGORY_CODE[category]
+        actor = self.column("actor")[mask]
+        order = np.argsort(actor, kind="stable")
+        return {name: self.column(name)[mask][order]
+                for name, _ in self._COLUMNS}
+
+
+class ColumnarMonitor(Monitor):
+    """A monitor that stores every activity in an ActivityLog.
+
+    The report is the same as Monitor's, but it is computed with vectorized
+    NumPy operations over the whole log. So are the histograms, which are
+    only built when they are asked for.
+    """
+
+    # === Private Attributes ===
+    # @type _log: ActivityLog
+    #       Every activity the monitor has been notified of.
+
+    def __init__(self, sink=None, chunk_size=1 << 16):
+        """Initialize a ColumnarMonitor.
+
+        @type self: ColumnarMonitor
+        @type sink: LogSink | None
+            Where to log each activity. Activities are printed if no sink
+            is given.
+        @type chunk_size: int
+            The number of activities stored in each chunk of the log.
+        """
+        Monitor.__init__(self, sink)
+        self._log = ActivityLog(chunk_size)
+
+    def __str__(self):
+        """Return a string representation.
+
+        @type self: ColumnarMonitor
+        @rtype: str
+        """
+        return "ColumnarMonitor ({} drivers, {} riders)".format(
+            len(self._log.actors[_CATEGORY_CODE[DRIVER]]),
+            len(self._log.actors[_CATEGORY_CODE[RIDER]]))
+
+    def notify(self, timestamp, category, description, identifier, location):
+        """Notify the monitor of the activity.
+
+        @type self: ColumnarMonitor
+        @type timestamp: int
+            The time of the activity.
+        @type category: DRIVER | RIDER
+            The category for the activity.
+        @type description: REQUEST | CANCEL | PICKUP | DROP_OFF
+            A description of the activity.
+        @type identifier: str
+            The identifier for the actor.
+        @type location: Location
+            The location of the activity.
+        @rtype: None
+        """
+        self._log.add(timestamp, category, description, identifier, location)
+        self._sink.log(timestamp, identifier, description)
+
+    def _wait_times(self):
+        """Return the wait time of each rider that has either been picked up
+        or has cancelled their ride.
+
+        @type self: ColumnarMonitor
+        @rtype: numpy.ndarray
+        """
+        riders = self._log.by_actor(RIDER)
+        actor = riders["actor"]
+        # The position of each rider's first activity, and whether that
+        # rider has a second one.
+        first = np.flatnonzero(np.r_[True, actor[1:] != actor[:-1]])
+        second = first + 1
+        finished = second < len(actor)
+        finished[finished] = actor[second[finished]] == actor[first[finished]]
+
+        time = riders["time"]
+        return time[second[finished]] - time[first[finished]]
+
+    def _average_wait_time(self):
+        """Return the average wait time of riders that have either been picked
+        up or have cancelled their ride.
+
+        @type self: ColumnarMonitor
+        @rtype: float
+        """
+        waits = self._wait_times()
+        return int(waits.sum()) / len(waits)
+
+    def _driver_drives(self):
+        """Return the distance driven between each driver's consecutive
+        activities, and the description codes of the activities at the
+        start and end of each of those drives.
+
+        @type self: ColumnarMonitor
+        @rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        """
+        drivers = self._log.by_actor(DRIVER)
+        actor = drivers["actor"]
+        same_driver = actor[1:] == actor[:-1]
+        distance = (np.abs(np.diff(drivers["row"].astype(np.int64))) +
+                    np.abs(np.diff(drivers["column"].astype(np.int64))))
+        description = drivers["description"]
+        return (distance[same_driver], description[:-1][same_driver],
+                description[1:][same_driver])
+
+    def _driver_distances(self):
+        """Return the distance driven between each driver's consecutive
+        activities, and whether each of those drives started at a pickup.
+
+        @type self: ColumnarMonitor
+        @rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        distance, start, _ = self._driver_drives()
+        return distance, start == _DESCRIPTION_CODE[PICKUP]
+
+    def histograms(self):
+        """Return the histogram of each distribution in HISTOGRAMS, built
+        from the log.
+
+        @type self: ColumnarMonitor
+        @rtype: dict[str, LogHistogram]
+        """
+        distance, start, end = self._driver_drives()
+        pickup, dropoff = _DESCRIPTION_CODE[PICKUP], _DESCRIPTION_CODE[DROPOFF]
+        samples = {"rider_wait_time": self._wait_times(),
+                   "pickup_distance": distance[end == pickup],
+                   "ride_distance": distance[(start == pickup) &
+                                             (end == dropoff)]}
+        histograms = {}
+        for name, values in samples.items():
+            histogram = histograms[name] = LogHistogram()
+            for value, count in zip(*np.unique(values, return_counts=True)):
+                histogram.record(int(value), int(count))
+        return histograms
+
+    def _average_total_distance(self):
+        """Return the average distance drivers have driven.
+
+        @type self: ColumnarMonitor
+        @rtype: float
+        """
+        distance, _ = self._driver_distances()
+        return int(distance.sum()) / len(self._log.actors[
+            _CATEGORY_CODE[DRIVER]])
+
+    def _average_ride_distance(self):
+        """Return the average distance drivers have driven on rides.
+
+        @type self: ColumnarMonitor
+        @rtype: float
+        """
+        distance, from_pickup = self._driver_distances()
+        return int(distance[from_pickup].sum()) / len(self._log.actors[
+            _CATEGORY_CODE[DRIVER]])
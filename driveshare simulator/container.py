@@ -1,3 +1,8 @@
+from bisect import insort
+from collections import deque
+from heapq import heappush, heappop, heapify, nsmallest
+
+
 class Container:
     """A container that holds objects.
 
@@ -13,6 +18,40 @@ class Container:
         """
         raise NotImplementedError("Implemented in a subclass")
 
+    def add_all(self, items):
+        """Add every item in <items> to this Container, in order.
+
+        Subclasses may override this with a faster bulk load.
+
+        @type self: Container
+        @type items: iterable[Object]
+        @rtype: None
+        """
+        for item in items:
+            self.add(item)
+
+    def schedule(self, item):
+        """Add <item> to this Container and return a handle for it.
+
+        The handle can be passed to cancel() to take <item> out again
+        without removing the items ahead of it.
+
+        @type self: Container
+        @type item: Object
+        @rtype: Handle
+        """
+        raise NotImplementedError("Implemented in a subclass")
+
+    def cancel(self, handle):
+        """Take the item of <handle> out of this Container, if it is still
+        there.
+
+        @type self: Container
+        @type handle: Handle
+        @rtype: None
+        """
+        raise NotImplementedError("Implemented in a subclass")
+
     def remove(self):
         """Remove and return a single item from this Container.
 
@@ -21,6 +60,14 @@ class Container:
         """
         raise NotImplementedError("Implemented in a subclass")
 
+    def peek(self):
+        """Return the item that remove() would return, without removing it.
+
+        @type self: Container
+        @rtype: Object
+        """
+        raise NotImplementedError("Implemented in a subclass")
+
     def is_empty(self):
         """Return True iff this Container is empty.
 
@@ -29,6 +76,50 @@ class Container:
         """
         raise NotImplementedError("Implemented in a subclass")
 
+    def __len__(self):
+        """Return the number of items in this Container.
+
+        @type self: Container
+        @rtype: int
+        """
+        raise NotImplementedError("Implemented in a subclass")
+
+
+class Handle:
+    """A handle on an item scheduled in a Container, which can cancel it.
+
+    A cancelled item is only marked as cancelled; the container skips it
+    when it reaches the front, and drops the cancelled items all at once
+    when there are too many of them.
+    """
+
+    __slots__ = ("_container", "_entry")
+
+    # === Private Attributes ===
+    # @type _container: Container
+    #     The container the item was scheduled in.
+    # @type _entry: list
+    #     The container's entry for the item.
+
+    def __init__(self, container, entry):
+        """Initialize a Handle.
+
+        @type self: Handle
+        @type container: Container
+        @type entry: list
+        @rtype: None
+        """
+        self._container = container
+        self._entry = entry
+
+    def cancel(self):
+        """Take the item out of its container, if it is still there.
+
+        @type self: Handle
+        @rtype: None
+        """
+        self._container.cancel(self)
+
 
 class PriorityQueue(Container):
     """A queue of items that operates in priority order.
@@ -47,12 +138,18 @@ class PriorityQueue(Container):
     """
 
     # === Private Attributes ===
-    # @type _items: list
-    #     The items stored in the priority queue.
+    # @type _items: list[[object, int, bool]]
+    #     A binary min-heap of [item, insertion number, live] entries. An
+    #     entry is live until its item is removed or cancelled.
+    # @type _count: int
+    #     The number of items ever added; used as the next insertion number.
+    # @type _cancelled: int
+    #     The number of cancelled entries still in _items.
     #
     # === Representation Invariants ===
-    # _items is a sorted list, where the first item in the queue is the
-    # item with the highest priority.
+    # _items satisfies the heap invariant of the heapq module, so _items[0]
+    # is the entry holding the item with the highest priority. Equal items
+    # are ordered by their insertion number, which gives the FIFO tie-break.
 
     def __init__(self):
         """Initialize an empty PriorityQueue.
@@ -61,6 +158,8 @@ class PriorityQueue(Container):
         @rtype: None
         """
         self._items = []
+        self._count = 0
+        self._cancelled = 0
 
     def remove(self):
         """Remove and return the next item from this PriorityQueue.
@@ -84,7 +183,34 @@ class PriorityQueue(Container):
         >>> pq.remove()
         'yellow'
         """
-        return self._items.pop(0)
+        entry = heappop(self._items)
+        while not entry[2]:
+            self._cancelled -= 1
+            entry = heappop(self._items)
+        entry[2] = False
+        return entry[0]
+
+    def peek(self):
+        """Return the next item from this PriorityQueue without removing it.
+
+        Precondition: <self> should not be empty.
+
+        @type self: PriorityQueue
+        @rtype: object
+
+        >>> pq = PriorityQueue()
+        >>> pq.add("red")
+        >>> pq.add("blue")
+        >>> pq.peek()
+        'blue'
+        >>> len(pq)
+        2
+        """
+        items = self._items
+        while not items[0][2]:
+            heappop(items)
+            self._cancelled -= 1
+        return items[0][0]
 
     def is_empty(self):
         """
@@ -100,7 +226,22 @@ class PriorityQueue(Container):
         >>> pq.is_empty()
         False
         """
-        return len(self._items) == 0
+        return len(self._items) == self._cancelled
+
+    def __len__(self):
+        """Return the number of items in this PriorityQueue.
+
+        @type self: PriorityQueue
+        @rtype: int
+
+        >>> pq = PriorityQueue()
+        >>> len(pq)
+        0
+        >>> pq.add("thing")
+        >>> len(pq)
+        1
+        """
+        return len(self._items) - self._cancelled
 
     def add(self, item):
         """Add <item> to this PriorityQueue.
@@ -114,8 +255,506 @@ class PriorityQueue(Container):
         >>> pq.add("blue")
         >>> pq.add("red")
         >>> pq.add("green")
-        >>> pq._items
+        >>> [pq.remove() for _ in range(4)]
+        ['blue', 'green', 'red', 'yellow']
+        """
+        heappush(self._items, [item, self._count, True])
+        self._count += 1
+
+    def schedule(self, item):
+        """Add <item> to this PriorityQueue and return a handle for it.
+
+        @type self: PriorityQueue
+        @type item: object
+        @rtype: Handle
+
+        >>> pq = PriorityQueue()
+        >>> pq.add("red")
+        >>> handle = pq.schedule("blue")
+        >>> pq.add("green")
+        >>> handle.cancel()
+        >>> len(pq)
+        2
+        >>> [pq.remove() for _ in range(2)]
+        ['green', 'red']
+        """
+        entry = [item, self._count, True]
+        heappush(self._items, entry)
+        self._count += 1
+        return Handle(self, entry)
+
+    def cancel(self, handle):
+        """Take the item of <handle> out of this PriorityQueue, if it is
+        still there.
+
+        The item's entry stays in the heap until it reaches the top, unless
+        cancelled entries come to outnumber the live ones, in which case
+        they are all dropped and the heap is rebuilt.
+
+        @type self: PriorityQueue
+        @type handle: Handle
+        @rtype: None
+        """
+        entry = handle._entry
+        if not entry[2]:
+            return
+        entry[2] = False
+        self._cancelled += 1
+        if self._cancelled > len(self._items) - self._cancelled + 16:
+            self._items = [entry for entry in self._items if entry[2]]
+            heapify(self._items)
+            self._cancelled = 0
+
+    def add_all(self, items):
+        """Add every item in <items> to this PriorityQueue.
+
+        The items are appended and the heap is rebuilt once, which takes
+        linear time instead of one heap push per item. Items that compare
+        equal keep the order in which they appear in <items>.
+
+        @type self: PriorityQueue
+        @type items: iterable[object]
+        @rtype: None
+
+        >>> pq = PriorityQueue()
+        >>> pq.add("red")
+        >>> pq.add_all(["yellow", "blue", "green"])
+        >>> [pq.remove() for _ in range(4)]
         ['blue', 'green', 'red', 'yellow']
         """
-        self._items.append(item)
-        self._items.sort()
+        count = self._count
+        for item in items:
+            self._items.append([item, count, True])
+            count += 1
+        self._count = count
+        heapify(self._items)
+
+
+class CalendarQueue(Container):
+    """A calendar queue of timestamped items.
+
+    This is a priority queue specialised for items with a non-negative
+    integer <timestamp> attribute, such as Events. Items are removed in
+    increasing timestamp order; items with the same timestamp are removed in
+    FIFO order.
+
+    Items are spread over a ring of buckets, like days on a calendar: an item
+    with timestamp t goes in bucket (t // width) % number of buckets. The
+    number of buckets and their width are adjusted as the queue grows and
+    shrinks, so that each bucket holds only a few items and add and remove
+    take amortized constant time when most timestamps are close to the
+    current time.
+    """
+
+    # === Private Attributes ===
+    # @type _buckets: list[list[[int, int, object, bool]]]
+    #     The buckets. Each entry is a [timestamp, insertion number, item,
+    #     live] list, and each bucket is kept sorted. An entry is live until
+    #     its item is removed or cancelled.
+    # @type _width: int
+    #     The range of timestamps covered by one bucket in one year.
+    # @type _size: int
+    #     The number of items in the queue.
+    # @type _cancelled: int
+    #     The number of cancelled entries still in the buckets.
+    # @type _count: int
+    #     The number of items ever added; used as the next insertion number.
+    # @type _bucket: int
+    #     The index of the bucket the next search starts from.
+    # @type _bucket_top: int
+    #     The first timestamp past the part of the year covered by _bucket.
+    #
+    # === Representation Invariants ===
+    # No item in the queue has a timestamp less than _bucket_top - _width.
+
+    MIN_BUCKETS = 2
+
+    def __init__(self):
+        """Initialize an empty CalendarQueue.
+
+        @type self: CalendarQueue
+        @rtype: None
+        """
+        self._buckets = [[] for _ in range(self.MIN_BUCKETS)]
+        self._width = 1
+        self._size = 0
+        self._count = 0
+        self._cancelled = 0
+        self._set_position(0)
+
+    def _set_position(self, timestamp):
+        """Start the next search at the bucket that holds <timestamp>.
+
+        @type self: CalendarQueue
+        @type timestamp: int
+        @rtype: None
+        """
+        self._bucket = (timestamp // self._width) % len(self._buckets)
+        self._bucket_top = (timestamp // self._width + 1) * self._width
+
+    def add(self, item):
+        """Add <item> to this CalendarQueue.
+
+        @type self: CalendarQueue
+        @type item: object
+            Precondition: item.timestamp is a non-negative int.
+        @rtype: None
+
+        >>> from event import Event
+        >>> cq = CalendarQueue()
+        >>> for timestamp in [5, 1, 3]:
+        ...     cq.add(Event(timestamp))
+        >>> [cq.remove().timestamp for _ in range(3)]
+        [1, 3, 5]
+        """
+        self.schedule(item)
+
+    def schedule(self, item):
+        """Add <item> to this CalendarQueue and return a handle for it.
+
+        @type self: CalendarQueue
+        @type item: object
+            Precondition: item.timestamp is a non-negative int.
+        @rtype: Handle
+
+        >>> from event import Event
+        >>> cq = CalendarQueue()
+        >>> handles = [cq.schedule(Event(timestamp)) for timestamp in [5, 1, 3]]
+        >>> handles[1].cancel()
+        >>> [cq.remove().timestamp for _ in range(len(cq))]
+        [3, 5]
+        """
+        timestamp = item.timestamp
+        entry = [timestamp, self._count, item, True]
+        insort(self._buckets[(timestamp // self._width) % len(self._buckets)],
+               entry)
+        self._count += 1
+        self._size += 1
+        if timestamp < self._bucket_top - self._width:
+            self._set_position(timestamp)
+        if self._size > 2 * len(self._buckets):
+            self._resize(2 * len(self._buckets))
+        return Handle(self, entry)
+
+    def cancel(self, handle):
+        """Take the item of <handle> out of this CalendarQueue, if it is
+        still there.
+
+        The item's entry stays in its bucket until the search reaches it,
+        unless cancelled entries come to outnumber the live ones, in which
+        case the calendar is rebuilt without them.
+
+        @type self: CalendarQueue
+        @type handle: Handle
+        @rtype: None
+        """
+        entry = handle._entry
+        if not entry[3]:
+            return
+        entry[3] = False
+        self._size -= 1
+        self._cancelled += 1
+        if self._cancelled > self._size + 16:
+            self._resize(len(self._buckets))
+
+    def add_all(self, items):
+        """Add every item in <items> to this CalendarQueue.
+
+        The calendar is rebuilt once for all of the items, instead of
+        growing step by step.
+
+        @type self: CalendarQueue
+        @type items: iterable[object]
+        @rtype: None
+        """
+        entries = [entry for bucket in self._buckets for entry in bucket
+                   if entry[3]]
+        count = self._count
+        for item in items:
+            entries.append([item.timestamp, count, item, True])
+            count += 1
+        self._count = count
+        self._size = len(entries)
+        self._rebuild(entries, max(self.MIN_BUCKETS, len(entries)))
+
+    def _locate(self):
+        """Return the bucket whose first entry is the next item, and move
+        the search position to it.
+
+        Precondition: <self> should not be empty.
+
+        @type self: CalendarQueue
+        @rtype: list[[int, int, object, bool]]
+        """
+        buckets = self._buckets
+        i = self._bucket
+        top = self._bucket_top
+        for _ in range(len(buckets)):
+            bucket = buckets[i]
+            while bucket and not bucket[0][3]:
+                bucket.pop(0)
+                self._cancelled -= 1
+            if bucket and bucket[0][0] < top:
+                self._bucket = i
+                self._bucket_top = top
+                return bucket
+            i += 1
+            top += self._width
+            if i == len(buckets):
+                i = 0
+        # Every item is at least a year away; jump straight to the earliest.
+        self._set_position(min(bucket[0] for bucket in buckets if bucket)[0])
+        return buckets[self._bucket]
+
+    def remove(self):
+        """Remove and return the next item from this CalendarQueue.
+
+        Precondition: <self> should not be empty.
+
+        @type self: CalendarQueue
+        @rtype: object
+
+        >>> from event import Event
+        >>> cq = CalendarQueue()
+        >>> first, second = Event(4), Event(4)
+        >>> cq.add(first)
+        >>> cq.add(Event(100))
+        >>> cq.add(second)
+        >>> cq.remove() is first
+        True
+        >>> cq.remove() is second
+        True
+        >>> cq.remove().timestamp
+        100
+        """
+        entry = self._locate().pop(0)
+        entry[3] = False
+        item = entry[2]
+        self._size -= 1
+        if (self._size < len(self._buckets) // 2 and
+                len(self._buckets) > self.MIN_BUCKETS):
+            self._resize(len(self._buckets) // 2)
+        return item
+
+    def peek(self):
+        """Return the next item from this CalendarQueue without removing it.
+
+        Precondition: <self> should not be empty.
+
+        @type self: CalendarQueue
+        @rtype: object
+        """
+        return self._locate()[0][2]
+
+    def is_empty(self):
+        """Return True iff this CalendarQueue is empty.
+
+        @type self: CalendarQueue
+        @rtype: bool
+        """
+        return self._size == 0
+
+    def __len__(self):
+        """Return the number of items in this CalendarQueue.
+
+        @type self: CalendarQueue
+        @rtype: int
+        """
+        return self._size
+
+    def _resize(self, bucket_count):
+        """Redistribute the items over <bucket_count> buckets.
+
+        @type self: CalendarQueue
+        @type bucket_count: int
+        @rtype: None
+        """
+        self._rebuild([entry for bucket in self._buckets for entry in bucket
+                       if entry[3]], bucket_count)
+
+    def _rebuild(self, entries, bucket_count):
+        """Replace the buckets with <bucket_count> buckets holding <entries>.
+
+        The bucket width is set to about three times the average gap between
+        the earliest timestamps, so the items near the front of the queue
+        fall into different buckets.
+
+        @type self: CalendarQueue
+        @type entries: list[[int, int, object, bool]]
+            The live entries.
+        @type bucket_count: int
+        @rtype: None
+        """
+        self._cancelled = 0
+        sample = nsmallest(25, {entry[0] for entry in entries})
+        if len(sample) > 1:
+            self._width = max(1, 3 * (sample[-1] - sample[0]) //
+                              (len(sample) - 1))
+        else:
+            self._width = 1
+        self._buckets = [[] for _ in range(bucket_count)]
+        for entry in entries:
+            self._buckets[(entry[0] // self._width) % bucket_count].append(
+                entry)
+        for bucket in self._buckets:
+            bucket.sort()
+        if entries:
+            self._set_position(min(entries)[0])
+        else:
+            self._set_position(0)
+
+
+class WaitingQueue(Container):
+    """A first-in, first-out queue of items that can also be removed from
+    the middle by key.
+
+    Every item has a key, given by calling <key> on it; no two items in the
+    queue may have the same key. Adding, removing the oldest item, checking
+    membership and discarding an item by key all take amortized constant
+    time.
+    """
+
+    # === Private Attributes ===
+    # @type _key: callable
+    #     Returns the key of an item.
+    # @type _items: dict[object, (int, object)]
+    #     The (insertion number, item) pair for the key of each item.
+    # @type _order: deque[(int, object)]
+    #     (insertion number, key) pairs in insertion order. A pair whose
+    #     insertion number does not match _items is a discarded item.
+    # @type _count: int
+    #     The number of items ever added; used as the next insertion number.
+    #
+    # === Representation Invariants ===
+    # Every pair in _items has a matching pair in _order.
+
+    def __init__(self, key):
+        """Initialize an empty WaitingQueue.
+
+        @type self: WaitingQueue
+        @type key: callable
+            Returns the key of an item. It should be picklable (e.g. made
+            with operator.attrgetter) if the queue is to be saved.
+        @rtype: None
+        """
+        self._key = key
+        self._items = {}
+        self._order = deque()
+        self._count = 0
+
+    def __str__(self):
+        """Return a string representation.
+
+        @type self: WaitingQueue
+        @rtype: str
+        """
+        return str([pair[1] for pair in self._items.values()])
+
+    def add(self, item):
+        """Add <item> to the back of this WaitingQueue.
+
+        Precondition: no item with the same key is in the queue.
+
+        @type self: WaitingQueue
+        @type item: object
+        @rtype: None
+        """
+        key = self._key(item)
+        self._items[key] = (self._count, item)
+        self._order.append((self._count, key))
+        self._count += 1
+
+    def _drop_discarded(self):
+        """Remove the discarded items from the front of _order.
+
+        @type self: WaitingQueue
+        @rtype: None
+        """
+        order = self._order
+        items = self._items
+        while order and \
+                items.get(order[0][1], (None,))[0] != order[0][0]:
+            order.popleft()
+
+    def remove(self):
+        """Remove and return the oldest item in this WaitingQueue.
+
+        Precondition: <self> should not be empty.
+
+        @type self: WaitingQueue
+        @rtype: object
+
+        >>> wq = WaitingQueue(len)
+        >>> wq.add("a")
+        >>> wq.add("bb")
+        >>> wq.add("ccc")
+        >>> wq.discard("a")
+        >>> wq.remove()
+        'bb'
+        >>> "ccc" in wq
+        True
+        """
+        self._drop_discarded()
+        key = self._order.popleft()[1]
+        return self._items.pop(key)[1]
+
+    def peek(self):
+        """Return the oldest item in this WaitingQueue without removing it.
+
+        Precondition: <self> should not be empty.
+
+        @type self: WaitingQueue
+        @rtype: object
+        """
+        self._drop_discarded()
+        return self._items[self._order[0][1]][1]
+
+    def discard(self, item):
+        """Remove <item> from this WaitingQueue, if it is there.
+
+        @type self: WaitingQueue
+        @type item: object
+        @rtype: None
+        """
+        if self._items.pop(self._key(item), None) is not None and \
+                len(self._order) > 2 * len(self._items) + 16:
+            # Too many discarded items are waiting in _order; rebuild it.
+            # _items is in insertion order, since keys are only ever added
+            # when they are absent.
+            self._order = deque((number, key) for key, (number, _)
+                                in self._items.items())
+
+    def __iter__(self):
+        """Return an iterator over the items in this WaitingQueue, oldest
+        first.
+
+        @type self: WaitingQueue
+        @rtype: iterator[object]
+        """
+        return (pair[1] for pair in self._items.values())
+
+    def __contains__(self, item):
+        """Return True iff an item with the same key as <item> is in this
+        WaitingQueue.
+
+        @type self: WaitingQueue
+        @type item: object
+        @rtype: bool
+        """
+        return self._key(item) in self._items
+
+    def is_empty(self):
+        """Return True iff this WaitingQueue is empty.
+
+        @type self: WaitingQueue
+        @rtype: bool
+        """
+        return len(self._items) == 0
+
+    def __len__(self):
+        """Return the number of items in this WaitingQueue.
+
+        @type self: WaitingQueue
+        @rtype: int
+        """
+        return len(self._items)
@@ -1,5 +1,11 @@
+from operator import attrgetter
+
+from assignment import sparse_min_cost_assignment
+from container import WaitingQueue
 from driver import Driver
+from driver_index import DriverIndex
 from rider import Rider
+from travel import GridModel
 
 
 class Dispatcher:
@@ -16,16 +22,85 @@ class Dispatcher:
     the dispatcher does nothing. Once a driver requests a rider, the driver
     is registered with the dispatcher, and will be used to fulfill future
     rider requests.
+
+    Registered drivers that are idle are kept in an index, which finds
+    the closest one. By default this is a spatial DriverIndex, which does
+    not look at every driver; a FleetIndex from the fleet module, which
+    looks at every driver at once with NumPy, can be given instead.
+
+    A dispatcher can instead work in batches of a fixed time window. Then
+    requests are not fulfilled straight away: riders wait on the waiting
+    list, and at the end of each window the waiting riders and idle drivers
+    are paired so as to minimise the total travel time to the riders. Each
+    rider is only considered for a few of the nearest idle drivers, which
+    keeps a batch fast under heavy load.
+
+    Distances are measured with the dispatcher's travel model, which it
+    gives to every driver that registers and to its index of idle drivers.
+
+    === Attributes ===
+    @type driver_list: list[Driver]
+        A property holding the registered drivers, in the order they
+        registered.
+    @type rider_list: WaitingQueue[Rider]
+        The riders waiting for a driver, oldest first, keyed by rider id.
     """
 
-    def __init__(self):
+    # === Private Attributes ===
+    # @type _idle_drivers: DriverIndex | FleetIndex
+    #     The registered drivers that are currently idle.
+    # @type _drivers: dict[str, Driver]
+    #     The registered drivers by identifier, in the order they
+    #     registered.
+    # @type _batch_window: int | None
+    #     The length of a batch window, or None to fulfill each request as
+    #     it arrives.
+    # @type _batch_due: int | None
+    #     The time the next batch will be matched, or None if no batch is
+    #     scheduled.
+    # @type _batch_candidates: int
+    #     The number of nearest idle drivers each rider is considered for
+    #     in a batch.
+    # @type _travel_model: TravelModel
+    #     How distances are measured for the registered drivers.
+
+    def __init__(self, cell_size=8, batch_window=None, idle_index=None,
+                 batch_candidates=16, travel_model=None):
         """Initialize a Dispatcher.
 
         @type self: Dispatcher
+        @type cell_size: int
+            The width, in rows and columns, of a cell of the idle driver
+            index.
+        @type batch_window: int | None
+            If given, match riders and drivers in batches at the end of
+            every window of this many time units.
+            Precondition: batch_window > 0
+        @type idle_index: DriverIndex | FleetIndex | None
+            An empty index to keep the idle drivers in. A DriverIndex with
+            cells of <cell_size> is used if none is given. Either way the
+            index is given this dispatcher's travel model.
+        @type batch_candidates: int
+            In batch mode, the number of nearest idle drivers each rider
+            may be paired with.
+            Precondition: batch_candidates > 0
+        @type travel_model: TravelModel | None
+            How distances are measured, e.g. a RoadNetwork from the travel
+            module. Manhattan distance on the grid is used if none is given.
         @rtype: None
         """
-        self.driver_list = []
-        self.rider_list = []
+        if travel_model is None:
+            travel_model = GridModel()
+        if idle_index is None:
+            idle_index = DriverIndex(cell_size)
+        idle_index.travel_model = travel_model
+        self.rider_list = WaitingQueue(attrgetter("id"))
+        self._idle_drivers = idle_index
+        self._drivers = {}
+        self._batch_window = batch_window
+        self._batch_due = None
+        self._batch_candidates = batch_candidates
+        self._travel_model = travel_model
 
     def __str__(self):
         """Return a string representation.
@@ -36,56 +111,86 @@ class Dispatcher:
         return 'the available drivers are {} and the waiting riders are {}'\
             .format(self.driver_list, self.rider_list)
 
+    @property
+    def driver_list(self):
+        """Return the registered drivers, in the order they registered.
+
+        @type self: Dispatcher
+        @rtype: list[Driver]
+        """
+        return list(self._drivers.values())
+
+    def driver_counts(self):
+        """Return the number of registered drivers that are idle and the
+        number that are busy.
+
+        @type self: Dispatcher
+        @rtype: (int, int)
+        """
+        idle = len(self._idle_drivers)
+        return idle, len(self._drivers) - idle
+
     def request_driver(self, rider):
         """Return a driver for the rider, or None if no driver is available.
 
         Add the rider to the waiting list if there is no available driver.
+        In batch mode, the rider is always added to the waiting list.
 
         @type self: Dispatcher
         @type rider: Rider
         @rtype: Driver | None
         """
-
-        available_drivers = []
-        if len(self.driver_list) != 0:
-            for driver in self.driver_list:
-                if driver.is_idle:
-                    available_drivers.append(driver)
-
-        if len(available_drivers) != 0:
-            # just to compare to in the for loop
-            closest_driver = available_drivers[0]
-            min_drive_time = available_drivers[0].get_travel_time(rider.origin)
-
-            if len(available_drivers) == 1:
-                return closest_driver
-            else:
-                for driver in available_drivers[1:]:
-                    current_drive_time = driver.get_travel_time(rider.origin)
-                    if current_drive_time < min_drive_time:
-                        min_drive_time, closest_driver = current_drive_time, \
-                                                         driver
-        else:
-            self.rider_list.append(rider)
+        if self._batch_window is not None:
+            self.rider_list.add(rider)
             return None
-
+        closest_driver = self._idle_drivers.fastest(rider.origin)
+        if closest_driver is None:
+            self.rider_list.add(rider)
         return closest_driver
 
     def request_rider(self, driver):
         """Return a rider for the driver, or None if no rider is available.
 
-        If this is a new driver, register the driver for future rider requests.
+        The rider that has been waiting the longest is taken off the waiting
+        list and given to the driver.
+
+        If this is a new driver, register the driver for future rider requests,
+        and give it this dispatcher's travel model.
+        In batch mode, the driver is only registered and None is returned.
+        None is also returned if the driver has already been given a rider
+        since it asked, which can happen when a rider request is handled
+        between the driver becoming idle and its request.
 
         @type self: Dispatcher
         @type driver: Driver
         @rtype: Rider | None
         """
-        if driver in self.driver_list:
-            self.driver_list.append(driver)
-        if len(self.rider_list) == 0:
+        if driver.identifier not in self._drivers:
+            self._drivers[driver.identifier] = driver
+            driver.travel_model = self._travel_model
+            driver.track_idle(self._idle_drivers)
+        if self._batch_window is not None or not driver.is_idle or \
+                self.rider_list.is_empty():
             return None
         else:
-            return self.rider_list[0]
+            return self.rider_list.remove()
+
+    def unregister(self, driver):
+        """Forget <driver>, which will no longer be given riders by this
+        dispatcher unless it registers again.
+
+        The driver goes back to Manhattan distance until it registers with
+        a dispatcher again, so that it does not carry this dispatcher's
+        travel model along, e.g. when it is sent to another process.
+
+        @type self: Dispatcher
+        @type driver: Driver
+        @rtype: None
+        """
+        if self._drivers.pop(driver.identifier, None) is not None:
+            self._idle_drivers.discard(driver)
+            driver.track_idle(None)
+            driver.travel_model = GridModel()
 
     def cancel_ride(self, rider):
         """Cancel the ride for rider.
@@ -95,5 +200,73 @@ class Dispatcher:
         @rtype: None
         """
         # take him off the waiting list
-        if rider in self.rider_list:
-            self.rider_list.remove(rider)
+        self.rider_list.discard(rider)
+
+    def schedule_batch(self, timestamp):
+        """Return the time at which to match a new batch, or None if there is
+        no need for one.
+
+        A batch is needed in batch mode when riders are waiting, drivers are
+        idle and no batch has been scheduled yet. It is due at the end of the
+        window containing <timestamp>.
+
+        @type self: Dispatcher
+        @type timestamp: int
+            The current time.
+        @rtype: int | None
+        """
+        if self._batch_window is None or self._batch_due is not None or \
+                self.rider_list.is_empty() or len(self._idle_drivers) == 0:
+            return None
+        self._batch_due = (timestamp // self._batch_window + 1) * \
+            self._batch_window
+        return self._batch_due
+
+    def match_batch(self):
+        """Pair the waiting riders with the idle drivers, and return the
+        pairs as (rider, driver) tuples.
+
+        Each rider may only be paired with one of its nearest idle drivers,
+        so the cost of a batch grows with the number of riders rather than
+        with riders times drivers. As many riders as possible are paired,
+        the longest waiting first, and the pairs minimise the total travel
+        time of the drivers to those riders. The riders that are paired are
+        taken off the waiting list; a rider left over waits for the next
+        batch.
+
+        @type self: Dispatcher
+        @rtype: list[(Rider, Driver)]
+
+        >>> from location import Location
+        >>> dispatcher = Dispatcher(batch_window=5, batch_candidates=1)
+        >>> for name, row in [("a", 1), ("b", 3)]:
+        ...     _ = dispatcher.request_rider(Driver(name, Location(row, 1), 1))
+        >>> for name, row in [("x", 2), ("y", 4)]:
+        ...     _ = dispatcher.request_driver(
+        ...         Rider(name, Location(row, 1), Location(9, 9), 10))
+        >>> [(rider.id, driver.identifier)
+        ...  for rider, driver in dispatcher.match_batch()]
+        [('x', 'a'), ('y', 'b')]
+        """
+        self._batch_due = None
+        riders = list(self.rider_list)
+        drivers = []
+        column_of = {}
+        candidates = []
+        for rider in riders:
+            choices = []
+            for driver in self._idle_drivers.nearest(rider.origin,
+                                                     self._batch_candidates):
+                column = column_of.get(driver.identifier)
+                if column is None:
+                    column = column_of[driver.identifier] = len(drivers)
+                    drivers.append(driver)
+                choices.append((column,
+                                driver.get_travel_time(rider.origin)))
+            candidates.append(choices)
+
+        pairs = []
+        for i, j in sparse_min_cost_assignment(candidates):
+            self.rider_list.discard(riders[i])
+            pairs.append((riders[i], drivers[j]))
+        return pairs
@@ -1,5 +1,9 @@
-from location import Location, manhattan_distance
+from location import Location
 from rider import Rider
+from travel import GridModel
+
+# The travel model of drivers that have not registered with a dispatcher.
+_GRID_MODEL = GridModel()
 
 
 class Driver:
@@ -12,8 +16,22 @@ class Driver:
         The current location of the driver.
     @type is_idle: bool
         A property that is True if the driver is idle and False otherwise.
+    @type travel_model: TravelModel
+        How distances are measured for this driver. A dispatcher gives the
+        driver its own travel model when the driver registers; until then
+        it is Manhattan distance on the grid.
     """
 
+    __slots__ = ("identifier", "location", "speed", "destination",
+                 "travel_model", "_index", "_is_idle")
+
+    # === Private Attributes ===
+    # @type _is_idle: bool
+    #     The value of the is_idle property.
+    # @type _index: DriverIndex | None
+    #     The index of idle drivers this driver keeps itself in, or None if
+    #     the driver has not been registered with a dispatcher.
+
     def __init__(self, identifier, location, speed):
         """Initialize a Driver.
 
@@ -27,7 +45,9 @@ class Driver:
         self.location = location
         self.speed = speed
         self.destination = None
-        self.is_idle = True
+        self.travel_model = _GRID_MODEL
+        self._index = None
+        self._is_idle = True
 
     def __str__(self):
         """Return a string representation.
@@ -47,6 +67,46 @@ class Driver:
         return self.identifier == other.identifier, self.speed == other.speed, \
             self.location == other.location
 
+    @property
+    def is_idle(self):
+        """Return True iff this driver is idle.
+
+        @type self: Driver
+        @rtype: bool
+        """
+        return self._is_idle
+
+    @is_idle.setter
+    def is_idle(self, is_idle):
+        """Mark this driver as idle or busy, and update the index of idle
+        drivers to match.
+
+        An idle driver is indexed at its current location, so the location
+        must be up to date before the driver becomes idle.
+
+        @type self: Driver
+        @type is_idle: bool
+        @rtype: None
+        """
+        self._is_idle = is_idle
+        if self._index is not None:
+            if is_idle:
+                self._index.add(self)
+            else:
+                self._index.discard(self)
+
+    def track_idle(self, index):
+        """Keep this driver in <index> for as long as it is idle, or stop
+        keeping it in any index if <index> is None.
+
+        @type self: Driver
+        @type index: DriverIndex | None
+        @rtype: None
+        """
+        self._index = index
+        if index is not None and self._is_idle:
+            index.add(self)
+
     def get_travel_time(self, destination):
         """Return the time it will take to arrive at the destination,
         rounded to the nearest integer.
@@ -57,7 +117,8 @@ class Driver:
         """
         # travel time includes time to pick up rider and drop him off at his
         # destination?
-        return round(manhattan_distance(self.location, destination)/self.speed)
+        return round(self.travel_model.distance(self.location, destination) /
+                     self.speed)
 
     def start_drive(self, location):
         """Start driving to the location and return the time the drive will take.
@@ -69,7 +130,8 @@ class Driver:
         self.is_idle = False
         self.destination = location
 
-        return round(manhattan_distance(self.location, location)/self.speed)
+        return round(self.travel_model.distance(self.location, location) /
+                     self.speed)
 
     def end_drive(self):
         """End the drive and arrive at the destination.
@@ -91,7 +153,8 @@ class Driver:
 
         self.is_idle = False
         self.destination = rider.destination
-        return round(manhattan_distance(self.location, rider.destination) /
+        return round(self.travel_model.distance(self.location,
+                                                rider.destination) /
                      self.speed)
 
     def end_ride(self):
@@ -103,7 +166,7 @@ class Driver:
         @type self: Driver
         @rtype: None
         """
-        # make driver available again
-        self.is_idle = True
         # set self.location to the riders destination
         self.location = self.destination
+        # make driver available again
+        self.is_idle = True
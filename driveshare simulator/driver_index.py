@@ -0,0 +1,301 @@
+"""
+The driver_index module contains the DriverIndex class, a spatial index
+of the idle drivers known to a Dispatcher.
+"""
+from travel import GridModel
+
+
+class DriverIndex:
+    """An index of idle drivers, bucketed by location on a grid of square
+    cells.
+
+    Drivers add and remove themselves as they become idle or busy (see
+    Driver.is_idle). The index answers which idle driver can reach a given
+    location the fastest by searching the cells in rings of increasing
+    distance around that location, and stopping as soon as no driver in an
+    outer ring could beat the best one found so far. How far away an outer
+    ring must be depends on the travel model; with a travel model that
+    gives no lower bound, every ring is searched. Other than on the grid,
+    the candidates' distances all come from one Distances for the location,
+    which is told how far is too far to matter.
+
+    Ties in travel time are broken in favour of the driver that was added
+    to the index first.
+
+    === Attributes ===
+    @type travel_model: TravelModel
+        The travel model of the drivers in the index.
+    """
+
+    # === Private Attributes ===
+    # @type _cell_size: int
+    #     The number of rows and columns covered by one cell.
+    # @type _cells: dict[(int, int), dict[str, Driver]]
+    #     The idle drivers in each non-empty cell, keyed by identifier.
+    # @type _cell_of: dict[str, (int, int)]
+    #     The cell each idle driver is in.
+    # @type _order: dict[str, int]
+    #     The order in which each driver was first added to the index.
+    # @type _max_speed: int
+    #     The highest speed of any driver ever added to the index.
+    # @type _bounds: list[int] | None
+    #     The smallest and largest cell row and column ever used, as
+    #     [min row, max row, min column, max column].
+
+    def __init__(self, cell_size=8, travel_model=None):
+        """Initialize an empty DriverIndex.
+
+        @type self: DriverIndex
+        @type cell_size: int
+            The number of rows and columns covered by one cell.
+            Precondition: cell_size > 0
+        @type travel_model: TravelModel | None
+            The travel model of the drivers that will be added, or None for
+            Manhattan distance on the grid.
+        @rtype: None
+        """
+        if travel_model is None:
+            travel_model = GridModel()
+        self.travel_model = travel_model
+        self._cell_size = cell_size
+        self._cells = {}
+        self._cell_of = {}
+        self._order = {}
+        self._max_speed = 0
+        self._bounds = None
+
+    def __len__(self):
+        """Return the number of idle drivers in this DriverIndex.
+
+        @type self: DriverIndex
+        @rtype: int
+        """
+        return len(self._cell_of)
+
+    def __iter__(self):
+        """Return an iterator over the idle drivers, in the order they were
+        first added to this DriverIndex.
+
+        @type self: DriverIndex
+        @rtype: iterator[Driver]
+        """
+        drivers = [driver for cell in self._cells.values()
+                   for driver in cell.values()]
+        drivers.sort(key=lambda driver: self._order[driver.identifier])
+        return iter(drivers)
+
+    def __contains__(self, driver):
+        """Return True iff <driver> is in this DriverIndex.
+
+        @type self: DriverIndex
+        @type driver: Driver
+        @rtype: bool
+        """
+        return driver.identifier in self._cell_of
+
+    def add(self, driver):
+        """Add the idle <driver> at its current location.
+
+        @type self: DriverIndex
+        @type driver: Driver
+        @rtype: None
+        """
+        self.discard(driver)
+        key = (driver.location.row // self._cell_size,
+               driver.location.column // self._cell_size)
+        self._cells.setdefault(key, {})[driver.identifier] = driver
+        self._cell_of[driver.identifier] = key
+        if driver.identifier not in self._order:
+            self._order[driver.identifier] = len(self._order)
+        self._max_speed = max(self._max_speed, driver.speed)
+
+        if self._bounds is None:
+            self._bounds = [key[0], key[0], key[1], key[1]]
+        else:
+            bounds = self._bounds
+            bounds[0] = min(bounds[0], key[0])
+            bounds[1] = max(bounds[1], key[0])
+            bounds[2] = min(bounds[2], key[1])
+            bounds[3] = max(bounds[3], key[1])
+
+    def discard(self, driver):
+        """Remove <driver> from this DriverIndex, if it is there.
+
+        @type self: DriverIndex
+        @type driver: Driver
+        @rtype: None
+        """
+        key = self._cell_of.pop(driver.identifier, None)
+        if key is not None:
+            cell = self._cells[key]
+            del cell[driver.identifier]
+            if not cell:
+                del self._cells[key]
+
+    def fastest(self, location):
+        """Return the idle driver with the shortest travel time to
+        <location>, or None if there are no idle drivers.
+
+        @type self: DriverIndex
+        @type location: Location
+        @rtype: Driver | None
+
+        >>> from driver import Driver
+        >>> from location import Location
+        >>> index = DriverIndex(cell_size=2)
+        >>> index.add(Driver("slow", Location(1, 1), 1))
+        >>> index.add(Driver("fast", Location(9, 9), 10))
+        >>> index.fastest(Location(1, 2)).identifier
+        'slow'
+        >>> index.fastest(Location(5, 5)).identifier
+        'fast'
+        """
+        if not self._cell_of:
+            return None
+
+        size = self._cell_size
+        row, column = location.row // size, location.column // size
+        bounds = self._bounds
+        reach = max(row - bounds[0], bounds[1] - row,
+                    column - bounds[2], bounds[3] - column)
+
+        # Every distance is at least this multiple of the grid distance.
+        ratio = self.travel_model.min_ratio
+        distances = self._distances_to(location)
+        best = None
+        best_time = 0
+        best_order = 0
+        bound = None
+        for ring in range(reach + 1):
+            # Every driver in this ring is at least this far away.
+            if best is not None and ring > 0 and ratio > 0 and \
+                    round(((ring - 1) * size + 1) * ratio /
+                          self._max_speed) > best_time:
+                break
+            for key in _ring(row, column, ring):
+                cell = self._cells.get(key)
+                if cell is None:
+                    continue
+                for driver in cell.values():
+                    if distances is None:
+                        travel_time = driver.get_travel_time(location)
+                    else:
+                        distance = distances.distance(driver.location, bound)
+                        if distance is None:
+                            continue
+                        travel_time = round(distance / driver.speed)
+                    order = self._order[driver.identifier]
+                    if best is None or travel_time < best_time or \
+                            (travel_time == best_time and order < best_order):
+                        best, best_time, best_order = \
+                            driver, travel_time, order
+                        bound = self._bound(best_time)
+        return best
+
+    def nearest(self, location, count):
+        """Return up to <count> idle drivers with the shortest travel times
+        to <location>, fastest first.
+
+        Ties in travel time are broken as in fastest.
+
+        @type self: DriverIndex
+        @type location: Location
+        @type count: int
+        @rtype: list[Driver]
+
+        >>> from driver import Driver
+        >>> from location import Location
+        >>> index = DriverIndex(cell_size=2)
+        >>> index.add(Driver("far", Location(9, 9), 1))
+        >>> index.add(Driver("near", Location(1, 1), 1))
+        >>> index.add(Driver("middle", Location(4, 4), 1))
+        >>> [driver.identifier for driver in index.nearest(Location(1, 2), 2)]
+        ['near', 'middle']
+        """
+        if not self._cell_of or count <= 0:
+            return []
+
+        size = self._cell_size
+        row, column = location.row // size, location.column // size
+        bounds = self._bounds
+        reach = max(row - bounds[0], bounds[1] - row,
+                    column - bounds[2], bounds[3] - column)
+
+        ratio = self.travel_model.min_ratio
+        distances = self._distances_to(location)
+        found = []
+        bound = None
+        for ring in range(reach + 1):
+            # Stop once no driver in this ring could beat the count found.
+            if len(found) == count and ring > 0 and ratio > 0 and \
+                    round(((ring - 1) * size + 1) * ratio /
+                          self._max_speed) > found[-1][0]:
+                break
+            for key in _ring(row, column, ring):
+                cell = self._cells.get(key)
+                if cell is None:
+                    continue
+                for driver in cell.values():
+                    if distances is None:
+                        travel_time = driver.get_travel_time(location)
+                    else:
+                        distance = distances.distance(driver.location, bound)
+                        if distance is None:
+                            continue
+                        travel_time = round(distance / driver.speed)
+                    found.append((travel_time,
+                                  self._order[driver.identifier], driver))
+            if len(found) >= count:
+                # The orders are distinct, so drivers are never compared.
+                found.sort()
+                del found[count:]
+                bound = self._bound(found[-1][0])
+        found.sort()
+        return [driver for _, _, driver in found]
+
+    def _distances_to(self, location):
+        """Return a Distances to <location> for scoring the drivers, or None
+        to score them with Driver.get_travel_time, as on the grid, where
+        that is cheapest.
+
+        @type self: DriverIndex
+        @type location: Location
+        @rtype: Distances | None
+        """
+        if type(self.travel_model) is GridModel:
+            return None
+        return self.travel_model.distances_to(location)
+
+    def _bound(self, travel_time):
+        """Return a distance beyond which no driver could have a travel time
+        of <travel_time> or less.
+
+        @type self: DriverIndex
+        @type travel_time: int
+        @rtype: float
+        """
+        # round never rounds up a value that is less than half past.
+        return (travel_time + 0.5) * self._max_speed
+
+
+def _ring(row, column, radius):
+    """Yield the cells exactly <radius> cells away from (row, column), in
+    the sense that they differ by <radius> in their row or their column.
+
+    @type row: int
+    @type column: int
+    @type radius: int
+    @rtype: iterator[(int, int)]
+
+    >>> sorted(_ring(0, 0, 1))
+    [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+    """
+    if radius == 0:
+        yield row, column
+        return
+    for c in range(column - radius, column + radius + 1):
+        yield row - radius, c
+        yield row + radius, c
+    for r in range(row - radius + 1, row + radius):
+        yield r, column - radius
+        yield r, column + radius
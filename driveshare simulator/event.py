@@ -28,8 +28,16 @@ class Event:
     === Attributes ===
     @type timestamp: int
         A timestamp for this event.
+    @type cancellable: bool
+        Whether this kind of event may be cancelled after it is scheduled.
+        The simulation schedules such events with a handle, which it stores
+        in their handle attribute.
     """
 
+    __slots__ = ("timestamp",)
+
+    cancellable = False
+
     def __init__(self, timestamp):
         """Initialize an Event with a given timestamp.
 
@@ -190,6 +198,8 @@ class RiderRequest(Event):
         The rider.
     """
 
+    __slots__ = ("rider",)
+
     def __init__(self, timestamp, rider):
         """Initialize a RiderRequest event.
 
@@ -206,7 +216,8 @@ class RiderRequest(Event):
         the rider.
 
         Return a Cancellation event. If the rider is assigned to a driver,
-        also return a Pickup event.
+        also return a Pickup event. If the dispatcher works in batches and
+        needs a new batch, also return a BatchMatch event.
 
         @type self: RiderRequest
         @type dispatcher: Dispatcher
@@ -222,8 +233,13 @@ class RiderRequest(Event):
             travel_time = driver.start_drive(self.rider.origin)
             events.append(Pickup(self.timestamp + travel_time, self.rider,
                                  driver))
-        events.append(Cancellation(self.timestamp + self.rider.patience, self.
-                                   rider))
+        batch_time = dispatcher.schedule_batch(self.timestamp)
+        if batch_time is not None:
+            events.append(BatchMatch(batch_time))
+        cancellation = Cancellation(self.timestamp + self.rider.patience,
+                                    self.rider)
+        self.rider.cancellation = cancellation
+        events.append(cancellation)
         return events
 
     def __str__(self):
@@ -243,6 +259,8 @@ class DriverRequest(Event):
         The driver.
     """
 
+    __slots__ = ("driver",)
+
     def __init__(self, timestamp, driver):
         """Initialize a DriverRequest event.
 
@@ -257,7 +275,8 @@ class DriverRequest(Event):
         """Register the driver, if this is the first request, and
         assign a rider to the driver, if one is available.
 
-        If a rider is available, return a Pickup event.
+        If a rider is available, return a Pickup event. If the dispatcher
+        works in batches and needs a new batch, return a BatchMatch event.
 
         @type self: DriverRequest
         @type dispatcher: Dispatcher
@@ -265,9 +284,6 @@ class DriverRequest(Event):
         @rtype: list[Event]
         """
 
-        if len(dispatcher.driver_list) == 0:
-            dispatcher.driver_list.append(self.driver)
-
         # Notify the monitor about the request.
         monitor.notify(self.timestamp, DRIVER, REQUEST,
                        self.driver.identifier, self.driver.location)
@@ -285,6 +301,10 @@ class DriverRequest(Event):
             self.driver.location = rider.origin
             return events
 
+        batch_time = dispatcher.schedule_batch(self.timestamp)
+        if batch_time is not None:
+            return [BatchMatch(batch_time)]
+
     def __str__(self):
         """Return a string representation of this event.
 
@@ -294,7 +314,61 @@ class DriverRequest(Event):
         return "{} -- {}: Request a rider".format(self.timestamp, self.driver)
 
 
+class BatchMatch(Event):
+    """The dispatcher matches the riders and drivers that have gathered
+    during a batch window.
+    """
+
+    __slots__ = ()
+
+    def do(self, dispatcher, monitor):
+        """Pair the waiting riders with idle drivers, and start each driver
+        driving to their rider.
+
+        Return a Pickup event for each pair, and another BatchMatch event if
+        riders and drivers are still waiting to be paired.
+
+        @type self: BatchMatch
+        @type dispatcher: Dispatcher
+        @type monitor: Monitor
+        @rtype: list[Event]
+        """
+        events = []
+        for rider, driver in dispatcher.match_batch():
+            travel_time = driver.start_drive(rider.origin)
+            events.append(Pickup(self.timestamp + travel_time, rider, driver))
+
+        batch_time = dispatcher.schedule_batch(self.timestamp)
+        if batch_time is not None:
+            events.append(BatchMatch(batch_time))
+        return events
+
+    def __str__(self):
+        """Return a string representation of this event.
+
+        @type self: BatchMatch
+        @rtype: str
+        """
+        return "{} -- batch match".format(self.timestamp)
+
+
 class Cancellation(Event):
+    """A rider runs out of patience.
+
+    Cancellations are cancellable: once the rider is picked up, the
+    Cancellation can no longer do anything, and is taken out of the queue.
+
+    === Attributes ===
+    @type rider: Rider
+        The rider.
+    @type handle: Handle | None
+        The handle this event was scheduled with, or None if it has not
+        been scheduled with one.
+    """
+
+    __slots__ = ("rider", "handle")
+
+    cancellable = True
 
     def __init__(self, timestamp, rider):
         """Initialize a Cancellation event.
@@ -305,6 +379,18 @@ class Cancellation(Event):
         """
         super().__init__(timestamp)
         self.rider = rider
+        self.handle = None
+
+    def cancel(self):
+        """Take this event out of the queue it was scheduled in, if it was
+        scheduled with a handle.
+
+        @type self: Cancellation
+        @rtype: None
+        """
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
 
     def do(self, dispatcher, monitor):
         """Changes a waiting rider to a cancelled rider.
@@ -317,6 +403,7 @@ class Cancellation(Event):
         @rtype: None
         """
 
+        self.rider.cancellation = None
         if self.rider.status != SATISFIED:
             dispatcher.cancel_ride(self.rider)
             self.rider.status = CANCELLED
@@ -335,6 +422,8 @@ class Cancellation(Event):
 
 class Pickup(Event):
 
+    __slots__ = ("rider", "driver")
+
     def __init__(self, timestamp, rider, driver):
         """Initialize a Pickup event
 
@@ -374,8 +463,10 @@ class Pickup(Event):
             # Start the ride
             ride_time = self.driver.start_ride(self.rider)
             self.rider.status = SATISFIED
-            if self.rider in dispatcher.rider_list:
-                dispatcher.rider_list.remove(self.rider)
+            # The rider can no longer cancel.
+            if self.rider.cancellation is not None:
+                self.rider.cancellation.cancel()
+                self.rider.cancellation = None
 
             # Create a new dropoff event
             events.append(Dropoff(self.timestamp+ride_time, self.rider,
@@ -406,6 +497,8 @@ class Pickup(Event):
 
 class Dropoff(Event):
 
+    __slots__ = ("rider", "driver")
+
     def __init__(self, timestamp, rider, driver):
         """Initialize a Dropoff event
 
@@ -459,46 +552,88 @@ def create_event_list(filename):
         The name of a file that contains the list of events.
     @rtype: list[Event]
     """
+    return list(read_events(filename))
 
-    events = []
-    with open(filename, "r") as file:
-        for line in file:
-            line = line.strip()
 
-            if not line or line.startswith("#"):
-                # Skip lines that are blank or start with #.
-                continue
+def read_events(filename):
+    """Yield the Events in <filename> one at a time, in file order.
 
-            # Create a list of words in the line, e.g.
-            # ['10', 'RiderRequest', 'Cerise', '4,2', '1,5', '15'].
-            # Note that these are strings, and you'll need to convert some
-            # of them to a different type.
-            tokens = line.split()
-            timestamp = int(tokens[0])
-            event_type = tokens[1]
+    Unlike create_event_list, only one line of the file is held in memory at
+    a time, so this can be used to stream very large traces into
+    Simulation.run.
 
-            # HINT: Use Location.deserialize to convert the location string to
-            # a location.
+    Precondition: the file stored at <filename> is in the format specified
+    by the assignment handout.
+
+    @param filename: str
+        The name of a file that contains the list of events.
+    @rtype: iterator[Event]
+    """
+    with open(filename, "r") as file:
+        for line in file:
+            event = parse_event(line)
+            if event is not None:
+                yield event
 
-            if event_type == "DriverRequest":
 
-                # Create a DriverRequest event.
-                driver_id = tokens[2]
-                location_id = deserialize_location(tokens[3])
-                speed_id = int(tokens[4])
-                driver = Driver(driver_id, location_id, speed_id)
-                event = DriverRequest(timestamp, driver)
+def parse_event(line):
+    """Return the Event described by one <line> of an event file, or None
+    if the line is blank or a comment.
 
-            elif event_type == "RiderRequest":
+    Raise ValueError if the line is not a DriverRequest or a RiderRequest.
 
-                # Create a RiderRequest event.
-                rider_id = tokens[2]
-                origin_id = deserialize_location(tokens[3])
-                destination_id = deserialize_location(tokens[4])
-                patience_id = int(tokens[5])
-                rider = Rider(rider_id, origin_id, destination_id, patience_id)
-                event = RiderRequest(timestamp, rider)
+    Precondition: <line> is otherwise in the format specified by the
+    assignment handout.
 
-            events.append(event)
+    @type line: str
+    @rtype: Event | None
 
-    return events
+    >>> parse_event("5 RiderRequest Cerise 4,2 1,5 15").rider.id
+    'Cerise'
+    >>> parse_event("# a comment") is None
+    True
+    >>> parse_event("1 Pickup x 1,1")
+    Traceback (most recent call last):
+    ...
+    ValueError: unknown event type: Pickup
+    """
+    line = line.strip()
+
+    if not line or line.startswith("#"):
+        # Skip lines that are blank or start with #.
+        return None
+
+    # Create a list of words in the line, e.g.
+    # ['10', 'RiderRequest', 'Cerise', '4,2', '1,5', '15'].
+    # Note that these are strings, and you'll need to convert some
+    # of them to a different type.
+    tokens = line.split()
+    timestamp = int(tokens[0])
+    event_type = tokens[1]
+
+    # HINT: Use Location.deserialize to convert the location string to
+    # a location.
+
+    if event_type == "DriverRequest":
+
+        # Create a DriverRequest event.
+        driver_id = tokens[2]
+        location_id = deserialize_location(tokens[3])
+        speed_id = int(tokens[4])
+        driver = Driver(driver_id, location_id, speed_id)
+        event = DriverRequest(timestamp, driver)
+
+    elif event_type == "RiderRequest":
+
+        # Create a RiderRequest event.
+        rider_id = tokens[2]
+        origin_id = deserialize_location(tokens[3])
+        destination_id = deserialize_location(tokens[4])
+        patience_id = int(tokens[5])
+        rider = Rider(rider_id, origin_id, destination_id, patience_id)
+        event = RiderRequest(timestamp, rider)
+
+    else:
+        raise ValueError("unknown event type: {}".format(event_type))
+
+    return event
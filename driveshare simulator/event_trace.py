@@ -0,0 +1,181 @@
+"""
+The event_trace module converts event files from the text format read by
+event.create_event_list into a compact binary format, and reads events back
+from that format.
+
+A binary trace holds the events in columns, each a packed array of
+integers, so that reading it back needs no string parsing at all:
+
+    header       magic b"DSEV", format version, event count, id table size
+    timestamp    int64 per event
+    kind         uint8 per event (DRIVER_REQUEST or RIDER_REQUEST)
+    identifier   uint32 per event, an index into the id table
+    row, column  int32 per event, the driver location or rider origin
+    to_row       int32 per event, the rider destination (0 for drivers)
+    to_column    int32 per event, the rider destination (0 for drivers)
+    value        int32 per event, the driver speed or rider patience
+    id table     the distinct identifiers, utf-8, separated by newlines
+
+Each column starts on an 8-byte boundary. Integers are little-endian.
+
+=== Constants ===
+@type DRIVER_REQUEST: int
+    The kind of a DriverRequest event.
+@type RIDER_REQUEST: int
+    The kind of a RiderRequest event.
+"""
+import mmap
+import struct
+import sys
+from array import array
+
+from driver import Driver
+from event import DriverRequest, RiderRequest
+from location import Location
+from rider import Rider
+
+DRIVER_REQUEST = 0
+RIDER_REQUEST = 1
+
+_MAGIC = b"DSEV"
+_VERSION = 1
+_HEADER = struct.Struct("<4sIQQ")
+# The name and array typecode of each column, in file order.
+_COLUMNS = [("timestamp", "q"), ("kind", "B"), ("identifier", "I"),
+            ("row", "i"), ("column", "i"), ("to_row", "i"),
+            ("to_column", "i"), ("value", "i")]
+
+
+def _padding(size):
+    """Return the number of bytes needed to pad <size> bytes to a multiple
+    of 8.
+
+    @type size: int
+    @rtype: int
+
+    >>> _padding(13)
+    3
+    >>> _padding(16)
+    0
+    """
+    return -size % 8
+
+
+def convert_trace(text_filename, binary_filename):
+    """Convert the text event file <text_filename> into a binary trace
+    written to <binary_filename>, and return the number of events.
+
+    The columns are built up in packed arrays, so this needs about 30 bytes
+    of memory per event.
+
+    Precondition: the file stored at <text_filename> is in the format
+    specified by the assignment handout.
+
+    @type text_filename: str
+    @type binary_filename: str
+    @rtype: int
+    """
+    columns = {name: array(code) for name, code in _COLUMNS}
+    ids = {}
+    with open(text_filename, "r") as file:
+        for line in file:
+            tokens = line.split()
+            if not tokens or tokens[0].startswith("#"):
+                continue
+
+            row, column = tokens[3].split(",")
+            if tokens[1] == "DriverRequest":
+                kind = DRIVER_REQUEST
+                to_row, to_column = 0, 0
+                value = tokens[4]
+            elif tokens[1] == "RiderRequest":
+                kind = RIDER_REQUEST
+                to_row, to_column = tokens[4].split(",")
+                value = tokens[5]
+            else:
+                raise ValueError("unknown event type: {}".format(tokens[1]))
+
+            columns["timestamp"].append(int(tokens[0]))
+            columns["kind"].append(kind)
+            columns["identifier"].append(
+                ids.setdefault(tokens[2], len(ids)))
+            columns["row"].append(int(row))
+            columns["column"].append(int(column))
+            columns["to_row"].append(int(to_row))
+            columns["to_column"].append(int(to_column))
+            columns["value"].append(int(value))
+
+    count = len(columns["timestamp"])
+    id_table = "\n".join(ids).encode("utf-8")
+    with open(binary_filename, "wb") as file:
+        file.write(_HEADER.pack(_MAGIC, _VERSION, count, len(id_table)))
+        file.write(bytes(_padding(_HEADER.size)))
+        for name, _ in _COLUMNS:
+            if sys.byteorder != "little":
+                columns[name].byteswap()
+            data = columns[name].tobytes()
+            file.write(data)
+            file.write(bytes(_padding(len(data))))
+        file.write(id_table)
+    return count
+
+
+def read_trace(filename):
+    """Yield the Events in the binary trace <filename> one at a time, in
+    file order.
+
+    The file is memory-mapped and each column is read in place, so the
+    events are produced without any string parsing. This can be passed to
+    Simulation.run in streaming mode.
+
+    @type filename: str
+    @rtype: iterator[Event]
+    """
+    with open(filename, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, version, count, id_size = _HEADER.unpack_from(data)
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError("{} is not a version {} event trace".format(
+                    filename, _VERSION))
+
+            view = memoryview(data)
+            columns = []
+            offset = _HEADER.size + _padding(_HEADER.size)
+            try:
+                for name, code in _COLUMNS:
+                    size = count * array(code).itemsize
+                    columns.append(view[offset:offset + size].cast(code))
+                    offset += size + _padding(size)
+                if sys.byteorder != "little":
+                    # Fall back to swapped copies on big-endian machines.
+                    for i, (name, code) in enumerate(_COLUMNS):
+                        swapped = array(code, columns[i])
+                        swapped.byteswap()
+                        columns[i].release()
+                        columns[i] = swapped
+                ids = bytes(view[offset:offset + id_size]).decode(
+                    "utf-8").split("\n")
+
+                timestamps, kinds, identifiers, rows, cols, to_rows, \
+                    to_cols, values = columns
+                for i in range(count):
+                    location = Location(rows[i], cols[i])
+                    if kinds[i] == DRIVER_REQUEST:
+                        yield DriverRequest(timestamps[i], Driver(
+                            ids[identifiers[i]], location, values[i]))
+                    else:
+                        yield RiderRequest(timestamps[i], Rider(
+                            ids[identifiers[i]], location,
+                            Location(to_rows[i], to_cols[i]), values[i]))
+            finally:
+                # The mapping can only be closed once no views are left.
+                for column in columns:
+                    if isinstance(column, memoryview):
+                        column.release()
+                view.release()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python event_trace.py EVENTS.txt TRACE.bin")
+    print("{} events written".format(convert_trace(sys.argv[1], sys.argv[2])))
@@ -0,0 +1,236 @@
+"""
+The fleet module contains FleetIndex, an index of idle drivers that keeps
+the fleet's state in NumPy arrays, so that the fastest idle driver to a
+location is found with one vectorized computation over the whole fleet.
+
+A FleetIndex can be used in place of a DriverIndex by a Dispatcher. It does
+no spatial pruning, so it is best suited to large fleets with many idle
+drivers spread over the grid, where a DriverIndex would visit many cells.
+
+This module requires NumPy.
+"""
+import numpy as np
+
+from driver import Driver
+from travel import GridModel
+
+
+class FleetIndex:
+    """An index of idle drivers backed by arrays of driver state.
+
+    Each driver is given a slot the first time it is added, and keeps it.
+    Slot i of the arrays holds the row, column and speed of the driver in
+    that slot, and whether it is idle. A driver's slot is refreshed every
+    time the driver becomes idle, which is when its location changes for
+    good, and the arrays are only read for idle drivers.
+
+    Ties in travel time are broken in favour of the driver that was added
+    to the index first, as in DriverIndex.
+
+    === Attributes ===
+    @type rows: numpy.ndarray
+        The row of the driver in each slot.
+    @type columns: numpy.ndarray
+        The column of the driver in each slot.
+    @type speeds: numpy.ndarray
+        The speed of the driver in each slot.
+    @type idle: numpy.ndarray
+        Whether the driver in each slot is idle and in this index.
+    @type travel_model: TravelModel
+        The travel model of the drivers in the index.
+    """
+
+    # === Private Attributes ===
+    # @type _drivers: list[Driver]
+    #     The driver in each slot.
+    # @type _slot_of: dict[str, int]
+    #     The slot of each driver, by identifier.
+    # @type _idle_count: int
+    #     The number of idle drivers.
+
+    def __init__(self, capacity=1024, travel_model=None):
+        """Initialize an empty FleetIndex.
+
+        @type self: FleetIndex
+        @type capacity: int
+            The number of slots to allocate at first. The arrays double in
+            size whenever they run out of slots.
+            Precondition: capacity > 0
+        @type travel_model: TravelModel | None
+            The travel model of the drivers that will be added, or None for
+            Manhattan distance on the grid.
+        @rtype: None
+        """
+        if travel_model is None:
+            travel_model = GridModel()
+        self.travel_model = travel_model
+        self.rows = np.zeros(capacity, np.int64)
+        self.columns = np.zeros(capacity, np.int64)
+        self.speeds = np.ones(capacity, np.float64)
+        self.idle = np.zeros(capacity, np.bool_)
+        self._drivers = []
+        self._slot_of = {}
+        self._idle_count = 0
+
+    def __len__(self):
+        """Return the number of idle drivers in this FleetIndex.
+
+        @type self: FleetIndex
+        @rtype: int
+        """
+        return self._idle_count
+
+    def __iter__(self):
+        """Return an iterator over the idle drivers, in the order they were
+        first added to this FleetIndex.
+
+        @type self: FleetIndex
+        @rtype: iterator[Driver]
+        """
+        drivers = self._drivers
+        return iter([drivers[slot] for slot in
+                     np.flatnonzero(self.idle[:len(drivers)])])
+
+    def __contains__(self, driver):
+        """Return True iff <driver> is in this FleetIndex.
+
+        @type self: FleetIndex
+        @type driver: Driver
+        @rtype: bool
+        """
+        slot = self._slot_of.get(driver.identifier)
+        return slot is not None and bool(self.idle[slot])
+
+    def add(self, driver):
+        """Add the idle <driver> at its current location.
+
+        @type self: FleetIndex
+        @type driver: Driver
+        @rtype: None
+        """
+        slot = self._slot_of.get(driver.identifier)
+        if slot is None:
+            slot = len(self._drivers)
+            if slot == len(self.idle):
+                self._grow()
+            self._slot_of[driver.identifier] = slot
+            self._drivers.append(driver)
+        self._drivers[slot] = driver
+        self.rows[slot] = driver.location.row
+        self.columns[slot] = driver.location.column
+        self.speeds[slot] = driver.speed
+        if not self.idle[slot]:
+            self.idle[slot] = True
+            self._idle_count += 1
+
+    def discard(self, driver):
+        """Remove <driver> from this FleetIndex, if it is there.
+
+        @type self: FleetIndex
+        @type driver: Driver
+        @rtype: None
+        """
+        slot = self._slot_of.get(driver.identifier)
+        if slot is not None and self.idle[slot]:
+            self.idle[slot] = False
+            self._idle_count -= 1
+
+    def _grow(self):
+        """Double the number of slots.
+
+        @type self: FleetIndex
+        @rtype: None
+        """
+        extra = len(self.idle)
+        self.rows = np.concatenate([self.rows, np.zeros(extra, np.int64)])
+        self.columns = np.concatenate([self.columns,
+                                       np.zeros(extra, np.int64)])
+        self.speeds = np.concatenate([self.speeds,
+                                      np.ones(extra, np.float64)])
+        self.idle = np.concatenate([self.idle, np.zeros(extra, np.bool_)])
+
+    def travel_times(self, location):
+        """Return the travel time of every slot's driver to <location>, as
+        an array of floats with infinity for the drivers that are not idle.
+
+        With the default grid travel model the times are computed in one
+        vectorized expression. Other travel models measure the distance of
+        every idle driver through one Distances.
+
+        @type self: FleetIndex
+        @type location: Location
+        @rtype: numpy.ndarray
+
+        >>> from location import Location
+        >>> index = FleetIndex()
+        >>> index.add(Driver("a", Location(1, 1), 2))
+        >>> index.add(Driver("b", Location(4, 4), 1))
+        >>> index.travel_times(Location(1, 4)).tolist()
+        [2.0, 3.0]
+        """
+        count = len(self._drivers)
+        idle = self.idle[:count]
+        if type(self.travel_model) is GridModel:
+            distances = np.abs(self.rows[:count] - location.row) + \
+                np.abs(self.columns[:count] - location.column)
+            # np.rint rounds halves to even, as round does.
+            times = np.rint(distances / self.speeds[:count])
+            times[~idle] = np.inf
+            return times
+        # One search measures every idle driver's distance.
+        distances = self.travel_model.distances_to(location)
+        times = np.full(count, np.inf)
+        for slot in np.flatnonzero(idle):
+            driver = self._drivers[slot]
+            times[slot] = round(distances.distance(driver.location) /
+                                driver.speed)
+        return times
+
+    def fastest(self, location):
+        """Return the idle driver with the shortest travel time to
+        <location>, or None if there are no idle drivers.
+
+        @type self: FleetIndex
+        @type location: Location
+        @rtype: Driver | None
+
+        >>> from location import Location
+        >>> index = FleetIndex(capacity=1)
+        >>> index.add(Driver("slow", Location(1, 1), 1))
+        >>> index.add(Driver("fast", Location(9, 9), 10))
+        >>> index.fastest(Location(1, 2)).identifier
+        'slow'
+        >>> index.fastest(Location(5, 5)).identifier
+        'fast'
+        """
+        if self._idle_count == 0:
+            return None
+        # argmin returns the first, so the earliest added, of any ties.
+        return self._drivers[int(np.argmin(self.travel_times(location)))]
+
+    def nearest(self, location, count):
+        """Return up to <count> idle drivers with the shortest travel times
+        to <location>, fastest first.
+
+        Ties in travel time are broken as in fastest.
+
+        @type self: FleetIndex
+        @type location: Location
+        @type count: int
+        @rtype: list[Driver]
+
+        >>> from location import Location
+        >>> index = FleetIndex()
+        >>> index.add(Driver("far", Location(9, 9), 1))
+        >>> index.add(Driver("near", Location(1, 1), 1))
+        >>> index.add(Driver("middle", Location(4, 4), 1))
+        >>> [driver.identifier for driver in index.nearest(Location(1, 2), 2)]
+        ['near', 'middle']
+        """
+        count = min(count, self._idle_count)
+        if count <= 0:
+            return []
+        times = self.travel_times(location)
+        # A stable sort keeps the earliest added first among ties.
+        slots = np.argsort(times, kind="stable")[:count]
+        return [self._drivers[slot] for slot in slots.tolist()]
@@ -0,0 +1,182 @@
+"""
+The histogram module contains LogHistogram, a histogram of non-negative
+integers with logarithmically sized buckets, in the style of an HDR
+histogram.
+
+Small values each have a bucket of their own. Larger values share buckets
+whose width grows with the value, so that every value is known to within a
+fixed relative error. The number of buckets only depends on the size of the
+largest value, so a histogram takes the same memory however many values it
+holds, and two histograms with the same precision can be added together.
+"""
+
+
+class LogHistogram:
+    """A histogram of non-negative integers with a fixed relative error.
+
+    Values below 2 ** precision are recorded exactly. Above that, each
+    power-of-two range is split into 2 ** (precision - 1) buckets, so a
+    value is known to within a relative error of 2 ** (1 - precision).
+
+    === Attributes ===
+    @type precision: int
+        The number of significant bits kept for each value.
+    @type count: int
+        The number of values recorded.
+    @type total: int
+        The sum of the values recorded.
+    @type max: int
+        The largest value recorded, or 0 if none have been.
+    """
+
+    # === Private Attributes ===
+    # @type _counts: list[int]
+    #     The number of values in each bucket, up to the highest bucket
+    #     used so far.
+
+    def __init__(self, precision=7):
+        """Initialize an empty LogHistogram.
+
+        @type self: LogHistogram
+        @type precision: int
+            Precondition: precision >= 1
+        @rtype: None
+        """
+        self.precision = precision
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self._counts = []
+
+    def __eq__(self, other):
+        """Return True iff <other> is a LogHistogram with the same precision
+        and the same counts.
+
+        @type self: LogHistogram
+        @type other: object
+        @rtype: bool
+        """
+        return isinstance(other, LogHistogram) and \
+            self.precision == other.precision and \
+            self.count == other.count and self.total == other.total and \
+            self.max == other.max and self._counts == other._counts
+
+    def _bucket(self, value):
+        """Return the index of the bucket for <value>.
+
+        @type self: LogHistogram
+        @type value: int
+        @rtype: int
+        """
+        shift = value.bit_length() - self.precision
+        if shift <= 0:
+            return value
+        return (shift + 1) << (self.precision - 1) | \
+            (value >> shift) - (1 << (self.precision - 1))
+
+    def _highest(self, bucket):
+        """Return the largest value that falls in <bucket>.
+
+        @type self: LogHistogram
+        @type bucket: int
+        @rtype: int
+        """
+        half = 1 << (self.precision - 1)
+        if bucket < 2 * half:
+            return bucket
+        shift = bucket // half - 1
+        return ((bucket % half + half + 1) << shift) - 1
+
+    def record(self, value, count=1):
+        """Record <value>, <count> times.
+
+        @type self: LogHistogram
+        @type value: int
+            Precondition: value >= 0
+        @type count: int
+        @rtype: None
+
+        >>> histogram = LogHistogram(precision=3)
+        >>> for value in [0, 3, 7, 8, 9, 100]:
+        ...     histogram.record(value)
+        >>> histogram.count, histogram.max
+        (6, 100)
+        """
+        bucket = self._bucket(value)
+        counts = self._counts
+        if bucket >= len(counts):
+            counts.extend([0] * (bucket + 1 - len(counts)))
+        counts[bucket] += count
+        self.count += count
+        self.total += value * count
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add the values recorded in <other> to this histogram.
+
+        Raise ValueError if <other> has a different precision.
+
+        @type self: LogHistogram
+        @type other: LogHistogram
+        @rtype: None
+
+        >>> first, second = LogHistogram(), LogHistogram()
+        >>> first.record(5)
+        >>> second.record(500)
+        >>> first.merge(second)
+        >>> first.count, first.max
+        (2, 500)
+        """
+        if other.precision != self.precision:
+            raise ValueError("cannot merge histograms of precision {} and "
+                             "{}".format(self.precision, other.precision))
+        counts = self._counts
+        if len(other._counts) > len(counts):
+            counts.extend([0] * (len(other._counts) - len(counts)))
+        for bucket, count in enumerate(other._counts):
+            counts[bucket] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def mean(self):
+        """Return the mean of the values recorded, or 0 if there are none.
+
+        @type self: LogHistogram
+        @rtype: float
+        """
+        if self.count == 0:
+            return 0.0
+        return self.total / self.count
+
+    def percentile(self, percent):
+        """Return the <percent>th percentile of the values recorded, or 0 if
+        there are none.
+
+        The result is the largest value in the bucket holding the
+        percentile, but never more than the largest value recorded.
+
+        @type self: LogHistogram
+        @type percent: float
+            Precondition: 0 <= percent <= 100
+        @rtype: int
+
+        >>> histogram = LogHistogram(precision=3)
+        >>> for value in range(1, 101):
+        ...     histogram.record(value)
+        >>> histogram.percentile(5), histogram.percentile(50)
+        (5, 55)
+        >>> histogram.percentile(100)
+        100
+        """
+        if self.count == 0:
+            return 0
+        # The rank of the percentile, rounded up, and at least 1.
+        rank = max(1, -int(-percent * self.count // 100))
+        seen = 0
+        for bucket, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                return min(self._highest(bucket), self.max)
+        return self.max
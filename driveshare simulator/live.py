@@ -0,0 +1,482 @@
+"""
+The live module runs the dispatcher as a live service, with asyncio.
+
+A LiveService listens on a local socket for DriverRequest and RiderRequest
+lines, in the same format as events.txt, and dispatches each one as soon as
+it arrives. The timestamp on a line is ignored: a request is stamped with the
+time it arrives, read from a Clock that counts simulated time units against
+the wall clock, optionally sped up. Pickup, Dropoff, Cancellation and the
+other events the requests lead to are timers on the event loop, due when
+the clock reaches their timestamps.
+
+The service records the dispatch latency of every request, from reading
+the line to having scheduled the events it leads to, and reports its
+percentiles.
+
+produce is a fake producer that sends the requests in an event file to a
+service at the times they are stamped with, so
+
+    python live.py demo events.txt --speed 10
+
+replays events.txt through a live service ten times faster than real time.
+"""
+import argparse
+import asyncio
+import sys
+from time import perf_counter
+
+from dispatcher import Dispatcher
+from event import parse_event
+from log_sink import NullSink
+from monitor import Monitor
+
+
+class Clock:
+    """A clock that tells simulated time from the event loop's clock.
+
+    === Attributes ===
+    @type speed: float
+        The number of simulated time units that pass in one second.
+    """
+
+    # === Private Attributes ===
+    # @type _loop: asyncio.AbstractEventLoop | None
+    #     The event loop whose clock is followed.
+    # @type _start: float
+    #     The loop time at simulated time 0.
+
+    def __init__(self, speed=1.0):
+        """Initialize a Clock that has not been started.
+
+        @type self: Clock
+        @type speed: float
+            Precondition: speed > 0
+        @rtype: None
+        """
+        self.speed = speed
+        self._loop = None
+        self._start = 0.0
+
+    def start(self):
+        """Start the clock at simulated time 0, following the running event
+        loop.
+
+        @type self: Clock
+        @rtype: None
+        """
+        self._loop = asyncio.get_running_loop()
+        self._start = self._loop.time()
+
+    def now(self):
+        """Return the current simulated time, rounded down.
+
+        @type self: Clock
+        @rtype: int
+        """
+        return int((self._loop.time() - self._start) * self.speed)
+
+    def loop_time(self, timestamp):
+        """Return the loop time at which simulated time <timestamp> comes.
+
+        @type self: Clock
+        @type timestamp: int
+        @rtype: float
+        """
+        return self._start + timestamp / self.speed
+
+
+class _Timer:
+    """A timer for an event scheduled by a LiveService.
+
+    It is the handle of the event, and can cancel it.
+    """
+
+    __slots__ = ("_service", "_handle")
+
+    # === Private Attributes ===
+    # @type _service: LiveService
+    #     The service the event was scheduled by.
+    # @type _handle: asyncio.TimerHandle | None
+    #     The event loop's timer, or None once it has fired or been
+    #     cancelled.
+
+    def __init__(self, service, handle):
+        """Initialize a _Timer.
+
+        @type self: _Timer
+        @type service: LiveService
+        @type handle: asyncio.TimerHandle | None
+        @rtype: None
+        """
+        self._service = service
+        self._handle = handle
+
+    def cancel(self):
+        """Cancel the event, if it has not happened yet.
+
+        @type self: _Timer
+        @rtype: None
+        """
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+            self._service._finish_timer()
+
+
+class LiveService:
+    """A dispatch service for requests that arrive over a socket."""
+
+    # === Private Attributes ===
+    # @type _clock: Clock
+    #     The clock events are timed against.
+    # @type _dispatcher: Dispatcher
+    #     The dispatcher that fulfills the requests.
+    # @type _monitor: Monitor
+    #     The monitor that records the activities.
+    # @type _latencies: list[float]
+    #     The dispatch latency of each request, in seconds.
+    # @type _server: asyncio.Server | None
+    #     The server accepting connections, once started.
+    # @type _pending: int
+    #     The number of scheduled events that have not happened yet.
+    # @type _clients: int
+    #     The number of open connections.
+    # @type _idle: asyncio.Event
+    #     Set when there are no pending events and no open connections.
+
+    def __init__(self, speed=1.0, sink=None, monitor=None, dispatcher=None):
+        """Initialize a LiveService.
+
+        @type self: LiveService
+        @type speed: float
+            The number of simulated time units per second of wall time.
+        @type sink: LogSink | None
+            Where the monitor logs activities; they are printed if no sink
+            is given.
+        @type monitor: Monitor | None
+            The monitor to record activities with. If it is given, <sink>
+            is ignored; otherwise a Monitor logging to <sink> is used.
+        @type dispatcher: Dispatcher | None
+            The dispatcher to use. A new Dispatcher is used if none is
+            given.
+        @rtype: None
+        """
+        self._clock = Clock(speed)
+        if dispatcher is None:
+            dispatcher = Dispatcher()
+        self._dispatcher = dispatcher
+        if monitor is None:
+            monitor = Monitor(sink)
+        self._monitor = monitor
+        self._latencies = []
+        self._server = None
+        self._pending = 0
+        self._clients = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Start the clock and listen for connections on <host> and <port>,
+        and return the address listened on.
+
+        With port 0, the operating system picks a free port.
+
+        @type self: LiveService
+        @type host: str
+        @type port: int
+        @rtype: (str, int)
+        """
+        self._clock.start()
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        """Stop listening for connections.
+
+        Events that are already scheduled still happen while the event loop
+        runs.
+
+        @type self: LiveService
+        @rtype: None
+        """
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def drain(self):
+        """Wait until every connection has closed and every scheduled event
+        has happened.
+
+        @type self: LiveService
+        @rtype: None
+        """
+        await self._idle.wait()
+
+    async def _serve(self, reader, writer):
+        """Dispatch every request read from one connection.
+
+        Lines that cannot be parsed are reported on standard error and
+        skipped, and the connection stays open.
+
+        @type self: LiveService
+        @type reader: asyncio.StreamReader
+        @type writer: asyncio.StreamWriter
+        @rtype: None
+
+        >>> async def send_bad_line():
+        ...     service = LiveService(sink=NullSink())
+        ...     host, port = await service.start()
+        ...     reader, writer = await asyncio.open_connection(host, port)
+        ...     writer.write(b"0 Pickup x 1,1\\n0 DriverRequest d 1,1 1\\n")
+        ...     await writer.drain()
+        ...     for _ in range(500):
+        ...         if service._latencies:
+        ...             break
+        ...         await asyncio.sleep(0.01)
+        ...     still_open = service._clients == 1
+        ...     writer.close()
+        ...     await writer.wait_closed()
+        ...     await service.drain()
+        ...     await service.stop()
+        ...     return still_open, service.latency_report()["requests"]
+        >>> asyncio.run(send_bad_line())
+        (True, 1)
+        """
+        self._clients += 1
+        self._idle.clear()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    self.submit(line.decode())
+                except (ValueError, IndexError) as error:
+                    print("bad request {!r}: {}".format(line, error),
+                          file=sys.stderr)
+        finally:
+            writer.close()
+            self._clients -= 1
+            self._update_idle()
+
+    def submit(self, line):
+        """Dispatch the request on <line> now, and return its event, or None
+        if the line is blank or a comment.
+
+        @type self: LiveService
+        @type line: str
+        @rtype: Event | None
+        """
+        start = perf_counter()
+        event = parse_event(line)
+        if event is None:
+            return None
+        event.timestamp = self._clock.now()
+        self._do(event)
+        self._latencies.append(perf_counter() - start)
+        return event
+
+    def _do(self, event):
+        """Do <event> and schedule the events it leads to.
+
+        @type self: LiveService
+        @type event: Event
+        @rtype: None
+        """
+        new_events = event.do(self._dispatcher, self._monitor)
+        if new_events is not None:
+            loop = asyncio.get_running_loop()
+            for new_event in new_events:
+                timer = _Timer(self, None)
+                timer._handle = loop.call_at(
+                    self._clock.loop_time(new_event.timestamp), self._fire,
+                    timer, new_event)
+                self._pending += 1
+                if new_event.cancellable:
+                    new_event.handle = timer
+        if self._pending:
+            self._idle.clear()
+        else:
+            self._update_idle()
+
+    def _fire(self, timer, event):
+        """Do the scheduled <event>, whose <timer> has gone off.
+
+        @type self: LiveService
+        @type timer: _Timer
+        @type event: Event
+        @rtype: None
+        """
+        timer._handle = None
+        self._pending -= 1
+        self._do(event)
+
+    def _finish_timer(self):
+        """Record that a scheduled event was cancelled.
+
+        @type self: LiveService
+        @rtype: None
+        """
+        self._pending -= 1
+        self._update_idle()
+
+    def _update_idle(self):
+        """Set _idle if nothing is pending and no connection is open.
+
+        @type self: LiveService
+        @rtype: None
+        """
+        if self._pending == 0 and self._clients == 0:
+            self._idle.set()
+
+    def latency_report(self):
+        """Return the number of requests dispatched, and the 50th, 90th and
+        99th percentiles and the maximum of their dispatch latencies, in
+        milliseconds.
+
+        @type self: LiveService
+        @rtype: dict[str, int | float]
+        """
+        latencies = sorted(self._latencies)
+        report = {"requests": len(latencies)}
+        for percent in [50, 90, 99]:
+            report["p{}".format(percent)] = \
+                _percentile(latencies, percent) * 1000
+        report["max"] = latencies[-1] * 1000 if latencies else 0.0
+        return report
+
+    def report(self):
+        """Return the monitor's report, with the latency report under
+        "dispatch_latency_ms".
+
+        @type self: LiveService
+        @rtype: dict[str, object]
+        """
+        report = self._monitor.report()
+        report["dispatch_latency_ms"] = self.latency_report()
+        return report
+
+
+def _percentile(values, percent):
+    """Return the nearest-rank <percent>th percentile of the sorted
+    <values>, or 0 if there are none.
+
+    @type values: list[float]
+    @type percent: int
+        Precondition: 0 < percent <= 100
+    @rtype: float
+
+    >>> _percentile([1, 2, 3, 4], 50)
+    2
+    >>> _percentile([1, 2, 3, 4], 99)
+    4
+    """
+    if not values:
+        return 0.0
+    return values[-(-percent * len(values) // 100) - 1]
+
+
+async def produce(filename, host, port, speed=1.0):
+    """Send the requests in the event file <filename> to the service at
+    <host> and <port>, each at the time it is stamped with, and return the
+    number sent.
+
+    @type filename: str
+    @type host: str
+    @type port: int
+    @type speed: float
+        The number of simulated time units per second of wall time.
+    @rtype: int
+    """
+    loop = asyncio.get_running_loop()
+    reader, writer = await asyncio.open_connection(host, port)
+    start = loop.time()
+    sent = 0
+    with open(filename, "r") as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            delay = start + int(line.split()[0]) / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            writer.write(line.encode() + b"\n")
+            await writer.drain()
+            sent += 1
+    writer.close()
+    await writer.wait_closed()
+    return sent
+
+
+async def run_demo(filename, speed=1.0, sink=None):
+    """Replay <filename> through a LiveService with produce, and return the
+    service's report once every event has happened.
+
+    @type filename: str
+    @type speed: float
+    @type sink: LogSink | None
+    @rtype: dict[str, object]
+    """
+    service = LiveService(speed, sink)
+    host, port = await service.start()
+    await produce(filename, host, port, speed)
+    await service.drain()
+    await service.stop()
+    return service.report()
+
+
+async def serve(host, port, speed):
+    """Run a LiveService on <host> and <port> until cancelled, then print
+    its report.
+
+    @type host: str
+    @type port: int
+    @type speed: float
+    @rtype: None
+    """
+    service = LiveService(speed)
+    host, port = await service.start(host, port)
+    print("listening on {}:{}".format(host, port), file=sys.stderr)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await service.stop()
+        print(service.report())
+
+
+def main(argv):
+    """Run the command line <argv>.
+
+    @type argv: list[str]
+    @rtype: None
+    """
+    parser = argparse.ArgumentParser(description="Run a live dispatcher.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve",
+                                       help="dispatch requests from a socket")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--speed", type=float, default=1.0,
+                              help="simulated time units per second")
+    demo_parser = commands.add_parser(
+        "demo", help="replay an event file through a live dispatcher")
+    demo_parser.add_argument("filename", nargs="?", default="events.txt")
+    demo_parser.add_argument("--speed", type=float, default=1.0,
+                             help="simulated time units per second")
+    demo_parser.add_argument("--quiet", action="store_true",
+                             help="do not print each activity")
+    arguments = parser.parse_args(argv)
+
+    if arguments.command == "serve":
+        try:
+            asyncio.run(serve(arguments.host, arguments.port,
+                              arguments.speed))
+        except KeyboardInterrupt:
+            pass
+    else:
+        sink = NullSink() if arguments.quiet else None
+        print(asyncio.run(run_demo(arguments.filename, arguments.speed,
+                                   sink)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,14 +1,80 @@
+from functools import lru_cache, partial
+from weakref import ref
+
+
 class Location:
-    def __init__(self, row, column):
-        """Initialize a location.
+    """A location on the grid.
 
-        @type self: Location
+    Locations are immutable and interned: creating a Location with the same
+    row and column as an existing one returns the existing object, so a
+    trace that visits a small grid only ever allocates one object per
+    square. The intern table holds its locations weakly, so a location
+    nothing else refers to any more is freed.
+
+    === Attributes ===
+    @type row: int
+        The row of this location.
+    @type column: int
+        The column of this location.
+    """
+
+    __slots__ = ("row", "column", "__weakref__")
+
+    # === Private Class Attributes ===
+    # @type _interned: dict[(int, int), weakref[Location]]
+    #     A weak reference to every Location still in use, by row and
+    #     column. Each entry removes itself when its location is freed.
+    _interned = {}
+
+    def __new__(cls, row, column):
+        """Return the location at <row> and <column>.
+
+        @type cls: type
         @type row: int
         @type column: int
+        @rtype: Location
+
+        >>> Location(2, 3) is Location(2, 3)
+        True
+        >>> location = Location(123, 456)
+        >>> del location
+        >>> (123, 456) in Location._interned
+        False
+        """
+        key = (row, column)
+        reference = cls._interned.get(key)
+        if reference is not None:
+            location = reference()
+            if location is not None:
+                return location
+        location = object.__new__(cls)
+        object.__setattr__(location, "row", row)
+        object.__setattr__(location, "column", column)
+        cls._interned[key] = ref(location, partial(_forget, key))
+        return location
+
+    def __setattr__(self, name, value):
+        """Refuse to change a location.
+
+        @type self: Location
+        @type name: str
+        @type value: object
         @rtype: None
+
+        >>> Location(2, 3).row = 4
+        Traceback (most recent call last):
+        ...
+        AttributeError: Location is immutable
         """
-        self.row = row
-        self.column = column
+        raise AttributeError("Location is immutable")
+
+    def __reduce__(self):
+        """Return how to pickle this location, so that unpickling interns it.
+
+        @type self: Location
+        @rtype: (type, (int, int))
+        """
+        return Location, (self.row, self.column)
 
     def __str__(self):
         """Return a string representation.
@@ -23,8 +89,28 @@ class Location:
 
         @rtype: bool
         """
-        return type(self) == type(other) and self.row == other.row and \
-            self.column == other.column
+        return self is other or (
+            type(self) == type(other) and self.row == other.row and
+            self.column == other.column)
+
+    def __hash__(self):
+        """Return a hash of this location.
+
+        @rtype: int
+        """
+        return hash((self.row, self.column))
+
+
+def _forget(key, reference):
+    """Remove <reference>, whose location has been freed, from the intern
+    table, unless a new location has already taken its place.
+
+    @type key: (int, int)
+    @type reference: weakref[Location]
+    @rtype: None
+    """
+    if Location._interned.get(key) is reference:
+        del Location._interned[key]
 
 
 def manhattan_distance(origin, destination):
@@ -38,13 +124,23 @@ def manhattan_distance(origin, destination):
                                                          destination.row)
 
 
+# The most recently used strings deserialize_location keeps the location of.
+DESERIALIZE_CACHE_SIZE = 1 << 16
+
+
+@lru_cache(maxsize=DESERIALIZE_CACHE_SIZE)
 def deserialize_location(location_str):
     """Deserialize a location.
 
+    The locations of the most recently used strings are cached, so a trace
+    that repeats its locations parses each one once.
+
     @type location_str: str
         A location in the format 'row,col'
     @rtype: Location
+
+    >>> deserialize_location("4,2") is Location(4, 2)
+    True
     """
     location_list = location_str.split(",")
-    deserialized_loc = Location(int(location_list[0]), int(location_list[1]))
-    return deserialized_loc
+    return Location(int(location_list[0]), int(location_list[1]))
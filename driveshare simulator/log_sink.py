@@ -0,0 +1,280 @@
+"""
+The log_sink module contains the sinks a Monitor can write its activity log
+to. Each sink formats and outputs one line per activity it is given:
+
+    <timestamp> -- <identifier> <description>
+
+PrintSink prints each line as it happens and is the default. NullSink
+discards the log, which is useful for benchmarking. BufferedFileSink
+collects lines and writes them to a file in batches, and ThreadedSink hands
+the lines to another sink running on a background thread.
+"""
+import threading
+from queue import Queue
+
+
+def format_activity(timestamp, identifier, description):
+    """Return the log line for an activity.
+
+    @type timestamp: int
+    @type identifier: str
+    @type description: str
+    @rtype: str
+
+    >>> format_activity(5, "Bisque", "request")
+    '5 -- Bisque request'
+    """
+    return str(timestamp) + " -- " + str(identifier) + " " + str(description)
+
+
+class LogSink:
+    """A destination for a Monitor's activity log.
+
+    This is an abstract class.  Only child classes should be instantiated.
+    """
+
+    def log(self, timestamp, identifier, description):
+        """Log an activity.
+
+        @type self: LogSink
+        @type timestamp: int
+        @type identifier: str
+        @type description: str
+        @rtype: None
+        """
+        raise NotImplementedError("Implemented in a subclass")
+
+    def flush(self):
+        """Make sure every activity logged so far has been output.
+
+        @type self: LogSink
+        @rtype: None
+        """
+        pass
+
+    def close(self):
+        """Flush this sink and release any resources it holds.
+
+        @type self: LogSink
+        @rtype: None
+        """
+        self.flush()
+
+
+class PrintSink(LogSink):
+    """A sink that prints each activity as soon as it is logged."""
+
+    def log(self, timestamp, identifier, description):
+        """Print an activity.
+
+        @type self: PrintSink
+        @type timestamp: int
+        @type identifier: str
+        @type description: str
+        @rtype: None
+
+        >>> PrintSink().log(0, "Amaranth", "request")
+        0 -- Amaranth request
+        """
+        print(format_activity(timestamp, identifier, description))
+
+
+class NullSink(LogSink):
+    """A sink that discards every activity without formatting it."""
+
+    def log(self, timestamp, identifier, description):
+        """Ignore an activity.
+
+        @type self: NullSink
+        @type timestamp: int
+        @type identifier: str
+        @type description: str
+        @rtype: None
+        """
+        pass
+
+
+class BufferedFileSink(LogSink):
+    """A sink that writes activities to a file, many lines at a time."""
+
+    # === Private Attributes ===
+    # @type _file: file
+    #     The file the log is written to.
+    # @type _buffer: list[str]
+    #     The lines that have not been written yet.
+    # @type _buffer_lines: int
+    #     The number of lines to collect before writing them.
+
+    def __init__(self, filename, buffer_lines=4096):
+        """Initialize a BufferedFileSink that overwrites <filename>.
+
+        @type self: BufferedFileSink
+        @type filename: str
+        @type buffer_lines: int
+            The number of lines to collect before writing them.
+        @rtype: None
+        """
+        self._file = open(filename, "w")
+        self._buffer = []
+        self._buffer_lines = buffer_lines
+
+    def log(self, timestamp, identifier, description):
+        """Add an activity to the buffer, writing the buffer out if it is
+        full.
+
+        @type self: BufferedFileSink
+        @type timestamp: int
+        @type identifier: str
+        @type description: str
+        @rtype: None
+        """
+        self._buffer.append(format_activity(timestamp, identifier,
+                                            description))
+        if len(self._buffer) >= self._buffer_lines:
+            self._write()
+
+    def _write(self):
+        """Write out and empty the buffer.
+
+        @type self: BufferedFileSink
+        @rtype: None
+        """
+        if self._buffer:
+            self._file.write("\n".join(self._buffer))
+            self._file.write("\n")
+            self._buffer = []
+
+    def flush(self):
+        """Write out the buffer and flush the file.
+
+        @type self: BufferedFileSink
+        @rtype: None
+        """
+        self._write()
+        self._file.flush()
+
+    def close(self):
+        """Write out the buffer and close the file.
+
+        @type self: BufferedFileSink
+        @rtype: None
+        """
+        self._write()
+        self._file.close()
+
+
+class ThreadedSink(LogSink):
+    """A sink that passes activities to another sink on a background thread.
+
+    Activities are handed over through a bounded queue. If the queue is
+    full, log waits for the background thread to catch up, so memory use
+    stays bounded even when the other sink is slow.
+
+    If the other sink raises an exception, the background thread stops
+    writing and the exception is raised again by every later call to log,
+    flush or close.
+
+    >>> class BrokenSink(LogSink):
+    ...     def log(self, timestamp, identifier, description):
+    ...         raise IOError("disk full")
+    >>> sink = ThreadedSink(BrokenSink())
+    >>> sink.log(0, "Amaranth", "request")
+    >>> sink.flush()
+    Traceback (most recent call last):
+    ...
+    OSError: disk full
+    """
+
+    # === Private Attributes ===
+    # @type _sink: LogSink
+    #     The sink the background thread writes to.
+    # @type _queue: Queue[(int, str, str) | None]
+    #     The activities waiting to be written; None asks the thread to stop.
+    # @type _thread: threading.Thread
+    #     The background thread.
+    # @type _error: Exception | None
+    #     The exception the sink raised on the background thread, if any.
+
+    def __init__(self, sink, max_pending=65536):
+        """Initialize a ThreadedSink that writes to <sink>, and start its
+        background thread.
+
+        @type self: ThreadedSink
+        @type sink: LogSink
+        @type max_pending: int
+            The most activities that may wait to be written.
+        @rtype: None
+        """
+        self._sink = sink
+        self._queue = Queue(max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """Write activities from the queue to the sink until asked to stop.
+
+        Once the sink raises an exception, the rest of the activities are
+        taken off the queue without being written, so that log and flush
+        never wait on a thread that has given up.
+
+        @type self: ThreadedSink
+        @rtype: None
+        """
+        while True:
+            activity = self._queue.get()
+            try:
+                if activity is None:
+                    return
+                if self._error is None:
+                    self._sink.log(*activity)
+            except Exception as error:
+                self._error = error
+            finally:
+                self._queue.task_done()
+
+    def _check(self):
+        """Raise the exception the sink raised on the background thread, if
+        it raised one.
+
+        @type self: ThreadedSink
+        @rtype: None
+        """
+        if self._error is not None:
+            raise self._error
+
+    def log(self, timestamp, identifier, description):
+        """Queue an activity to be written by the background thread.
+
+        @type self: ThreadedSink
+        @type timestamp: int
+        @type identifier: str
+        @type description: str
+        @rtype: None
+        """
+        self._check()
+        self._queue.put((timestamp, identifier, description))
+
+    def flush(self):
+        """Wait until the background thread has written every queued
+        activity, then flush the sink it writes to.
+
+        @type self: ThreadedSink
+        @rtype: None
+        """
+        self._queue.join()
+        self._check()
+        self._sink.flush()
+
+    def close(self):
+        """Stop the background thread once it has written every queued
+        activity, then close the sink it writes to.
+
+        @type self: ThreadedSink
+        @rtype: None
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._sink.close()
+        self._check()
@@ -1,4 +1,8 @@
+from operator import attrgetter
+
+from histogram import LogHistogram
 from location import Location, manhattan_distance
+from log_sink import PrintSink
 
 """
 The Monitor module contains the Monitor class, the Activity class,
@@ -22,6 +26,12 @@ request, cancel, pickup, or dropoff.
     A constant used for the pickup activity description.
 @type DROPOFF: str
     A constant used for the dropoff activity description.
+@type HISTOGRAMS: list[str]
+    The names of the distributions a monitor keeps a histogram of: the
+    wait time of each rider that stopped waiting, the distance of each
+    drive to a pickup, and the distance of each ride.
+@type PERCENTILES: list[int]
+    The percentiles of each histogram given in a monitor's report.
 """
 
 RIDER = "rider"
@@ -32,6 +42,9 @@ CANCEL = "cancel"
 PICKUP = "pickup"
 DROPOFF = "dropoff"
 
+HISTOGRAMS = ["rider_wait_time", "pickup_distance", "ride_distance"]
+PERCENTILES = [50, 95, 99]
+
 
 class Activity:
     """An activity that occurs in the simulation.
@@ -47,6 +60,8 @@ class Activity:
         The location at which the activity occurred.
     """
 
+    __slots__ = ("description", "time", "id", "location")
+
     def __init__(self, timestamp, description, identifier, location):
         """Initialize an Activity.
 
@@ -66,6 +81,9 @@ class Activity:
 class Monitor:
     """A monitor keeps a record of activities that it is notified about.
     When required, it generates a report of the activities it has recorded.
+
+    As well as the activities, a monitor keeps a LogHistogram of each of the
+    distributions in HISTOGRAMS, which it updates as it is notified.
     """
 
     # === Private Attributes ===
@@ -73,17 +91,28 @@ class Monitor:
     #       A dictionary whose key is a category, and value is another
     #       dictionary. The key of the second dictionary is an identifier
     #       and its value is a list of Activities.
+    # @type _sink: LogSink
+    #       Where each activity is logged as it is recorded.
+    # @type _histograms: dict[str, LogHistogram]
+    #       The histogram of each distribution in HISTOGRAMS.
 
-    def __init__(self):
+    def __init__(self, sink=None):
         """Initialize a Monitor.
 
         @type self: Monitor
+        @type sink: LogSink | None
+            Where to log each activity. Activities are printed if no sink
+            is given.
         """
+        if sink is None:
+            sink = PrintSink()
+        self._sink = sink
         self._activities = {
             RIDER: {},
             DRIVER: {}
         }
         """@type _activities: dict[str, dict[str, list[Activity]]]"""
+        self._histograms = {name: LogHistogram() for name in HISTOGRAMS}
 
     def __str__(self):
         """Return a string representation.
@@ -113,11 +142,130 @@ class Monitor:
         if identifier not in self._activities[category]:
             self._activities[category][identifier] = []
 
+        activities = self._activities[category][identifier]
+        self._update_histograms(category, activities, timestamp, description,
+                                location)
         activity = Activity(timestamp, description, identifier, location)
-        self._activities[category][identifier].append(activity)
+        activities.append(activity)
+
+        self._sink.log(timestamp, identifier, description)
+
+    def _update_histograms(self, category, activities, timestamp,
+                           description, location):
+        """Update the histograms for a new activity by an actor in
+        <category> whose earlier activities are <activities>.
+
+        @type self: Monitor
+        @type category: DRIVER | RIDER
+        @type activities: list[Activity]
+        @type timestamp: int
+        @type description: REQUEST | CANCEL | PICKUP | DROP_OFF
+        @type location: Location
+        @rtype: None
+        """
+        if category == RIDER:
+            if len(activities) == 1:
+                # The rider's second activity ends the wait.
+                self._histograms["rider_wait_time"].record(
+                    timestamp - activities[0].time)
+        elif activities:
+            last = activities[-1]
+            if description == PICKUP:
+                self._histograms["pickup_distance"].record(
+                    manhattan_distance(last.location, location))
+            elif description == DROPOFF and last.description == PICKUP:
+                self._histograms["ride_distance"].record(
+                    manhattan_distance(last.location, location))
+
+    def histograms(self):
+        """Return the histogram of each distribution in HISTOGRAMS.
+
+        The histograms can be merged with those of other monitors, e.g. of
+        other runs, with LogHistogram.merge.
+
+        @type self: Monitor
+        @rtype: dict[str, LogHistogram]
+
+        >>> from log_sink import NullSink
+        >>> monitor = Monitor(NullSink())
+        >>> monitor.notify(0, DRIVER, REQUEST, "Arnold", Location(1, 1))
+        >>> monitor.notify(2, RIDER, REQUEST, "Dan", Location(1, 3))
+        >>> monitor.notify(4, DRIVER, PICKUP, "Arnold", Location(1, 3))
+        >>> monitor.notify(4, RIDER, PICKUP, "Dan", Location(1, 3))
+        >>> monitor.notify(8, DRIVER, DROPOFF, "Arnold", Location(5, 3))
+        >>> histograms = monitor.histograms()
+        >>> histograms["rider_wait_time"].percentile(50)
+        2
+        >>> histograms["ride_distance"].percentile(50)
+        4
+        """
+        return self._histograms
+
+    def __getstate__(self):
+        """Return the state to pickle: everything but the log sink.
 
-        print(str(activity.time) + " -- " + str(activity.id) + " " +
-              str(activity.description))
+        @type self: Monitor
+        @rtype: dict[str, object]
+        """
+        state = self.__dict__.copy()
+        del state["_sink"]
+        return state
+
+    def __setstate__(self, state):
+        """Restore a pickled monitor, printing its activities from now on.
+
+        @type self: Monitor
+        @type state: dict[str, object]
+        @rtype: None
+        """
+        self.__dict__.update(state)
+        self._sink = PrintSink()
+
+    def set_sink(self, sink):
+        """Log activities to <sink> from now on.
+
+        @type self: Monitor
+        @type sink: LogSink
+        @rtype: None
+        """
+        self._sink = sink
+
+    def flush(self):
+        """Make sure every activity has been written to the log.
+
+        @type self: Monitor
+        @rtype: None
+        """
+        self._sink.flush()
+
+    def merge(self, other):
+        """Add the activities recorded by the Monitor <other> to this
+        monitor, keeping each actor's activities in time order.
+
+        @type self: Monitor
+        @type other: Monitor
+        @rtype: None
+        """
+        for category, actors in other._activities.items():
+            mine = self._activities[category]
+            for identifier, activities in actors.items():
+                merged = mine.get(identifier, []) + activities
+                merged.sort(key=attrgetter("time"))
+                mine[identifier] = merged
+
+        # An actor's activities may have been split between the monitors,
+        # so the histograms are counted again from the merged activities.
+        self._histograms = {name: LogHistogram() for name in HISTOGRAMS}
+        for activities in self._activities[RIDER].values():
+            if len(activities) >= 2:
+                self._histograms["rider_wait_time"].record(
+                    activities[1].time - activities[0].time)
+        for activities in self._activities[DRIVER].values():
+            for i in range(1, len(activities)):
+                self._update_histograms(DRIVER, activities[i - 1:i],
+                                        activities[i].time,
+                                        activities[i].description,
+                                        activities[i].location)
 
     def report(self):
         """Return a report of the activities that have occurred.
@@ -125,9 +273,14 @@ class Monitor:
         @type self: Monitor
         @rtype: dict[str, object]
         """
-        return {"rider_wait_time": self._average_wait_time(),
-                "driver_total_distance": self._average_total_distance(),
-                "driver_ride_distance": self._average_ride_distance()}
+        report = {"rider_wait_time": self._average_wait_time(),
+                  "driver_total_distance": self._average_total_distance(),
+                  "driver_ride_distance": self._average_ride_distance()}
+        for name, histogram in self.histograms().items():
+            for percent in PERCENTILES:
+                report["{}_p{}".format(name, percent)] = \
+                    histogram.percentile(percent)
+        return report
 
     def _average_wait_time(self):
         """Return the average wait time of riders that have either been picked
@@ -200,3 +353,152 @@ class Monitor:
             driver_count += 1
 
         return ride_distance / driver_count
+
+
+class StreamingMonitor(Monitor):
+    """A monitor that keeps running totals instead of every activity.
+
+    The report is the same as Monitor's, but it is computed in constant time
+    and the monitor only remembers the riders that are still waiting and the
+    last activity of each driver. Rider identifiers are assumed to be
+    unique.
+    """
+
+    # === Private Attributes ===
+    # @type _waiting: dict[str, int]
+    #       The request time of each rider that has not yet been picked up
+    #       or cancelled.
+    # @type _wait_time: int
+    #       The total wait time of riders that have stopped waiting.
+    # @type _wait_count: int
+    #       The number of riders that have stopped waiting.
+    # @type _drivers: dict[str, (Location, str)]
+    #       The location and description of each driver's latest activity.
+    # @type _total_distance: int
+    #       The distance driven by all drivers.
+    # @type _ride_distance: int
+    #       The distance driven by all drivers with a rider on board.
+
+    def __init__(self, sink=None):
+        """Initialize a StreamingMonitor.
+
+        @type self: StreamingMonitor
+        @type sink: LogSink | None
+            Where to log each activity. Activities are printed if no sink
+            is given.
+        """
+        Monitor.__init__(self, sink)
+        self._waiting = {}
+        self._wait_time = 0
+        self._wait_count = 0
+        self._drivers = {}
+        self._total_distance = 0
+        self._ride_distance = 0
+
+    def __str__(self):
+        """Return a string representation.
+
+        @type self: StreamingMonitor
+        @rtype: str
+        """
+        return "StreamingMonitor ({} drivers, {} waiting riders)".format(
+            len(self._drivers), len(self._waiting))
+
+    def notify(self, timestamp, category, description, identifier, location):
+        """Notify the monitor of the activity, and update the totals.
+
+        @type self: StreamingMonitor
+        @type timestamp: int
+            The time of the activity.
+        @type category: DRIVER | RIDER
+            The category for the activity.
+        @type description: REQUEST | CANCEL | PICKUP | DROP_OFF
+            A description of the activity.
+        @type identifier: str
+            The identifier for the actor.
+        @type location: Location
+            The location of the activity.
+        @rtype: None
+
+        >>> from log_sink import NullSink
+        >>> monitor = StreamingMonitor(NullSink())
+        >>> monitor.notify(0, DRIVER, REQUEST, "Arnold", Location(1, 1))
+        >>> monitor.notify(2, RIDER, REQUEST, "Dan", Location(1, 3))
+        >>> monitor.notify(3, DRIVER, PICKUP, "Arnold", Location(1, 3))
+        >>> monitor.notify(3, RIDER, PICKUP, "Dan", Location(1, 3))
+        >>> monitor.notify(7, DRIVER, DROPOFF, "Arnold", Location(5, 3))
+        >>> monitor.notify(7, RIDER, DROPOFF, "Dan", Location(5, 3))
+        >>> monitor.report()["driver_ride_distance"]
+        4.0
+        >>> monitor.report()["rider_wait_time"]
+        1.0
+        """
+        if category == RIDER:
+            if description == REQUEST:
+                self._waiting[identifier] = timestamp
+            elif identifier in self._waiting:
+                # The rider's second activity ends the wait, and the rider
+                # does not need to be remembered any more.
+                wait_time = timestamp - self._waiting.pop(identifier)
+                self._wait_time += wait_time
+                self._wait_count += 1
+                self._histograms["rider_wait_time"].record(wait_time)
+        else:
+            last = self._drivers.get(identifier)
+            if last is not None:
+                distance = manhattan_distance(last[0], location)
+                self._total_distance += distance
+                if last[1] == PICKUP:
+                    self._ride_distance += distance
+                    if description == DROPOFF:
+                        self._histograms["ride_distance"].record(distance)
+                elif description == PICKUP:
+                    self._histograms["pickup_distance"].record(distance)
+            self._drivers[identifier] = (location, description)
+
+        self._sink.log(timestamp, identifier, description)
+
+    def merge(self, other):
+        """Add the totals and histograms of the StreamingMonitor <other>,
+        e.g. from another run or process, to this monitor.
+
+        The two monitors are assumed to have seen different riders and
+        drivers.
+
+        @type self: StreamingMonitor
+        @type other: StreamingMonitor
+        @rtype: None
+        """
+        self._waiting.update(other._waiting)
+        self._wait_time += other._wait_time
+        self._wait_count += other._wait_count
+        self._drivers.update(other._drivers)
+        self._total_distance += other._total_distance
+        self._ride_distance += other._ride_distance
+        for name, histogram in other._histograms.items():
+            self._histograms[name].merge(histogram)
+
+    def _average_wait_time(self):
+        """Return the average wait time of riders that have either been picked
+        up or have cancelled their ride.
+
+        @type self: StreamingMonitor
+        @rtype: float
+        """
+        return self._wait_time / self._wait_count
+
+    def _average_total_distance(self):
+        """Return the average distance drivers have driven.
+
+        @type self: StreamingMonitor
+        @rtype: float
+        """
+        return self._total_distance / len(self._drivers)
+
+    def _average_ride_distance(self):
+        """Return the average distance drivers have driven on rides.
+
+        @type self: StreamingMonitor
+        @rtype: float
+        """
+        return self._ride_distance / len(self._drivers)
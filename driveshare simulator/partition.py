@@ -0,0 +1,398 @@
+"""
+The partition module runs one simulation on several cores by splitting the
+grid into regions, each simulated by its own process.
+
+The grid is cut into vertical strips of columns. A rider request goes to
+the region of the rider's origin and a driver's first request to the region
+of the driver's location. Riders are only matched with drivers in their own
+region. When a driver picks up a rider whose destination is in another
+region, the driver leaves its region: the Dropoff event, with the driver
+and rider, is sent to the destination region, where the driver carries on.
+
+The regions advance together in windows of simulated time. A Dropoff that
+leaves a region during a window is due at least one ride time after the
+window starts, so each window is kept no longer than the shortest ride
+that could cross regions: the grid distance between the rider's origin and
+destination, scaled by the travel model's min_ratio, over the fastest
+driver's speed. The coordinator sees every rider and driver before the
+window they arrive in, so the bound only ever shrinks before it is needed,
+and a Dropoff reaches its destination region before that region reaches
+it. Only a ride that rounds to no time at all can still arrive late; it is
+done at the start of the next window instead, and the number of late
+Dropoffs is reported. Windows with no events in any region are skipped.
+"""
+import multiprocessing
+from collections import deque
+
+from dispatcher import Dispatcher
+from event import DriverRequest, Dropoff
+from location import manhattan_distance
+from log_sink import NullSink
+from monitor import Monitor
+from simulation import Simulation
+from travel import GridModel
+
+
+class Partition:
+    """A division of the grid into vertical strips of columns.
+
+    === Attributes ===
+    @type regions: int
+        The number of regions.
+    @type region_width: int
+        The number of columns in each region. The first region also takes
+        any columns to its left, and the last any columns to its right.
+    """
+
+    def __init__(self, regions, region_width):
+        """Initialize a Partition.
+
+        @type self: Partition
+        @type regions: int
+        @type region_width: int
+        @rtype: None
+        """
+        self.regions = regions
+        self.region_width = region_width
+
+    def region_of(self, location):
+        """Return the region <location> is in.
+
+        @type self: Partition
+        @type location: Location
+        @rtype: int
+
+        >>> from location import Location
+        >>> partition = Partition(3, 10)
+        >>> [partition.region_of(Location(0, c)) for c in [-5, 9, 10, 99]]
+        [0, 0, 1, 2]
+        """
+        return min(max(location.column // self.region_width, 0),
+                   self.regions - 1)
+
+    def region_of_event(self, event):
+        """Return the region an input event belongs to.
+
+        @type self: Partition
+        @type event: DriverRequest | RiderRequest
+        @rtype: int
+        """
+        if isinstance(event, DriverRequest):
+            return self.region_of(event.driver.location)
+        return self.region_of(event.rider.origin)
+
+
+class _RegionSimulation(Simulation):
+    """The simulation of one region of a partitioned simulation."""
+
+    # === Private Attributes ===
+    # @type _region: int
+    #     The region this simulation covers.
+    # @type _partition: Partition
+    #     How the grid is divided.
+    # @type _outbox: list[Dropoff]
+    #     Dropoffs leaving this region in the current window.
+
+    def __init__(self, region, partition, dispatcher):
+        """Initialize a _RegionSimulation.
+
+        @type self: _RegionSimulation
+        @type region: int
+        @type partition: Partition
+        @type dispatcher: Dispatcher
+        @rtype: None
+        """
+        Simulation.__init__(self, monitor=Monitor(NullSink()),
+                            dispatcher=dispatcher)
+        self._region = region
+        self._partition = partition
+        self._outbox = []
+
+    def advance(self, limit, inputs, arrivals):
+        """Process every event before <limit>, including the input events
+        <inputs> and the Dropoffs <arrivals> from other regions.
+
+        Return the Dropoffs that left this region, and the time of the next
+        event in this region, or None if it has none.
+
+        @type self: _RegionSimulation
+        @type limit: int
+        @type inputs: list[Event]
+            Input events before <limit>, in timestamp order.
+        @type arrivals: list[Dropoff]
+        @rtype: (list[Dropoff], int | None)
+        """
+        self._events.add_all(arrivals)
+        # The inputs are streamed in, so that they are ordered against the
+        # queued events exactly as in a sequential run.
+        self._source = iter(inputs)
+        self._read_input()
+        self._process(limit)
+        outbox = self._outbox
+        self._outbox = []
+        if self._events.is_empty():
+            return outbox, None
+        return outbox, self._events.peek().timestamp
+
+    def _process(self, limit):
+        """Process the events before <limit>, moving Dropoffs that end in
+        other regions to the outbox.
+
+        @type self: _RegionSimulation
+        @type limit: int
+        @rtype: None
+        """
+        current_event = self._next_event(limit)
+        while current_event is not None:
+            new_events = current_event.do(self._dispatcher, self._monitor)
+            if new_events is not None:
+                for event in new_events:
+                    if isinstance(event, Dropoff) and \
+                            self._partition.region_of(
+                                event.rider.destination) != self._region:
+                        self._dispatcher.unregister(event.driver)
+                        self._outbox.append(event)
+                    else:
+                        self._schedule(event)
+            current_event = self._next_event(limit)
+
+    def monitor(self):
+        """Return this region's monitor.
+
+        @type self: _RegionSimulation
+        @rtype: Monitor
+        """
+        return self._monitor
+
+
+def _run_region(connection, region, partition, cell_size, batch_window,
+                travel_model):
+    """Simulate one region, as directed by messages on <connection>.
+
+    An ("advance", limit, inputs, arrivals) message is answered with the
+    result of _RegionSimulation.advance, and a ("finish",) message with the
+    region's monitor, after which the process ends.
+
+    @type connection: multiprocessing.connection.Connection
+    @type region: int
+    @type partition: Partition
+    @type cell_size: int
+    @type batch_window: int | None
+    @type travel_model: TravelModel | None
+    @rtype: None
+    """
+    simulation = _RegionSimulation(region, partition, Dispatcher(
+        cell_size, batch_window, travel_model=travel_model))
+    while True:
+        message = connection.recv()
+        if message[0] == "advance":
+            connection.send(simulation.advance(*message[1:]))
+        else:
+            connection.send(simulation.monitor())
+            connection.close()
+            return
+
+
+class PartitionedSimulation:
+    """A simulation split into regions that run in parallel processes."""
+
+    # === Private Attributes ===
+    # @type _partition: Partition
+    #     How the grid is divided.
+    # @type _window: int | None
+    #     The longest a window of simulated time may be, or None for no
+    #     limit but the lookahead.
+    # @type _cell_size: int
+    #     The cell size for each region's Dispatcher.
+    # @type _batch_window: int | None
+    #     The batch window for each region's Dispatcher.
+    # @type _travel_model: TravelModel | None
+    #     The travel model for each region's Dispatcher.
+
+    def __init__(self, partition, window=None, cell_size=8,
+                 batch_window=None, travel_model=None):
+        """Initialize a PartitionedSimulation.
+
+        @type self: PartitionedSimulation
+        @type partition: Partition
+        @type window: int | None
+            The longest window the regions may advance in. Each window is
+            also cut short to the lookahead, so that no Dropoff is late, and
+            is as long as the lookahead allows if this is None.
+            Precondition: window is None or window > 0
+        @type cell_size: int
+        @type batch_window: int | None
+        @type travel_model: TravelModel | None
+            Passed to each region's Dispatcher.
+        @rtype: None
+        """
+        self._partition = partition
+        self._window = window
+        self._cell_size = cell_size
+        self._batch_window = batch_window
+        self._travel_model = travel_model
+
+    def run(self, initial_events):
+        """Run the simulation on <initial_events> and return the report.
+
+        The report has the same statistics as Simulation.run, computed over
+        the activities of every region, and a "partition" entry with the
+        number of windows, of drivers that changed region, and of those that
+        arrived late.
+
+        @type self: PartitionedSimulation
+        @type initial_events: iterable[Event]
+            DriverRequest and RiderRequest events in timestamp order.
+        @rtype: dict[str, object]
+        """
+        regions = self._partition.regions
+        connections = []
+        processes = []
+        for region in range(regions):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_run_region,
+                args=(child, region, self._partition, self._cell_size,
+                      self._batch_window, self._travel_model),
+                daemon=True)
+            process.start()
+            child.close()
+            connections.append(parent)
+            processes.append(process)
+
+        windows = migrations = late = 0
+        try:
+            source = iter(initial_events)
+            next_input = next(source, None)
+            inputs = [[] for _ in range(regions)]
+            arrivals = [[] for _ in range(regions)]
+            start = 0 if next_input is None else next_input.timestamp
+            # The inputs read but not yet sent to a region, and the shortest
+            # any ride between regions could be and the fastest driver among
+            # all the inputs read so far.
+            pending = deque()
+            shortest = None
+            max_speed = 0
+            while True:
+                # Each input read can shorten the window, so the inputs are
+                # only sent once the window's end is settled.
+                limit = self._limit(start, shortest, max_speed)
+                while next_input is not None and next_input.timestamp < limit:
+                    if isinstance(next_input, DriverRequest):
+                        max_speed = max(max_speed, next_input.driver.speed)
+                    else:
+                        length = self._crossing_length(next_input.rider)
+                        if length is not None and (shortest is None or
+                                                   length < shortest):
+                            shortest = length
+                    limit = min(limit,
+                                self._limit(start, shortest, max_speed))
+                    pending.append(next_input)
+                    next_input = next(source, None)
+                while pending and pending[0].timestamp < limit:
+                    event = pending.popleft()
+                    inputs[self._partition.region_of_event(event)].append(
+                        event)
+
+                for region in range(regions):
+                    connections[region].send(("advance", limit,
+                                              inputs[region],
+                                              arrivals[region]))
+                inputs = [[] for _ in range(regions)]
+                arrivals = [[] for _ in range(regions)]
+                next_times = []
+                for connection in connections:
+                    outbox, next_time = connection.recv()
+                    if next_time is not None:
+                        next_times.append(next_time)
+                    for dropoff in outbox:
+                        migrations += 1
+                        if dropoff.timestamp < limit:
+                            late += 1
+                            dropoff.timestamp = limit
+                        next_times.append(dropoff.timestamp)
+                        arrivals[self._partition.region_of(
+                            dropoff.rider.destination)].append(dropoff)
+                windows += 1
+
+                if pending:
+                    next_times.append(pending[0].timestamp)
+                elif next_input is not None:
+                    next_times.append(next_input.timestamp)
+                if not next_times:
+                    break
+                start = max(limit, min(next_times))
+
+            monitor = Monitor(NullSink())
+            for connection in connections:
+                connection.send(("finish",))
+                monitor.merge(connection.recv())
+        finally:
+            for connection in connections:
+                connection.close()
+            for process in processes:
+                process.join()
+
+        report = monitor.report()
+        report["partition"] = {"windows": windows, "migrations": migrations,
+                               "late_migrations": late}
+        return report
+
+    def _crossing_length(self, rider):
+        """Return the shortest distance <rider>'s ride could be if it goes
+        from one region to another, or None if it stays in one region.
+
+        @type self: PartitionedSimulation
+        @type rider: Rider
+        @rtype: int | float | None
+
+        >>> from location import Location
+        >>> from rider import Rider
+        >>> simulation = PartitionedSimulation(Partition(2, 10))
+        >>> simulation._crossing_length(
+        ...     Rider("Almond", Location(0, 8), Location(3, 12), 5))
+        7.0
+        >>> print(simulation._crossing_length(
+        ...     Rider("Bisque", Location(0, 1), Location(3, 2), 5)))
+        None
+        """
+        if self._partition.region_of(rider.origin) == \
+                self._partition.region_of(rider.destination):
+            return None
+        ratio = GridModel.min_ratio if self._travel_model is None \
+            else self._travel_model.min_ratio
+        return ratio * manhattan_distance(rider.origin, rider.destination)
+
+    def _limit(self, start, shortest, max_speed):
+        """Return the end of the window starting at <start>, given the
+        shortest distance a ride between regions could be and the fastest
+        driver so far.
+
+        A Pickup in the window is at <start> or later, so its Dropoff is due
+        no earlier than the shortest ride time after <start>. The window is
+        at least one unit long, and has no end if no ride has crossed
+        regions yet and there is no longest window.
+
+        @type self: PartitionedSimulation
+        @type start: int
+        @type shortest: int | float | None
+        @type max_speed: int
+        @rtype: int | float
+
+        >>> simulation = PartitionedSimulation(Partition(2, 10))
+        >>> simulation._limit(5, 12, 4)
+        8
+        >>> simulation._limit(5, 1, 4)
+        6
+        >>> simulation._limit(5, None, 4)
+        inf
+        """
+        window = self._window
+        if shortest is not None and max_speed > 0:
+            # Ride times are rounded, and rounding keeps the order.
+            lookahead = max(round(shortest / max_speed), 1)
+            if window is None or lookahead < window:
+                window = lookahead
+        if window is None:
+            return float("inf")
+        return start + window
@@ -0,0 +1,207 @@
+"""
+The profiler module contains Profiler, which records where the time goes
+in a Simulation run, and TimedDispatcher, which a Profiler uses to time the
+calls events make to the dispatcher.
+
+A Simulation only profiles when it is given a Profiler; otherwise it runs
+its plain event loop and pays nothing for this module.
+"""
+from time import perf_counter
+
+
+def _timing_report(timing):
+    """Return the report for a [count, total seconds, max seconds] timing.
+
+    @type timing: list[int | float]
+    @rtype: dict[str, int | float]
+    """
+    return {"count": timing[0], "total_seconds": timing[1],
+            "max_seconds": timing[2]}
+
+
+class Profiler:
+    """A record of how long each part of a simulation took.
+
+    It records the count, total and maximum wall time of each kind of event
+    and of each dispatcher method, the time spent adding events to and
+    removing them from the queue, and the queue depth over simulated time.
+    The time for an event includes the dispatcher calls it makes.
+    """
+
+    # === Private Attributes ===
+    # @type _events: dict[str, list[int | float]]
+    #     [count, total seconds, max seconds] for each event class name.
+    # @type _dispatcher: dict[str, list[int | float]]
+    #     [count, total seconds, max seconds] for each dispatcher method.
+    # @type _pushes: int
+    #     The number of events added to the queue.
+    # @type _push_time: float
+    #     The seconds spent adding events to the queue.
+    # @type _pops: int
+    #     The number of events taken from the queue or input stream.
+    # @type _pop_time: float
+    #     The seconds spent taking events from the queue or input stream.
+    # @type _depth_interval: int
+    #     The simulated time between queue depth samples.
+    # @type _next_sample: int
+    #     The simulated time of the next queue depth sample.
+    # @type _depths: list[(int, int)]
+    #     (timestamp, queue depth) samples.
+
+    def __init__(self, depth_interval=60):
+        """Initialize an empty Profiler.
+
+        @type self: Profiler
+        @type depth_interval: int
+            Sample the queue depth at most once per this many units of
+            simulated time.
+        @rtype: None
+        """
+        self._events = {}
+        self._dispatcher = {}
+        self._pushes = 0
+        self._push_time = 0.0
+        self._pops = 0
+        self._pop_time = 0.0
+        self._depth_interval = depth_interval
+        self._next_sample = 0
+        self._depths = []
+
+    def record_event(self, event, seconds):
+        """Record that doing <event> took <seconds>.
+
+        @type self: Profiler
+        @type event: Event
+        @type seconds: float
+        @rtype: None
+        """
+        _add_timing(self._events, type(event).__name__, seconds)
+
+    def record_dispatch(self, method, seconds):
+        """Record that a call to the dispatcher method <method> took
+        <seconds>.
+
+        @type self: Profiler
+        @type method: str
+        @type seconds: float
+        @rtype: None
+        """
+        _add_timing(self._dispatcher, method, seconds)
+
+    def record_push(self, count, seconds):
+        """Record that adding <count> events to the queue took <seconds>.
+
+        @type self: Profiler
+        @type count: int
+        @type seconds: float
+        @rtype: None
+        """
+        self._pushes += count
+        self._push_time += seconds
+
+    def record_pop(self, seconds):
+        """Record that taking one event took <seconds>.
+
+        @type self: Profiler
+        @type seconds: float
+        @rtype: None
+        """
+        self._pops += 1
+        self._pop_time += seconds
+
+    def record_depth(self, timestamp, depth):
+        """Record the queue depth at simulated time <timestamp>, if a sample
+        is due.
+
+        @type self: Profiler
+        @type timestamp: int
+        @type depth: int
+        @rtype: None
+        """
+        if timestamp >= self._next_sample:
+            self._depths.append((timestamp, depth))
+            self._next_sample = timestamp + self._depth_interval
+
+    def report(self):
+        """Return everything recorded, as a dictionary.
+
+        @type self: Profiler
+        @rtype: dict[str, object]
+
+        >>> profiler = Profiler()
+        >>> profiler.record_dispatch("request_driver", 0.5)
+        >>> profiler.record_dispatch("request_driver", 0.25)
+        >>> profiler.report()["dispatcher"]["request_driver"]
+        {'count': 2, 'total_seconds': 0.75, 'max_seconds': 0.5}
+        """
+        return {"events": {name: _timing_report(timing)
+                           for name, timing in self._events.items()},
+                "dispatcher": {name: _timing_report(timing)
+                               for name, timing in self._dispatcher.items()},
+                "queue": {"pushes": self._pushes,
+                          "push_seconds": self._push_time,
+                          "pops": self._pops,
+                          "pop_seconds": self._pop_time},
+                "queue_depth": list(self._depths)}
+
+
+def _add_timing(timings, name, seconds):
+    """Add one call taking <seconds> to the timing for <name> in <timings>.
+
+    @type timings: dict[str, list[int | float]]
+    @type name: str
+    @type seconds: float
+    @rtype: None
+    """
+    timing = timings.get(name)
+    if timing is None:
+        timings[name] = [1, seconds, seconds]
+    else:
+        timing[0] += 1
+        timing[1] += seconds
+        if seconds > timing[2]:
+            timing[2] = seconds
+
+
+class TimedDispatcher:
+    """A stand-in for a Dispatcher that times every method call made
+    through it, and otherwise behaves exactly like the dispatcher.
+    """
+
+    # === Private Attributes ===
+    # @type _dispatcher: Dispatcher
+    #     The dispatcher being timed.
+    # @type _profiler: Profiler
+    #     Where the timings are recorded.
+
+    def __init__(self, dispatcher, profiler):
+        """Initialize a TimedDispatcher.
+
+        @type self: TimedDispatcher
+        @type dispatcher: Dispatcher
+        @type profiler: Profiler
+        @rtype: None
+        """
+        self._dispatcher = dispatcher
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        """Return the dispatcher's attribute <name>, wrapped so that it is
+        timed if it is a method.
+
+        @type self: TimedDispatcher
+        @type name: str
+        @rtype: object
+        """
+        value = getattr(self._dispatcher, name)
+        if not callable(value):
+            return value
+        profiler = self._profiler
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return value(*args, **kwargs)
+            finally:
+                profiler.record_dispatch(name, perf_counter() - start)
+        return timed
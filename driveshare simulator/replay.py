@@ -0,0 +1,412 @@
+"""
+The replay module contains ReplayLog, which records a simulation in a
+compact binary log, and the functions that read such a log back: replay,
+which rebuilds a monitor from it without running the dispatcher, and
+read_replay and first_difference, for comparing two runs.
+
+A replay log is a header followed by records, each starting with a uint8
+tag:
+
+    header     magic b"DSRL", format version
+    NAME       tag, uint8 category, uint16 size, then the identifier in
+               utf-8: the next index of a driver (category 0) or rider
+               (category 1)
+    EVENT      tag, uint8 kind, int64 timestamp, int32 rider, int32 driver:
+               an event about to be processed
+    MATCH      tag, int64 pickup time, int32 rider, int32 driver: a
+               dispatch decision, sending the driver to pick up the rider
+    ACTIVITY   tag, uint8 category * 4 + description, int64 timestamp,
+               int32 actor, int32 row, int32 column: an activity the
+               monitor was notified of
+
+Drivers and riders are given by their index, or -1 for none. The kind of
+an event is its index in EVENT_KINDS, or 255 for any other kind. Integers
+are little-endian.
+
+A simulation that runs the same way writes the same bytes, so the logs of
+two runs can be compared record by record to find where they part.
+
+=== Constants ===
+@type EVENT_KINDS: list[type]
+    The kinds of events with a code of their own.
+"""
+import struct
+import sys
+
+from event import BatchMatch, Cancellation, DriverRequest, Dropoff, \
+    Pickup, RiderRequest
+from location import Location
+from log_sink import NullSink
+from monitor import Monitor, DRIVER, RIDER, REQUEST, CANCEL, PICKUP, \
+    DROPOFF
+
+EVENT_KINDS = [DriverRequest, RiderRequest, Pickup, Dropoff, Cancellation,
+               BatchMatch]
+
+_MAGIC = b"DSRL"
+_VERSION = 1
+_HEADER = struct.Struct("<4sI")
+_NAME, _EVENT, _MATCH, _ACTIVITY = range(4)
+_NAME_RECORD = struct.Struct("<BBH")
+_EVENT_RECORD = struct.Struct("<BBqii")
+_MATCH_RECORD = struct.Struct("<Bqii")
+_ACTIVITY_RECORD = struct.Struct("<BBqiii")
+_OTHER_KIND = 255
+_CATEGORIES = [DRIVER, RIDER]
+_DESCRIPTIONS = [REQUEST, CANCEL, PICKUP, DROPOFF]
+# The code of each kind of event, and of each category and description.
+_KIND_CODES = {kind: code for code, kind in enumerate(EVENT_KINDS)}
+_ACTIVITY_CODES = {(category, description): i * 4 + j
+                   for i, category in enumerate(_CATEGORIES)
+                   for j, description in enumerate(_DESCRIPTIONS)}
+
+
+class ReplayLog:
+    """A binary log of the events a simulation processes, the dispatch
+    decisions it makes and the activities its monitor is notified of.
+
+    A ReplayLog is saved in a simulation's checkpoints along with the rest
+    of the simulation. A restored ReplayLog reopens its file and cuts it
+    back to where it was at the checkpoint, so a resumed run writes the
+    same log as one that never stopped.
+    """
+
+    # === Private Attributes ===
+    # @type _filename: str
+    #     The name of the log file.
+    # @type _file: file
+    #     The log file, open for writing.
+    # @type _buffer: bytearray
+    #     The records that have not been written yet.
+    # @type _buffer_size: int
+    #     The number of bytes to collect before writing them.
+    # @type _indices: dict[str, dict[str, int]]
+    #     The index of each driver and rider named so far, by category and
+    #     identifier.
+    # @type _monitor: Monitor | None
+    #     The monitor that notifications are passed on to.
+    # @type _offset: int
+    #     The size of the file when this log was pickled.
+
+    def __init__(self, filename, buffer_size=65536):
+        """Initialize a ReplayLog that overwrites <filename>.
+
+        @type self: ReplayLog
+        @type filename: str
+        @type buffer_size: int
+            The number of bytes to collect before writing them.
+        @rtype: None
+        """
+        self._filename = filename
+        self._file = open(filename, "wb")
+        self._buffer = bytearray(_HEADER.pack(_MAGIC, _VERSION))
+        self._buffer_size = buffer_size
+        self._indices = {DRIVER: {}, RIDER: {}}
+        self._monitor = None
+        self._offset = 0
+
+    def __getstate__(self):
+        """Return the state to pickle: everything but the open file, which
+        is flushed and replaced by its size.
+
+        @type self: ReplayLog
+        @rtype: dict[str, object]
+        """
+        self.flush()
+        state = self.__dict__.copy()
+        state["_offset"] = self._file.tell()
+        del state["_file"]
+        return state
+
+    def __setstate__(self, state):
+        """Restore a pickled ReplayLog, reopening its file and dropping
+        anything written after it was pickled.
+
+        @type self: ReplayLog
+        @type state: dict[str, object]
+        @rtype: None
+        """
+        self.__dict__.update(state)
+        self._file = open(self._filename, "r+b")
+        self._file.truncate(self._offset)
+        self._file.seek(self._offset)
+
+    def _index(self, category, identifier):
+        """Return the index of the driver or rider <identifier>, naming it
+        in the log if it is new.
+
+        @type self: ReplayLog
+        @type category: DRIVER | RIDER
+        @type identifier: str
+        @rtype: int
+        """
+        indices = self._indices[category]
+        index = indices.get(identifier)
+        if index is None:
+            index = indices[identifier] = len(indices)
+            name = identifier.encode("utf-8")
+            self._buffer += _NAME_RECORD.pack(
+                _NAME, _CATEGORIES.index(category), len(name))
+            self._buffer += name
+        return index
+
+    def watch(self, monitor):
+        """Return an object to notify instead of <monitor>, which logs each
+        activity and passes it on to <monitor>.
+
+        @type self: ReplayLog
+        @type monitor: Monitor
+        @rtype: ReplayLog
+        """
+        self._monitor = monitor
+        return self
+
+    def notify(self, timestamp, category, description, identifier, location):
+        """Log the activity, and pass it on to the watched monitor.
+
+        @type self: ReplayLog
+        @type timestamp: int
+        @type category: DRIVER | RIDER
+        @type description: REQUEST | CANCEL | PICKUP | DROP_OFF
+        @type identifier: str
+        @type location: Location
+        @rtype: None
+        """
+        self._buffer += _ACTIVITY_RECORD.pack(
+            _ACTIVITY, _ACTIVITY_CODES[category, description], timestamp,
+            self._index(category, identifier), location.row, location.column)
+        self._monitor.notify(timestamp, category, description, identifier,
+                             location)
+
+    def record_event(self, event):
+        """Log that <event> is about to be processed.
+
+        @type self: ReplayLog
+        @type event: Event
+        @rtype: None
+        """
+        rider = getattr(event, "rider", None)
+        driver = getattr(event, "driver", None)
+        self._buffer += _EVENT_RECORD.pack(
+            _EVENT, _KIND_CODES.get(type(event), _OTHER_KIND),
+            event.timestamp,
+            -1 if rider is None else self._index(RIDER, rider.id),
+            -1 if driver is None else self._index(DRIVER, driver.identifier))
+        if len(self._buffer) >= self._buffer_size:
+            self._write()
+
+    def record_decisions(self, new_events):
+        """Log the dispatch decisions among <new_events>, the events spawned
+        by the events processed last: a match for each Pickup.
+
+        @type self: ReplayLog
+        @type new_events: list[Event] | None
+        @rtype: None
+        """
+        if new_events is None:
+            return
+        for event in new_events:
+            if type(event) is Pickup:
+                self._buffer += _MATCH_RECORD.pack(
+                    _MATCH, event.timestamp,
+                    self._index(RIDER, event.rider.id),
+                    self._index(DRIVER, event.driver.identifier))
+
+    def _write(self):
+        """Write out and empty the buffer.
+
+        @type self: ReplayLog
+        @rtype: None
+        """
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+
+    def flush(self):
+        """Write out the buffer and flush the file.
+
+        @type self: ReplayLog
+        @rtype: None
+        """
+        self._write()
+        self._file.flush()
+
+    def close(self):
+        """Write out the buffer and close the file.
+
+        @type self: ReplayLog
+        @rtype: None
+        """
+        self._write()
+        self._file.close()
+
+
+def _read(filename):
+    """Return the contents of the replay log <filename>.
+
+    Raise ValueError if the file is not a replay log.
+
+    @type filename: str
+    @rtype: bytes
+    """
+    with open(filename, "rb") as file:
+        data = file.read()
+    if len(data) < _HEADER.size or \
+            _HEADER.unpack_from(data) != (_MAGIC, _VERSION):
+        raise ValueError("{} is not a version {} replay log".format(
+            filename, _VERSION))
+    return data
+
+
+def _records(data):
+    """Yield the tag and fields of each record in the replay log <data>,
+    with each NAME record giving its category and identifier.
+
+    @type data: bytes
+    @rtype: iterator[(int, tuple)]
+    """
+    structs = {_EVENT: _EVENT_RECORD, _MATCH: _MATCH_RECORD,
+               _ACTIVITY: _ACTIVITY_RECORD}
+    offset = _HEADER.size
+    while offset < len(data):
+        tag = data[offset]
+        if tag == _NAME:
+            _, category, size = _NAME_RECORD.unpack_from(data, offset)
+            offset += _NAME_RECORD.size
+            yield tag, (category, data[offset:offset + size].decode("utf-8"))
+            offset += size
+        else:
+            record = structs[tag]
+            yield tag, record.unpack_from(data, offset)[1:]
+            offset += record.size
+
+
+def replay(filename, monitor=None):
+    """Notify <monitor> of every activity in the replay log <filename>, in
+    order, and return it.
+
+    Nothing else is done, so the monitor ends up as it was at the end of
+    the logged run, much faster than running the simulation again.
+
+    @type filename: str
+    @type monitor: Monitor | None
+        The monitor to rebuild. A Monitor that logs nothing is used if none
+        is given.
+    @rtype: Monitor
+
+    >>> import os
+    >>> import tempfile
+    >>> from event import create_event_list
+    >>> from simulation import Simulation
+    >>> filename = os.path.join(tempfile.mkdtemp(), "events.log")
+    >>> simulation = Simulation(sink=NullSink(),
+    ...                         replay_log=ReplayLog(filename))
+    >>> report = simulation.run(create_event_list("events.txt"))
+    >>> replay(filename).report() == report
+    True
+    """
+    if monitor is None:
+        monitor = Monitor(NullSink())
+    data = _read(filename)
+    notify = monitor.notify
+    names = [[], []]
+    activities = [(_CATEGORIES[code // 4], _DESCRIPTIONS[code % 4],
+                   names[code // 4])
+                  for code in range(len(_CATEGORIES) * 4)]
+    unpack_activity = _ACTIVITY_RECORD.unpack_from
+    # Only activities matter here, so the other records are skipped over.
+    skip = {_EVENT: _EVENT_RECORD.size, _MATCH: _MATCH_RECORD.size}
+    offset = _HEADER.size
+    end = len(data)
+    while offset < end:
+        tag = data[offset]
+        if tag == _ACTIVITY:
+            _, code, timestamp, actor, row, column = \
+                unpack_activity(data, offset)
+            category, description, actors = activities[code]
+            notify(timestamp, category, description, actors[actor],
+                   Location(row, column))
+            offset += _ACTIVITY_RECORD.size
+        elif tag == _NAME:
+            _, category, size = _NAME_RECORD.unpack_from(data, offset)
+            offset += _NAME_RECORD.size
+            names[category].append(
+                data[offset:offset + size].decode("utf-8"))
+            offset += size
+        else:
+            offset += skip[tag]
+    return monitor
+
+
+def read_replay(filename):
+    """Yield the records in the replay log <filename>, in order, as tuples
+    with the drivers and riders named:
+
+        ("event", kind, timestamp, rider, driver)
+        ("match", pickup time, rider, driver)
+        ("activity", timestamp, category, description, identifier, row,
+         column)
+
+    where kind is the name of the event's class, or None for a kind that
+    has no code, and rider and driver are None when there is none.
+
+    @type filename: str
+    @rtype: iterator[tuple]
+    """
+    names = [[], []]
+
+    def name(category, index):
+        return None if index < 0 else names[category][index]
+
+    for tag, fields in _records(_read(filename)):
+        if tag == _NAME:
+            names[fields[0]].append(fields[1])
+        elif tag == _EVENT:
+            kind, timestamp, rider, driver = fields
+            yield ("event", EVENT_KINDS[kind].__name__
+                   if kind < len(EVENT_KINDS) else None, timestamp,
+                   name(1, rider), name(0, driver))
+        elif tag == _MATCH:
+            timestamp, rider, driver = fields
+            yield "match", timestamp, name(1, rider), name(0, driver)
+        else:
+            code, timestamp, actor, row, column = fields
+            yield ("activity", timestamp, _CATEGORIES[code // 4],
+                   _DESCRIPTIONS[code % 4], name(code // 4, actor), row,
+                   column)
+
+
+def first_difference(first, second):
+    """Return the position of the first record that differs between the
+    replay logs <first> and <second>, and the two records there, or None if
+    the logs hold the same records.
+
+    A log that ends early has None in place of its missing records.
+
+    @type first: str
+    @type second: str
+    @rtype: (int, tuple | None, tuple | None) | None
+    """
+    records = read_replay(second)
+    position = -1
+    for position, record in enumerate(read_replay(first)):
+        other = next(records, None)
+        if record != other:
+            return position, record, other
+    other = next(records, None)
+    if other is not None:
+        return position + 1, None, other
+    return None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2:
+        print(replay(sys.argv[1]).report())
+    elif len(sys.argv) == 3:
+        difference = first_difference(sys.argv[1], sys.argv[2])
+        if difference is None:
+            print("the logs are the same")
+        else:
+            print("record {}: {} != {}".format(*difference))
+    else:
+        sys.exit("usage: python replay.py LOG [OTHER_LOG]")
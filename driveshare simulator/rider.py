@@ -32,7 +32,14 @@ class Rider:
         the current status of the Rider (Waiting, Cancelled or Satisfied)
     @type patience: int
         the amount of time units the Rider will wait before cancellation
+    @type cancellation: Cancellation | None
+        the Rider's scheduled Cancellation event, until it happens or the
+        Rider is picked up
     """
+
+    __slots__ = ("id", "origin", "destination", "patience", "status",
+                 "cancellation")
+
     def __init__(self, identifier, origin, destination, patience):
         """
         Create a Rider
@@ -47,6 +54,7 @@ class Rider:
         self.destination = destination
         self.patience = patience
         self.status = WAITING
+        self.cancellation = None
 
     def __eq__(self, other):
         """
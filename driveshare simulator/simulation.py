@@ -1,7 +1,13 @@
+import gzip
+import os
+import pickle
+from time import perf_counter
+
 from container import PriorityQueue
 from dispatcher import Dispatcher
-from event import Event, create_event_list
+from event import create_event_list
 from monitor import Monitor
+from profiler import TimedDispatcher
 
 
 class Simulation:
@@ -10,57 +16,529 @@ class Simulation:
     This is the class which is responsible for setting up and running a
     simulation.
 
-    The API is given to you: your main task is to implement the run
-    method below according to its docstring.
-
-    Of course, you may add whatever private attributes and methods you want.
-    But because you should not change the interface, you may not add any public
-    attributes or methods.
+    run processes a list or stream of events from start to finish and
+    returns the report. A simulation can also be advanced a little at a
+    time: start loads the events, run_until and step process some of them,
+    inject adds new events on the way, now and is_done tell how far it has
+    got, report gives the report on the events processed so far, and finish
+    processes the rest and returns the final report.
 
-    This is the entry point into your program, and in particular is used for
-    auto-testing purposes. This makes it ESSENTIAL that you do not change the
-    interface in any way!
+    run can also save checkpoints of the complete state of the simulation
+    at regular intervals of simulated time. restore loads a checkpoint, and
+    resume carries the run on from there to the same report.
     """
 
     # === Private Attributes ===
-    # @type _events: PriorityQueue[Event]
+    # @type _events: Container[Event]
     #     A sequence of events arranged in priority determined by the event
     #     sorting order.
     # @type _dispatcher: Dispatcher
     #     The dispatcher associated with the simulation.
+    # @type _monitor: Monitor
+    #     The monitor that records the activities in the simulation.
+    # @type _source: iterator[Event] | None
+    #     The rest of the input stream, when running in streaming mode.
+    # @type _next_input: Event | None
+    #     The next event from the input stream, read ahead of time so that
+    #     it can be compared with the events in the queue.
+    # @type _consumed: int
+    #     The number of events read from the input stream so far.
+    # @type _profiler: Profiler | None
+    #     Records timings while running, if profiling.
+    # @type _checkpoint_file: str | None
+    #     Where to save checkpoints, or None to not save them.
+    # @type _checkpoint_interval: int | None
+    #     The simulated time between checkpoints.
+    # @type _next_checkpoint: int | None
+    #     The simulated time of the next checkpoint.
+    # @type _unsaved: int
+    #     The number of events processed since the last checkpoint.
+    # @type _timeseries: TimeSeries | None
+    #     Takes a snapshot of the metrics at the end of every window, if
+    #     given.
+    # @type _now: int
+    #     The simulated time reached by run_until or step; events may not be
+    #     injected before it.
+    # @type _replay_log: ReplayLog | None
+    #     Records the run in a replay log, if given.
 
-    def __init__(self):
+    def __init__(self, queue=None, sink=None, monitor=None, dispatcher=None,
+                 profiler=None, timeseries=None, replay_log=None):
         """Initialize a Simulation.
 
         @type self: Simulation
+        @type queue: Container | None
+            An empty container to hold the pending events, e.g. a
+            CalendarQueue for traces with dense integer timestamps. A
+            PriorityQueue is used if no container is given.
+        @type sink: LogSink | None
+            Where the monitor logs activities; they are printed if no sink
+            is given.
+        @type monitor: Monitor | None
+            The monitor to record activities with, e.g. a StreamingMonitor
+            for long runs. If it is given, <sink> is ignored; otherwise a
+            Monitor logging to <sink> is used.
+        @type dispatcher: Dispatcher | None
+            The dispatcher to use, e.g. one that works in batches. A new
+            Dispatcher is used if none is given.
+        @type profiler: Profiler | None
+            If given, record where the time goes while running, and add its
+            report to the result of run under "profile".
+        @type timeseries: TimeSeries | None
+            If given, take a snapshot of the metrics at the end of every
+            window of its interval while running, and pass each to its
+            callback.
+        @type replay_log: ReplayLog | None
+            If given, record every event processed, every dispatch decision
+            and every activity in it while running. It is closed when the
+            run finishes.
         @rtype: None
         """
-        self._events = PriorityQueue()
-        self._dispatcher = Dispatcher()
-        self._monitor = Monitor()
+        if queue is None:
+            queue = PriorityQueue()
+        self._events = queue
+        if dispatcher is None:
+            dispatcher = Dispatcher()
+        self._dispatcher = dispatcher
+        if monitor is None:
+            monitor = Monitor(sink)
+        self._monitor = monitor
+        self._profiler = profiler
+        self._timeseries = timeseries
+        self._source = None
+        self._next_input = None
+        self._consumed = 0
+        self._checkpoint_file = None
+        self._checkpoint_interval = None
+        self._next_checkpoint = None
+        self._unsaved = 0
+        self._now = 0
+        self._replay_log = replay_log
 
-    def run(self, initial_events):
+    def run(self, initial_events, stream=False, checkpoint_file=None,
+            checkpoint_interval=None):
         """Run the simulation on the list of events in <initial_events>.
 
         Return a dictionary containing statistics of the simulation,
         according to the specifications in the assignment handout.
 
+        If <stream> is True, <initial_events> may be any iterable of events,
+        such as the generator returned by read_events. It is read lazily and
+        merged with the events spawned during the simulation, so only the
+        pending events are ever held in memory. In this mode the events must
+        be in order of timestamp.
+
+        If <checkpoint_file> is given, the complete state of the simulation
+        is saved to it every <checkpoint_interval> units of simulated time,
+        overwriting the previous checkpoint. See restore.
+
         @type self: Simulation
-        @type initial_events: list[Event]
+        @type initial_events: list[Event] | iterable[Event]
             An initial list of events.
+        @type stream: bool
+        @type checkpoint_file: str | None
+        @type checkpoint_interval: int | None
+            Precondition: checkpoint_interval > 0 if checkpoint_file is given.
+        @rtype: dict[str, object]
+        """
+        self.start(initial_events, stream)
+        if checkpoint_file is not None:
+            self._checkpoint_file = checkpoint_file
+            self._checkpoint_interval = checkpoint_interval
+            self._next_checkpoint = checkpoint_interval
+        return self.finish()
+
+    def start(self, initial_events, stream=False):
+        """Load <initial_events>, as run does, without processing any of
+        them, so the simulation can be advanced a little at a time with
+        run_until and step.
+
+        @type self: Simulation
+        @type initial_events: list[Event] | iterable[Event]
+        @type stream: bool
+        @rtype: None
+
+        >>> from event import create_event_list
+        >>> from log_sink import NullSink
+        >>> simulation = Simulation(sink=NullSink())
+        >>> simulation.start(create_event_list("events.txt"))
+        >>> simulation.run_until(10)
+        >>> simulation.now()
+        10
+        >>> simulation.step(2)
+        2
+        >>> simulation.finish()["rider_wait_time"]
+        0.5
+        """
+        if stream:
+            self._source = iter(initial_events)
+            self._read_input()
+        else:
+            self._events.add_all(initial_events)
+
+    def run_until(self, timestamp):
+        """Process every event before <timestamp>, saving checkpoints and
+        taking snapshots on the way as run would.
+
+        @type self: Simulation
+        @type timestamp: int
+            Precondition: timestamp >= self.now()
+        @rtype: None
+        """
+        self._advance(timestamp)
+        self._now = timestamp
+
+    def step(self, count=1):
+        """Process the next <count> events, or as many as are left, and
+        return the number processed.
+
+        Snapshots are taken as the events pass the end of each window, but
+        no checkpoints are saved and the events are not profiled.
+
+        @type self: Simulation
+        @type count: int
+        @rtype: int
+        """
+        monitor = self._watched_monitor()
+        replay_log = self._replay_log
+        processed = 0
+        while processed < count:
+            event = self._next_event()
+            if event is None:
+                break
+            self._now = event.timestamp
+            while self._timeseries is not None and \
+                    self._timeseries.next_end <= event.timestamp:
+                self._timeseries.snapshot(self._dispatcher)
+            if replay_log is not None:
+                replay_log.record_event(event)
+            new_events = event.do(self._dispatcher, monitor)
+            if replay_log is not None:
+                replay_log.record_decisions(new_events)
+            if new_events is not None:
+                for i in new_events:
+                    self._schedule(i)
+            processed += 1
+        self._unsaved += processed
+        return processed
+
+    def inject(self, event):
+        """Add <event> to a simulation that is being advanced with
+        run_until or step.
+
+        Raise ValueError if <event> is before the time the simulation has
+        reached.
+
+        @type self: Simulation
+        @type event: Event
+        @rtype: None
+        """
+        if event.timestamp < self._now:
+            raise ValueError("cannot inject an event at {} into a simulation "
+                             "at {}".format(event.timestamp, self._now))
+        self._schedule(event)
+
+    def now(self):
+        """Return the simulated time reached by run_until or step.
+
+        @type self: Simulation
+        @rtype: int
+        """
+        return self._now
+
+    def is_done(self):
+        """Return True iff there are no events left to process.
+
+        @type self: Simulation
+        @rtype: bool
+        """
+        return self._next_input is None and self._events.is_empty()
+
+    def resume(self, initial_events=None):
+        """Continue a run that was restored from a checkpoint, and return
+        the same dictionary as run.
+
+        If the original run was streaming, <initial_events> must be the same
+        input stream again; the events that had already been read are
+        skipped.
+
+        @type self: Simulation
+        @type initial_events: iterable[Event] | None
+        @rtype: dict[str, object]
+        """
+        if initial_events is not None:
+            self._source = iter(initial_events)
+            for _ in range(self._consumed):
+                next(self._source)
+        return self.finish()
+
+    @staticmethod
+    def restore(filename, sink=None, timeseries_callback=None):
+        """Return the Simulation saved in the checkpoint <filename>, ready
+        for resume.
+
+        Activity logs are not saved in checkpoints, so the restored
+        simulation logs to <sink>, or prints its activities if no sink is
+        given. Nor are TimeSeries callbacks, so the restored simulation
+        passes its snapshots to <timeseries_callback>, if it takes them. A
+        ReplayLog reopens its file, cut back to where it was at the
+        checkpoint.
+
+        @type filename: str
+        @type sink: LogSink | None
+        @type timeseries_callback: callable | None
+        @rtype: Simulation
+        """
+        with gzip.open(filename, "rb") as file:
+            simulation = pickle.load(file)
+        if sink is not None:
+            simulation._monitor.set_sink(sink)
+        if simulation._timeseries is not None:
+            simulation._timeseries.set_callback(timeseries_callback)
+        return simulation
+
+    def _save_checkpoint(self):
+        """Save the complete state of this simulation to the checkpoint file.
+
+        The file is replaced in one step, so a crash while saving leaves the
+        previous checkpoint intact.
+
+        @type self: Simulation
+        @rtype: None
+        """
+        self._monitor.flush()
+        self._unsaved = 0
+        temporary = self._checkpoint_file + ".tmp"
+        with gzip.open(temporary, "wb", compresslevel=1) as file:
+            pickle.dump(self, file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, self._checkpoint_file)
+
+    def __getstate__(self):
+        """Return the state to pickle: everything but the input stream,
+        which is replaced by a count of the events read from it.
+
+        @type self: Simulation
+        @rtype: dict[str, object]
+        """
+        state = self.__dict__.copy()
+        state["_source"] = None
+        return state
+
+    def finish(self):
+        """Process the remaining events, saving checkpoints and taking
+        snapshots if asked to, and return the report.
+
+        @type self: Simulation
+        @rtype: dict[str, object]
+        """
+        self._advance(None)
+        # run_until and step can leave the last window unfinished.
+        if self._timeseries is not None and self._timeseries.has_activity():
+            self._timeseries.snapshot(self._dispatcher)
+        if self._replay_log is not None:
+            self._replay_log.close()
+        return self.report()
+
+    def report(self):
+        """Return the report on the events processed so far.
+
+        @type self: Simulation
         @rtype: dict[str, object]
         """
-        for i in initial_events:
-            self._events.add(i)
+        self._monitor.flush()
+        report = self._monitor.report()
+        if self._profiler is not None:
+            report["profile"] = self._profiler.report()
+        return report
 
-        while not self._events.is_empty():
-            current_event = self._events.remove()
-            new_events = current_event.do(self._dispatcher, self._monitor)
+    def _advance(self, until):
+        """Process the events before <until>, or every event if <until> is
+        None, saving checkpoints and taking snapshots if asked to.
+
+        @type self: Simulation
+        @type until: int | None
+        @rtype: None
+        """
+        timeseries = self._timeseries
+        while (self._checkpoint_file is not None or
+               timeseries is not None) and not self.is_done():
+            limits = []
+            if self._checkpoint_file is not None:
+                # Skip the intervals with no events in them at once, rather
+                # than stepping through them one at a time.
+                interval = self._checkpoint_interval
+                timestamp = self._next_timestamp()
+                if timestamp >= self._next_checkpoint:
+                    self._next_checkpoint += \
+                        (timestamp - self._next_checkpoint) // interval * \
+                        interval + interval
+                    # Events processed by an earlier call, or by step, are
+                    # still unsaved. Nothing happens before the next event,
+                    # so this is the state the skipped checkpoint would
+                    # have saved.
+                    if self._unsaved > 0:
+                        self._save_checkpoint()
+                limits.append(self._next_checkpoint)
+            if timeseries is not None:
+                limits.append(timeseries.next_end)
+            limit = min(limits)
+            if until is not None and until < limit:
+                break
+            self._unsaved += self._process(limit)
+            if timeseries is not None and timeseries.next_end == limit:
+                timeseries.snapshot(self._dispatcher)
+            if self._checkpoint_file is not None and \
+                    self._next_checkpoint == limit:
+                self._next_checkpoint += self._checkpoint_interval
+                if self._unsaved > 0:
+                    self._save_checkpoint()
+        self._unsaved += self._process(until)
+        # Every later checkpoint is due once there are no events left.
+        if until is None and self._checkpoint_file is not None and \
+                self._unsaved > 0:
+            self._save_checkpoint()
+
+    def _process(self, limit):
+        """Process the events with timestamps before <limit>, or every event
+        if <limit> is None, and return the number processed.
+
+        @type self: Simulation
+        @type limit: int | None
+        @rtype: int
+        """
+        if self._profiler is not None:
+            return self._process_profiled(limit)
+
+        monitor = self._watched_monitor()
+        replay_log = self._replay_log
+        processed = 0
+        current_event = self._next_event(limit)
+        while current_event is not None:
+            processed += 1
+            if replay_log is not None:
+                replay_log.record_event(current_event)
+            new_events = current_event.do(self._dispatcher, monitor)
+            if replay_log is not None:
+                replay_log.record_decisions(new_events)
             if new_events is not None:
                 for i in new_events:
-                    self._events.add(i)
+                    self._schedule(i)
+            current_event = self._next_event(limit)
+        return processed
+
+    def _process_profiled(self, limit):
+        """Process events as _process does, recording timings with the
+        profiler, and return the number processed.
+
+        @type self: Simulation
+        @type limit: int | None
+        @rtype: int
+        """
+        profiler = self._profiler
+        dispatcher = TimedDispatcher(self._dispatcher, profiler)
+        monitor = self._watched_monitor()
+        replay_log = self._replay_log
+        processed = 0
+        while True:
+            start = perf_counter()
+            current_event = self._next_event(limit)
+            if current_event is None:
+                return processed
+            processed += 1
+            profiler.record_pop(perf_counter() - start)
+            profiler.record_depth(current_event.timestamp, len(self._events))
 
-        return self._monitor.report()
+            if replay_log is not None:
+                replay_log.record_event(current_event)
+            start = perf_counter()
+            new_events = current_event.do(dispatcher, monitor)
+            profiler.record_event(current_event, perf_counter() - start)
+            if replay_log is not None:
+                replay_log.record_decisions(new_events)
+
+            if new_events is not None:
+                start = perf_counter()
+                for i in new_events:
+                    self._schedule(i)
+                profiler.record_push(len(new_events), perf_counter() - start)
+
+    def _watched_monitor(self):
+        """Return the object to notify of activities: the monitor, watched
+        by the TimeSeries and the ReplayLog, if there are any.
+
+        @type self: Simulation
+        @rtype: Monitor | TimeSeries | ReplayLog
+        """
+        monitor = self._monitor
+        if self._timeseries is not None:
+            monitor = self._timeseries.watch(monitor)
+        if self._replay_log is not None:
+            monitor = self._replay_log.watch(monitor)
+        return monitor
+
+    def _schedule(self, event):
+        """Add <event> to the queue, keeping its handle if it is cancellable.
+
+        @type self: Simulation
+        @type event: Event
+        @rtype: None
+        """
+        if event.cancellable:
+            event.handle = self._events.schedule(event)
+        else:
+            self._events.add(event)
+
+    def _read_input(self):
+        """Read the next event from the input stream into _next_input.
+
+        @type self: Simulation
+        @rtype: None
+        """
+        self._next_input = next(self._source, None)
+        if self._next_input is not None:
+            self._consumed += 1
+
+    def _next_timestamp(self):
+        """Return the timestamp of the next event to process.
+
+        @type self: Simulation
+        @rtype: int
+            Precondition: not self.is_done()
+        """
+        if self._next_input is None:
+            return self._events.peek().timestamp
+        if self._events.is_empty():
+            return self._next_input.timestamp
+        return min(self._next_input.timestamp, self._events.peek().timestamp)
+
+    def _next_event(self, limit=None):
+        """Remove and return the next event to process, or None if there are
+        no events left or the next one is not before <limit>.
+
+        An input event is processed before queued events with the same
+        timestamp, just as if it had been added to the queue at the start.
+
+        @type self: Simulation
+        @type limit: int | None
+        @rtype: Event | None
+        """
+        event = self._next_input
+        if event is not None and (self._events.is_empty() or
+                                  event <= self._events.peek()):
+            if limit is not None and event.timestamp >= limit:
+                return None
+            self._read_input()
+            if self._next_input is not None and self._next_input < event:
+                raise ValueError("input events are not in timestamp order: "
+                                 "{} comes after {}".format(
+                                     self._next_input.timestamp,
+                                     event.timestamp))
+            return event
+        if self._events.is_empty():
+            return None
+        if limit is not None and self._events.peek().timestamp >= limit:
+            return None
+        return self._events.remove()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,210 @@
+"""
+The sweep module runs many variants of one trace, each in its own
+Simulation, on a pool of worker processes, and collects their reports into
+one table.
+
+A scenario is a dict that may set any of these parameters:
+
+    fleet_size      only the first fleet_size distinct drivers take part
+    speed           every driver drives at this speed
+    patience_scale  every rider's patience is multiplied by this, rounded
+    batch_window    the dispatcher matches in batches of this window
+
+Parameters that are missing or None leave the trace unchanged.
+"""
+import csv
+import itertools
+import sys
+from multiprocessing import Pool
+
+from dispatcher import Dispatcher
+from driver import Driver
+from event import DriverRequest, RiderRequest, read_events
+from log_sink import NullSink
+from monitor import StreamingMonitor
+from rider import Rider
+from simulation import Simulation
+
+PARAMETERS = ["fleet_size", "speed", "patience_scale", "batch_window"]
+
+# The base trace and travel model in each worker process, set by
+# _init_worker.
+_records = None
+_travel_model = None
+
+
+def load_records(filename):
+    """Return the events in <filename> as plain tuples.
+
+    Events hold drivers and riders whose state changes during a simulation,
+    so they cannot be shared between runs. These tuples can: each run
+    builds its own events from them.
+
+    A driver request is (timestamp, True, id, location, speed) and a rider
+    request is (timestamp, False, id, origin, destination, patience).
+
+    @type filename: str
+    @rtype: list[tuple]
+    """
+    records = []
+    for event in read_events(filename):
+        if isinstance(event, DriverRequest):
+            driver = event.driver
+            records.append((event.timestamp, True, driver.identifier,
+                            driver.location, driver.speed))
+        else:
+            rider = event.rider
+            records.append((event.timestamp, False, rider.id, rider.origin,
+                            rider.destination, rider.patience))
+    return records
+
+
+def scenario_grid(**values):
+    """Return every combination of the given parameter values as a list of
+    scenarios.
+
+    @type values: dict[str, list]
+    @rtype: list[dict[str, object]]
+
+    >>> scenario_grid(fleet_size=[10, 20], speed=[1])
+    [{'fleet_size': 10, 'speed': 1}, {'fleet_size': 20, 'speed': 1}]
+    """
+    for name in values:
+        if name not in PARAMETERS:
+            raise ValueError("unknown scenario parameter: {}".format(name))
+    names = list(values)
+    return [dict(zip(names, combination))
+            for combination in itertools.product(*values.values())]
+
+
+def build_events(records, scenario):
+    """Return a new list of events for <records>, changed as <scenario>
+    says.
+
+    @type records: list[tuple]
+    @type scenario: dict[str, object]
+    @rtype: list[Event]
+    """
+    fleet_size = scenario.get("fleet_size")
+    speed = scenario.get("speed")
+    patience_scale = scenario.get("patience_scale")
+
+    fleet = set()
+    events = []
+    for record in records:
+        if record[1]:
+            timestamp, _, identifier, location, driver_speed = record
+            if fleet_size is not None and identifier not in fleet:
+                if len(fleet) == fleet_size:
+                    continue
+                fleet.add(identifier)
+            if speed is not None:
+                driver_speed = speed
+            events.append(DriverRequest(timestamp, Driver(
+                identifier, location, driver_speed)))
+        else:
+            timestamp, _, identifier, origin, destination, patience = record
+            if patience_scale is not None:
+                patience = round(patience * patience_scale)
+            events.append(RiderRequest(timestamp, Rider(
+                identifier, origin, destination, patience)))
+    return events
+
+
+def run_scenario(records, scenario, travel_model=None):
+    """Run one scenario of <records> and return its report, with the
+    scenario's parameters added.
+
+    @type records: list[tuple]
+    @type scenario: dict[str, object]
+    @type travel_model: TravelModel | None
+        The travel model for the dispatcher; Manhattan distance if None.
+    @rtype: dict[str, object]
+    """
+    simulation = Simulation(
+        monitor=StreamingMonitor(NullSink()),
+        dispatcher=Dispatcher(batch_window=scenario.get("batch_window"),
+                              travel_model=travel_model))
+    row = dict(scenario)
+    row.update(simulation.run(build_events(records, scenario)))
+    return row
+
+
+def _init_worker(records, travel_model=None):
+    """Store the base trace and travel model in this worker process.
+
+    @type records: list[tuple]
+    @type travel_model: TravelModel | None
+    @rtype: None
+    """
+    global _records, _travel_model
+    _records = records
+    _travel_model = travel_model
+
+
+def _run_in_worker(scenario):
+    """Run one scenario of the base trace stored in this worker process.
+
+    If the scenario fails, return its parameters with an error column
+    describing the exception instead, so one bad scenario does not lose
+    the rows of the others.
+
+    @type scenario: dict[str, object]
+    @rtype: dict[str, object]
+
+    >>> _init_worker([(0, False, "Amaranth", None, None, 5)])
+    >>> _run_in_worker({"patience_scale": "x"})
+    {'patience_scale': 'x', 'error': "TypeError: type str doesn't define \
+__round__ method"}
+    """
+    try:
+        return run_scenario(_records, scenario, _travel_model)
+    except Exception as error:
+        row = dict(scenario)
+        row["error"] = "{}: {}".format(type(error).__name__, error)
+        return row
+
+
+def run_sweep(filename, scenarios, processes=None, travel_model=None):
+    """Run every scenario of the trace in <filename> and return their
+    reports, in the same order as <scenarios>. A scenario that fails has
+    its parameters and an error column in place of its report.
+
+    The trace is parsed once, and handed to each worker process once, along
+    with the travel model.
+
+    @type filename: str
+    @type scenarios: list[dict[str, object]]
+    @type processes: int | None
+        The number of worker processes; one per CPU if None.
+    @type travel_model: TravelModel | None
+        The travel model for every scenario; Manhattan distance if None.
+    @rtype: list[dict[str, object]]
+    """
+    records = load_records(filename)
+    with Pool(processes, _init_worker, (records, travel_model)) as pool:
+        return pool.map(_run_in_worker, scenarios, chunksize=1)
+
+
+def write_table(rows, file):
+    """Write <rows>, as returned by run_sweep, to <file> as CSV.
+
+    @type rows: list[dict[str, object]]
+    @type file: file
+    @rtype: None
+    """
+    columns = []
+    for row in rows:
+        for name in row:
+            if name not in columns:
+                columns.append(name)
+    writer = csv.DictWriter(file, columns)
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    write_table(run_sweep(sys.argv[1] if len(sys.argv) > 1 else "events.txt",
+                          scenario_grid(fleet_size=[2, 4, 6],
+                                        patience_scale=[0.5, 1, 2])),
+                sys.stdout)
@@ -0,0 +1,223 @@
+"""
+The timeseries module contains TimeSeries, which a Simulation uses to take
+a snapshot of its metrics at the end of every window of simulated time, and
+CsvSeriesWriter, which writes those snapshots to a CSV file.
+
+A snapshot is a dict with the following keys:
+
+    start, end       the window of simulated time, [start, end)
+    requests         the number of rider requests in the window
+    pickups          the number of riders picked up in the window
+    cancellations    the number of riders who cancelled in the window
+    mean_wait        the mean wait of the riders who were picked up or
+                     cancelled in the window, or None if there were none
+    p95_wait         the 95th percentile of the same waits, or None
+    idle_drivers     the number of registered drivers idle at the end of the
+                     window
+    busy_drivers     the number of registered drivers busy at the end of the
+                     window
+    waiting_riders   the number of riders on the dispatcher's waiting list at
+                     the end of the window
+
+The counts are kept as the simulation runs, so taking a snapshot does not
+look back over the monitor's activities.
+"""
+import csv
+
+from histogram import LogHistogram
+from monitor import RIDER, REQUEST, PICKUP, CANCEL
+
+FIELDS = ["start", "end", "requests", "pickups", "cancellations", "mean_wait",
+          "p95_wait", "idle_drivers", "busy_drivers", "waiting_riders"]
+
+
+class TimeSeries:
+    """Windowed metrics of a running simulation.
+
+    === Attributes ===
+    @type interval: int
+        The length of each window of simulated time.
+    @type next_end: int
+        The end of the current window.
+    """
+
+    # === Private Attributes ===
+    # @type _callback: callable | None
+    #     Called with each snapshot, or None to discard them.
+    # @type _monitor: Monitor | None
+    #     The monitor that notifications are passed on to.
+    # @type _waiting: dict[str, int]
+    #     The request time of each rider that has not yet been picked up or
+    #     cancelled.
+    # @type _requests: int
+    #     The number of rider requests in the current window.
+    # @type _pickups: int
+    #     The number of riders picked up in the current window.
+    # @type _cancellations: int
+    #     The number of riders who cancelled in the current window.
+    # @type _waits: LogHistogram
+    #     The waits of the riders who stopped waiting in the current window.
+    # @type _activities: int
+    #     The number of activities of any kind in the current window.
+
+    def __init__(self, interval, callback=None):
+        """Initialize a TimeSeries.
+
+        @type self: TimeSeries
+        @type interval: int
+            Precondition: interval > 0
+        @type callback: callable | None
+            Called with each snapshot, e.g. a CsvSeriesWriter or the append
+            method of a list.
+        @rtype: None
+        """
+        self.interval = interval
+        self.next_end = interval
+        self._callback = callback
+        self._monitor = None
+        self._waiting = {}
+        self._start_window()
+
+    def _start_window(self):
+        """Reset the counts for a new window.
+
+        @type self: TimeSeries
+        @rtype: None
+        """
+        self._requests = 0
+        self._pickups = 0
+        self._cancellations = 0
+        self._waits = LogHistogram()
+        self._activities = 0
+
+    def has_activity(self):
+        """Return True iff any activity has been counted in the current
+        window.
+
+        @type self: TimeSeries
+        @rtype: bool
+        """
+        return self._activities > 0
+
+    def __getstate__(self):
+        """Return the state to pickle: everything but the callback.
+
+        @type self: TimeSeries
+        @rtype: dict[str, object]
+        """
+        state = self.__dict__.copy()
+        state["_callback"] = None
+        return state
+
+    def set_callback(self, callback):
+        """Call <callback> with each snapshot from now on, e.g. after the
+        simulation has been restored from a checkpoint.
+
+        @type self: TimeSeries
+        @type callback: callable | None
+        @rtype: None
+        """
+        self._callback = callback
+
+    def watch(self, monitor):
+        """Return an object to notify instead of <monitor>, which counts
+        each activity and passes it on to <monitor>.
+
+        @type self: TimeSeries
+        @type monitor: Monitor
+        @rtype: TimeSeries
+        """
+        self._monitor = monitor
+        return self
+
+    def notify(self, timestamp, category, description, identifier, location):
+        """Count the activity, and pass it on to the watched monitor.
+
+        @type self: TimeSeries
+        @type timestamp: int
+        @type category: DRIVER | RIDER
+        @type description: REQUEST | CANCEL | PICKUP | DROP_OFF
+        @type identifier: str
+        @type location: Location
+        @rtype: None
+        """
+        self._activities += 1
+        if category == RIDER:
+            if description == REQUEST:
+                self._requests += 1
+                self._waiting[identifier] = timestamp
+            elif identifier in self._waiting:
+                if description == PICKUP:
+                    self._pickups += 1
+                elif description == CANCEL:
+                    self._cancellations += 1
+                self._waits.record(timestamp - self._waiting.pop(identifier))
+        self._monitor.notify(timestamp, category, description, identifier,
+                             location)
+
+    def snapshot(self, dispatcher):
+        """Finish the current window, pass its snapshot to the callback and
+        start the next window.
+
+        @type self: TimeSeries
+        @type dispatcher: Dispatcher
+        @rtype: dict[str, object]
+
+        >>> from dispatcher import Dispatcher
+        >>> from location import Location
+        >>> from log_sink import NullSink
+        >>> from monitor import Monitor
+        >>> series = TimeSeries(10)
+        >>> monitor = series.watch(Monitor(NullSink()))
+        >>> monitor.notify(2, RIDER, REQUEST, "Dan", Location(1, 1))
+        >>> monitor.notify(5, RIDER, PICKUP, "Dan", Location(1, 1))
+        >>> row = series.snapshot(Dispatcher())
+        >>> row["requests"], row["pickups"], row["mean_wait"]
+        (1, 1, 3.0)
+        >>> series.next_end
+        20
+        """
+        idle, busy = dispatcher.driver_counts()
+        row = {"start": self.next_end - self.interval, "end": self.next_end,
+               "requests": self._requests, "pickups": self._pickups,
+               "cancellations": self._cancellations,
+               "mean_wait": self._waits.mean() if self._waits.count else None,
+               "p95_wait": (self._waits.percentile(95) if self._waits.count
+                            else None),
+               "idle_drivers": idle, "busy_drivers": busy,
+               "waiting_riders": len(dispatcher.rider_list)}
+        if self._callback is not None:
+            self._callback(row)
+        self.next_end += self.interval
+        self._start_window()
+        return row
+
+
+class CsvSeriesWriter:
+    """A TimeSeries callback that writes each snapshot as a row of a CSV
+    file, after a header row.
+    """
+
+    # === Private Attributes ===
+    # @type _writer: csv.DictWriter
+    #     The writer for the file.
+
+    def __init__(self, file):
+        """Initialize a CsvSeriesWriter and write the header to <file>.
+
+        @type self: CsvSeriesWriter
+        @type file: file
+            A file open for writing text.
+        @rtype: None
+        """
+        self._writer = csv.DictWriter(file, FIELDS)
+        self._writer.writeheader()
+
+    def __call__(self, row):
+        """Write the snapshot <row>.
+
+        @type self: CsvSeriesWriter
+        @type row: dict[str, object]
+        @rtype: None
+        """
+        self._writer.writerow(row)
@@ -0,0 +1,504 @@
+"""
+The travel module contains the travel models that decide how far apart two
+locations are for a driver. A Dispatcher is given the model to use, and
+passes it on to its drivers and its index of idle drivers.
+
+GridModel measures Manhattan distance on the grid, and is the default.
+RoadNetwork measures shortest-path distance on a weighted road graph.
+
+Each model also gives a lower bound on its distances, as a multiple of the
+Manhattan distance, which the DriverIndex uses to stop its searches early,
+and can measure the distances from many locations to one destination at
+once, which is how the DriverIndex scores its candidate drivers.
+"""
+from collections import OrderedDict
+from heapq import heappush, heappop
+
+from location import deserialize_location, manhattan_distance
+
+
+class TravelModel:
+    """A way of measuring the distance a driver covers between two
+    locations.
+
+    This is an abstract class.  Only child classes should be instantiated.
+
+    === Attributes ===
+    @type min_ratio: float
+        No distance is less than min_ratio times the Manhattan distance
+        between the same locations.
+    """
+
+    min_ratio = 0.0
+
+    def distance(self, origin, destination):
+        """Return the distance from <origin> to <destination>.
+
+        @type self: TravelModel
+        @type origin: Location
+        @type destination: Location
+        @rtype: int | float
+        """
+        raise NotImplementedError("Implemented in a subclass")
+
+    def distances_to(self, destination):
+        """Return a Distances that measures the distance from any location
+        to <destination>.
+
+        Measuring from many locations through one Distances can be much
+        cheaper than calling distance for each of them.
+
+        @type self: TravelModel
+        @type destination: Location
+        @rtype: Distances
+        """
+        return Distances(self, destination)
+
+
+class Distances:
+    """The distances from any location to one destination, measured one
+    location at a time with the travel model's distance method.
+
+    Travel models that can do better return a subclass of Distances from
+    distances_to.
+    """
+
+    # === Private Attributes ===
+    # @type _model: TravelModel
+    #     The travel model that measures the distances.
+    # @type _destination: Location
+    #     The location the distances are measured to.
+
+    def __init__(self, model, destination):
+        """Initialize the Distances to <destination> with <model>.
+
+        @type self: Distances
+        @type model: TravelModel
+        @type destination: Location
+        @rtype: None
+        """
+        self._model = model
+        self._destination = destination
+
+    def distance(self, origin, bound=None):
+        """Return the distance from <origin> to the destination, or None if
+        it is more than <bound>.
+
+        @type self: Distances
+        @type origin: Location
+        @type bound: int | float | None
+        @rtype: int | float | None
+
+        >>> from location import Location
+        >>> distances = GridModel().distances_to(Location(0, 0))
+        >>> distances.distance(Location(2, 3))
+        5
+        >>> print(distances.distance(Location(2, 3), 4))
+        None
+        """
+        distance = self._model.distance(origin, self._destination)
+        if bound is not None and distance > bound:
+            return None
+        return distance
+
+
+class GridModel(TravelModel):
+    """Travel straight along the rows and columns of the grid."""
+
+    min_ratio = 1.0
+
+    def distance(self, origin, destination):
+        """Return the Manhattan distance from <origin> to <destination>.
+
+        @type self: GridModel
+        @type origin: Location
+        @type destination: Location
+        @rtype: int
+        """
+        return manhattan_distance(origin, destination)
+
+
+class RoadNetwork(TravelModel):
+    """Travel along the shortest route through a weighted road graph.
+
+    Every location a driver or rider uses must be a node of the graph.
+    Shortest paths are found with A*, guided by the Manhattan distance
+    scaled by min_ratio, and the most recently used results are cached.
+    For small graphs, precompute stores the distance between every pair of
+    nodes instead.
+
+    The searches number the nodes and work on the numbers, which hash much
+    faster than locations. The numbering is made again when the first
+    search after a change to the roads needs it.
+    """
+
+    # === Private Attributes ===
+    # @type _roads: dict[Location, list[(Location, int | float)]]
+    #     The roads leaving each node, with their lengths.
+    # @type _directed: bool
+    #     Whether roads are one-way.
+    # @type _ids: dict[Location, int] | None
+    #     The number of each node, or None if the roads have changed since
+    #     the nodes were last numbered.
+    # @type _nodes: list[Location]
+    #     The node with each number.
+    # @type _rows: list[int]
+    #     The row of the node with each number.
+    # @type _columns: list[int]
+    #     The column of the node with each number.
+    # @type _forward: list[list[(int, int | float)]]
+    #     The roads leaving the node with each number, with their lengths.
+    # @type _backward: list[list[(int, int | float)]]
+    #     The roads arriving at the node with each number, with their
+    #     lengths; the same as _forward unless the network is directed.
+    # @type _cache: OrderedDict[(int, int), int | float]
+    #     Recently found distances between numbered nodes, least recently
+    #     used first.
+    # @type _cache_size: int
+    #     The most distances kept in _cache.
+    # @type _table: list[list[int | float | None]] | None
+    #     The distance from the node with each number to the node with
+    #     each number, or None where there is no route, once precomputed.
+    # @type _has_ratio: bool
+    #     Whether min_ratio has been measured from a road yet.
+
+    def __init__(self, directed=False, cache_size=100000):
+        """Initialize a RoadNetwork with no roads.
+
+        @type self: RoadNetwork
+        @type directed: bool
+            Whether roads are one-way.
+        @type cache_size: int
+            The most distances to keep in the cache.
+        @rtype: None
+        """
+        self._roads = {}
+        self._directed = directed
+        self._ids = None
+        self._nodes = []
+        self._rows = []
+        self._columns = []
+        self._forward = []
+        self._backward = []
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._table = None
+        self._has_ratio = False
+        # No lower bound until a road gives one.
+        self.min_ratio = 0.0
+
+    def add_road(self, start, end, length):
+        """Add a road of <length> from <start> to <end>, and the other way
+        too unless the network is directed.
+
+        @type self: RoadNetwork
+        @type start: Location
+        @type end: Location
+        @type length: int | float
+            Precondition: length >= 0
+        @rtype: None
+
+        >>> from location import Location
+        >>> network = RoadNetwork()
+        >>> network.min_ratio
+        0.0
+        >>> network.add_road(Location(0, 0), Location(0, 2), 3)
+        >>> network.min_ratio
+        1.5
+        """
+        self._roads.setdefault(start, []).append((end, length))
+        self._roads.setdefault(end, [])
+        if not self._directed:
+            self._roads[end].append((start, length))
+        grid_distance = manhattan_distance(start, end)
+        if grid_distance > 0:
+            ratio = length / grid_distance
+            if not self._has_ratio or ratio < self.min_ratio:
+                self.min_ratio = ratio
+                self._has_ratio = True
+        self._ids = None
+        self._cache.clear()
+        self._table = None
+
+    def distance(self, origin, destination):
+        """Return the length of the shortest route from <origin> to
+        <destination>.
+
+        Raise ValueError if there is no such route.
+
+        @type self: RoadNetwork
+        @type origin: Location
+        @type destination: Location
+        @rtype: int | float
+
+        >>> from location import Location
+        >>> network = RoadNetwork()
+        >>> network.add_road(Location(0, 0), Location(0, 1), 1)
+        >>> network.add_road(Location(0, 1), Location(1, 1), 5)
+        >>> network.add_road(Location(0, 0), Location(1, 0), 1)
+        >>> network.add_road(Location(1, 0), Location(1, 1), 1)
+        >>> network.distance(Location(0, 1), Location(1, 1))
+        3
+        """
+        if origin is destination:
+            return 0
+        ids = self._number_nodes()
+        start = ids.get(origin)
+        end = ids.get(destination)
+        if start is None or end is None:
+            raise ValueError("no route from {} to {}".format(origin,
+                                                             destination))
+        if self._table is not None:
+            distance = self._table[start][end]
+            if distance is None:
+                raise ValueError("no route from {} to {}".format(
+                    origin, destination))
+            return distance
+
+        key = (start, end)
+        if not self._directed and end < start:
+            key = (end, start)
+        distance = self._cache.get(key)
+        if distance is not None:
+            self._cache.move_to_end(key)
+            return distance
+
+        distance = self._search(*key)
+        self._cache[key] = distance
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return distance
+
+    def _number_nodes(self):
+        """Number the nodes and their roads, unless they already are, and
+        return the number of each node.
+
+        @type self: RoadNetwork
+        @rtype: dict[Location, int]
+        """
+        if self._ids is not None:
+            return self._ids
+        nodes = list(self._roads)
+        ids = {node: number for number, node in enumerate(nodes)}
+        forward = [[(ids[end], length) for end, length in self._roads[node]]
+                   for node in nodes]
+        backward = forward
+        if self._directed:
+            backward = [[] for _ in nodes]
+            for start, roads in enumerate(forward):
+                for end, length in roads:
+                    backward[end].append((start, length))
+        self._nodes = nodes
+        self._rows = [node.row for node in nodes]
+        self._columns = [node.column for node in nodes]
+        self._forward = forward
+        self._backward = backward
+        self._ids = ids
+        return ids
+
+    def _search(self, origin, destination):
+        """Return the length of the shortest route from the node numbered
+        <origin> to the node numbered <destination>, found with A*.
+
+        @type self: RoadNetwork
+        @type origin: int
+        @type destination: int
+        @rtype: int | float
+        """
+        ratio = self.min_ratio
+        rows = self._rows
+        columns = self._columns
+        forward = self._forward
+        row, column = rows[destination], columns[destination]
+        best = {origin: 0}
+        # Entries are (estimated total, -distance, insertion number, node).
+        # Of the nodes with the same estimate, the one furthest along is
+        # taken first, so with an exact estimate the search goes straight
+        # to the destination instead of widening across every tie.
+        frontier = [(ratio * (abs(rows[origin] - row) +
+                              abs(columns[origin] - column)), 0, 0, origin)]
+        count = 1
+        while frontier:
+            _, distance, _, node = heappop(frontier)
+            distance = -distance
+            if node == destination:
+                return distance
+            if distance > best[node]:
+                continue
+            for neighbour, length in forward[node]:
+                new_distance = distance + length
+                if new_distance < best.get(neighbour, new_distance + 1):
+                    best[neighbour] = new_distance
+                    heappush(frontier, (
+                        new_distance + ratio * (abs(rows[neighbour] - row) +
+                                                abs(columns[neighbour] -
+                                                    column)),
+                        -new_distance, count, neighbour))
+                    count += 1
+        raise ValueError("no route from {} to {}".format(
+            self._nodes[origin], self._nodes[destination]))
+
+    def distances_to(self, destination):
+        """Return a Distances that measures the distance from any node to
+        <destination>.
+
+        Unless the distances are precomputed, it runs one Dijkstra search
+        outward from <destination> along the roads in reverse, only as far
+        as the locations asked about need, so measuring from many nearby
+        locations costs about as much as measuring from the furthest one.
+
+        @type self: RoadNetwork
+        @type destination: Location
+        @rtype: Distances
+
+        >>> from location import Location
+        >>> network = RoadNetwork(directed=True)
+        >>> network.add_road(Location(0, 0), Location(0, 1), 1)
+        >>> network.add_road(Location(0, 1), Location(0, 2), 1)
+        >>> network.add_road(Location(0, 2), Location(0, 0), 5)
+        >>> distances = network.distances_to(Location(0, 2))
+        >>> distances.distance(Location(0, 0))
+        2
+        >>> print(distances.distance(Location(0, 0), 1))
+        None
+        >>> network.distances_to(Location(0, 0)).distance(Location(0, 1))
+        6
+        """
+        if self._table is not None:
+            return Distances(self, destination)
+        return _ReverseSearch(self, destination)
+
+    def precompute(self):
+        """Find and store the shortest distance between every pair of nodes.
+
+        This takes time and memory proportional to the square of the number
+        of nodes, so it is only suitable for small networks.
+
+        @type self: RoadNetwork
+        @rtype: None
+        """
+        self._number_nodes()
+        forward = self._forward
+        table = []
+        for origin in range(len(forward)):
+            distances = [None] * len(forward)
+            distances[origin] = 0
+            frontier = [(0, origin)]
+            while frontier:
+                distance, node = heappop(frontier)
+                if distance > distances[node]:
+                    continue
+                for neighbour, length in forward[node]:
+                    new_distance = distance + length
+                    old_distance = distances[neighbour]
+                    if old_distance is None or new_distance < old_distance:
+                        distances[neighbour] = new_distance
+                        heappush(frontier, (new_distance, neighbour))
+            table.append(distances)
+        self._table = table
+
+
+class _ReverseSearch(Distances):
+    """The distances from any node of a RoadNetwork to one destination,
+    found by a Dijkstra search outward from the destination along the roads
+    in reverse, run only as far as needed.
+    """
+
+    # === Private Attributes ===
+    # @type _ids: dict[Location, int]
+    #     The number of each node of the network.
+    # @type _backward: list[list[(int, int | float)]]
+    #     The roads arriving at each numbered node, with their lengths.
+    # @type _settled: dict[int, int | float]
+    #     The numbered nodes whose distances are known.
+    # @type _best: dict[int, int | float]
+    #     The shortest distance found so far to each numbered node reached.
+    # @type _frontier: list[(int | float, int)]
+    #     A heap of (distance, node number) for the nodes reached but
+    #     perhaps not settled.
+
+    def __init__(self, network, destination):
+        """Initialize a search to <destination> in <network>.
+
+        @type self: _ReverseSearch
+        @type network: RoadNetwork
+        @type destination: Location
+        @rtype: None
+        """
+        Distances.__init__(self, network, destination)
+        self._ids = network._number_nodes()
+        self._backward = network._backward
+        self._settled = {}
+        end = self._ids.get(destination)
+        self._best = {} if end is None else {end: 0}
+        self._frontier = [] if end is None else [(0, end)]
+
+    def distance(self, origin, bound=None):
+        """Return the distance from <origin> to the destination, or None if
+        it is more than <bound>, carrying the search on until <origin> is
+        settled or every node left is further than <bound>.
+
+        Raise ValueError if there is no route.
+
+        @type self: _ReverseSearch
+        @type origin: Location
+        @type bound: int | float | None
+        @rtype: int | float | None
+        """
+        if origin is self._destination:
+            return 0
+        start = self._ids.get(origin)
+        distance = self._settled.get(start)
+        if distance is not None:
+            if bound is not None and distance > bound:
+                return None
+            return distance
+        settled = self._settled
+        best = self._best
+        frontier = self._frontier
+        backward = self._backward
+        while frontier and start is not None:
+            distance, node = frontier[0]
+            if bound is not None and distance > bound:
+                return None
+            heappop(frontier)
+            if node in settled:
+                continue
+            settled[node] = distance
+            for neighbour, length in backward[node]:
+                new_distance = distance + length
+                if new_distance < best.get(neighbour, new_distance + 1):
+                    best[neighbour] = new_distance
+                    heappush(frontier, (new_distance, neighbour))
+            if node == start:
+                return distance
+        raise ValueError("no route from {} to {}".format(origin,
+                                                         self._destination))
+
+
+def load_road_network(filename, directed=False, cache_size=100000):
+    """Return the RoadNetwork described in <filename>.
+
+    Each line of the file is a road, in the format
+    <start> <end> <length>
+    where <start> and <end> are locations in the format <row>,<col>. Blank
+    lines and lines starting with # are skipped.
+
+    @type filename: str
+    @type directed: bool
+    @type cache_size: int
+    @rtype: RoadNetwork
+    """
+    network = RoadNetwork(directed, cache_size)
+    with open(filename, "r") as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            tokens = line.split()
+            length = float(tokens[2])
+            if length.is_integer():
+                length = int(length)
+            network.add_road(deserialize_location(tokens[0]),
+                             deserialize_location(tokens[1]), length)
+    return network
@@ -0,0 +1,133 @@
+"""
+The workload module generates synthetic event files, in the same format as
+events.txt, for testing how the simulation scales.
+
+Riders arrive as a Poisson process whose rate follows a daily demand curve:
+a constant base level plus a Gaussian peak for each rush hour. Drivers
+start at random places on a square grid, either all at time 0 or spread
+over a warm-up period. The events are written in timestamp order, one line
+at a time, so traces with tens of millions of events can be generated
+without holding them in memory.
+
+=== Constants ===
+@type DEFAULT_RUSH_HOURS: list[(float, float, float)]
+    The default rush hours as (centre, width, height) triples. The centre
+    and width are fractions of the trace duration, and the height is the
+    extra demand at the peak relative to the base level.
+"""
+import math
+import random
+import sys
+
+DEFAULT_RUSH_HOURS = [(0.35, 0.04, 3.0), (0.75, 0.05, 2.5)]
+
+
+def demand(time, duration, rush_hours):
+    """Return the relative demand at <time>: 1 plus the rush hour peaks.
+
+    @type time: float
+    @type duration: int
+    @type rush_hours: list[(float, float, float)]
+    @rtype: float
+
+    >>> demand(50, 100, [(0.5, 0.1, 2.0)])
+    3.0
+    >>> demand(50, 100, [])
+    1.0
+    """
+    level = 1.0
+    for centre, width, height in rush_hours:
+        offset = (time / duration - centre) / width
+        level += height * math.exp(-offset * offset / 2)
+    return level
+
+
+def _patience(rng, distribution, mean):
+    """Return a random rider patience.
+
+    @type rng: random.Random
+    @type distribution: str
+        "fixed", "uniform" or "exponential".
+    @type mean: int
+    @rtype: int
+    """
+    if distribution == "fixed":
+        return mean
+    if distribution == "uniform":
+        return rng.randint(1, 2 * mean - 1)
+    if distribution == "exponential":
+        return max(1, round(rng.expovariate(1 / mean)))
+    raise ValueError("unknown patience distribution: {}".format(
+        distribution))
+
+
+def generate_workload(file, riders, fleet_size, duration=86400,
+                      grid_size=100, rush_hours=DEFAULT_RUSH_HOURS,
+                      patience="exponential", mean_patience=600,
+                      max_speed=3, warm_up=0, seed=0):
+    """Write a random trace to <file> and return the number of events.
+
+    The same arguments always produce the same trace.
+
+    @type file: file
+    @type riders: int
+        The expected number of rider requests.
+    @type fleet_size: int
+        The number of drivers.
+    @type duration: int
+        The time of the last possible rider request.
+    @type grid_size: int
+        The number of rows and columns in the grid.
+    @type rush_hours: list[(float, float, float)]
+        The rush hours; see DEFAULT_RUSH_HOURS.
+    @type patience: str
+        The distribution of rider patience: "fixed", "uniform" or
+        "exponential".
+    @type mean_patience: int
+        The average rider patience.
+    @type max_speed: int
+        Driver speeds are chosen uniformly from 1 to max_speed.
+    @type warm_up: int
+        Drivers make their first request at a random time before warm_up.
+    @type seed: int
+        The seed for the random number generator.
+    @rtype: int
+    """
+    rng = random.Random(seed)
+    peak = max(demand(t, duration, rush_hours) for t in range(duration + 1))
+    total = sum(demand(t, duration, rush_hours) for t in range(duration + 1))
+    max_rate = riders * peak / total
+
+    def location():
+        return "{},{}".format(rng.randrange(grid_size),
+                              rng.randrange(grid_size))
+
+    starts = sorted(rng.randrange(warm_up) if warm_up > 0 else 0
+                    for _ in range(fleet_size))
+    next_driver = 0
+    rider_count = 0
+    time = rng.expovariate(max_rate) if max_rate > 0 else duration + 1
+    while next_driver < fleet_size or time <= duration:
+        if next_driver < fleet_size and (starts[next_driver] <= time or
+                                         time > duration):
+            file.write("{} DriverRequest D{} {} {}\n".format(
+                starts[next_driver], next_driver, location(),
+                rng.randint(1, max_speed)))
+            next_driver += 1
+        else:
+            # Thinning: a candidate arrival at the peak rate is kept with
+            # probability demand / peak.
+            if rng.random() * peak < demand(time, duration, rush_hours):
+                file.write("{} RiderRequest R{} {} {} {}\n".format(
+                    int(time), rider_count, location(), location(),
+                    _patience(rng, patience, mean_patience)))
+                rider_count += 1
+            time += rng.expovariate(max_rate)
+    return fleet_size + rider_count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        sys.exit("usage: python workload.py RIDERS FLEET_SIZE [SEED]")
+    generate_workload(sys.stdout, int(sys.argv[1]), int(sys.argv[2]),
+                      seed=int(sys.argv[3]) if len(sys.argv) == 4 else 0)